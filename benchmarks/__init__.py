@@ -0,0 +1,3 @@
+"""
+This package defines the endpoint benchmarks of the Flask REST API.
+"""
@@ -0,0 +1,442 @@
+"""
+This module defines the endpoint benchmark suite (bench_api.py).
+
+Every route registered by (routes.api_routes) is driven through the Flask
+test client and through a real WSGI server (werkzeug) over HTTP. The app
+runs against a temporary SQLite database seeded with (--users) users.
+p50, p99 and throughput are reported for each endpoint.
+
+Results can be saved as a JSON baseline. The compare mode exits with
+status 1 when the p50 of a hot path is more than (--threshold) slower
+than the baseline. A run where any request got an unexpected status
+exits with status 1 without saving or comparing: its timings are those
+of the error responses.
+
+Usage:
+* python -m benchmarks.bench_api --users 10000 --requests 200
+* python -m benchmarks.bench_api --save benchmarks/baseline.json
+* python -m benchmarks.bench_api --compare benchmarks/baseline.json --threshold 0.2
+
+-------------============= * Only for development! * =============-------------
+"""
+
+import sys
+import json
+import math
+import logging
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+import http.client
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+load_dotenv()
+
+from src import create_app, db
+from src.hashing import hasher
+from src.models import UserModel, PasswordModel, AuthTokenModel
+from src.revocation import revocations
+from src.uniqueness import unique_users
+
+BENCH_PASSWORD = 'Bench@Pass1234'
+NEW_PASSWORD = 'Bench@Pass5678'
+# Accounts the stateful scenarios act on, seeded before the others
+ACCOUNTS = ('bench_main', 'bench_patch', 'bench_password', 'bench_logout')
+# Endpoints checked by the compare mode
+HOT_PATHS = ('POST /user/auth', 'GET /user')
+SEED_BATCH_SIZE = 5000
+
+
+class Scenario:
+    """
+    ** One endpoint call, prepared for each iteration. **
+
+    (prepare) is called with the iteration number outside the timed part
+    and returns the request body (json) and headers.
+    """
+
+    def __init__(self, method: str, path: str, status: int,
+                 prepare: Callable[[int], tuple]) -> None:
+        self.method = method
+        self.path = path
+        self.status = status
+        self.prepare = prepare
+
+    @property
+    def name(self) -> str:
+        return f'{self.method} /{self.path}'
+
+
+class ClientDriver:
+    """
+    ** Requests through the Flask test client. **
+    """
+
+    name = 'client'
+
+    def __init__(self, app) -> None:
+        self.client = app.test_client()
+
+    def request(self, method: str, url: str, body: Optional[bytes], headers: dict) -> int:
+        return self.client.open(url, method=method, data=body, headers=headers).status_code
+
+    def close(self) -> None:
+        pass
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs) -> None:
+        pass
+
+
+class ServerDriver:
+    """
+    ** Requests over HTTP to a werkzeug server running in a thread. **
+    """
+
+    name = 'wsgi'
+
+    def __init__(self, app) -> None:
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+
+    def request(self, method: str, url: str, body: Optional[bytes], headers: dict) -> int:
+        self.connection.request(method, url, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self) -> None:
+        self.connection.close()
+        self.server.shutdown()
+        self.thread.join()
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """
+    Nearest-rank percentile of (samples).
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list, errors: int) -> dict:
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'rps': round(len(samples) / sum(samples), 2)
+    }
+
+
+def failures(results: dict) -> list:
+    """
+    Return the endpoints with requests answered by an unexpected status,
+    as (driver, endpoint, errors).
+    """
+    return [
+        (driver, name, result['errors'])
+        for driver, endpoints in results['results'].items()
+        for name, result in endpoints.items()
+        if result['errors']
+    ]
+
+
+def compare(baseline: dict, results: dict, threshold: float, hot_paths: tuple = HOT_PATHS) -> list:
+    """
+    Return the hot paths whose p50 regressed by more than (threshold)
+    against (baseline), as (driver, endpoint, baseline_ms, current_ms).
+    """
+    regressions = []
+    for driver, endpoints in results['results'].items():
+        base_endpoints = baseline['results'].get(driver, {})
+        for name in hot_paths:
+            if name not in endpoints or name not in base_endpoints:
+                continue
+            base = base_endpoints[name]['p50_ms']
+            current = endpoints[name]['p50_ms']
+            if current > base * (1 + threshold):
+                regressions.append((driver, name, base, current))
+    return regressions
+
+
+class Benchmark:
+    """
+    ** Seed a database and time every API endpoint. **
+    """
+
+    def __init__(self, users: int, requests: int, warmup: int) -> None:
+        self.users = users
+        self.requests = requests
+        self.warmup = warmup
+        self.directory = tempfile.TemporaryDirectory(prefix='bench_')
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.directory.name}/bench.db',
+            'DB_AUTO_UPGRADE': True,
+            'PROFILING_ENABLED': False,
+            # Every login scenario comes from one address and username
+            'LOGIN_THROTTLE_ENABLED': False
+        })
+        self.app.logger.setLevel(logging.WARNING)
+        self.prefix = self.app.config['API_URL_PREFIX']
+        self.ids = {}
+        self.counter = 0
+        self.password_hash = None
+
+    def seed(self) -> None:
+        """
+        Insert the benchmark accounts and (users) more users.
+        All of them share one password hash, so seeding skips bcrypt.
+        """
+        with self.app.app_context():
+            self.password_hash = password_hash = hasher.hash(BENCH_PASSWORD)
+            names = list(ACCOUNTS) + [f'seed_user_{i}' for i in range(self.users)]
+
+            for start in range(0, len(names), SEED_BATCH_SIZE):
+                rows = [
+                    {'username': name, 'email': f'{name}@bench.example.com'}
+                    for name in names[start:start + SEED_BATCH_SIZE]
+                ]
+                ids = db.session.execute(
+                    insert(UserModel).returning(UserModel.id, sort_by_parameter_order=True),
+                    rows
+                ).scalars().all()
+                db.session.execute(
+                    insert(PasswordModel),
+                    [{'userid': userid, 'password_hash': password_hash} for userid in ids]
+                )
+                for row, userid in zip(rows, ids):
+                    unique_users.add(row['username'], row['email'])
+                    if row['username'] in ACCOUNTS:
+                        self.ids[row['username']] = userid
+            db.session.commit()
+
+        # The admin import endpoint is called as the main account
+        self.app.config['ADMIN_USER_IDS'] = {self.ids['bench_main']}
+
+    def token(self, username: str) -> str:
+        with self.app.app_context():
+            user = db.session.get(UserModel, self.ids[username])
+            return AuthTokenModel().get_auth_token(user.id, revocations.current(user))
+
+    def unique(self, name: str) -> str:
+        self.counter += 1
+        return f'{name}_{self.counter}'
+
+    def scenarios(self) -> list:
+        main_token = self.token('bench_main')
+        patch_token = self.token('bench_patch')
+        passwords = [BENCH_PASSWORD, NEW_PASSWORD]
+
+        def auth(token: str) -> dict:
+            return {'Authorization': token}
+
+        def put_user(i: int) -> tuple:
+            username = self.unique('bench_new')
+            return {
+                'username': username,
+                'email': f'{username}@bench.example.com',
+                'password': BENCH_PASSWORD
+            }, {}
+
+        def patch_user(i: int) -> tuple:
+            username = self.unique('bench_patch')
+            return {'username': username, 'email': f'{username}@bench.example.com'}, auth(patch_token)
+
+        def delete_user(i: int) -> tuple:
+            username = self.unique('bench_delete')
+            with self.app.app_context():
+                user = UserModel(username=username, email=f'{username}@bench.example.com')
+                user.password = PasswordModel(password_hash=self.password_hash)
+                db.session.add(user)
+                db.session.commit()
+                self.ids[username] = user.id
+            return {'username': username, 'password': BENCH_PASSWORD}, auth(self.token(username))
+
+        def change_password(i: int) -> tuple:
+            # Every change revokes the previous token
+            passwords.reverse()
+            return {
+                'old_password': passwords[1],
+                'new_password': passwords[0]
+            }, auth(self.token('bench_password'))
+
+        def import_users(i: int) -> tuple:
+            username = self.unique('bench_import')
+            row = {
+                'username': username,
+                'email': f'{username}@bench.example.com',
+                'password': BENCH_PASSWORD
+            }
+            return json.dumps(row) + '\n', auth(main_token)
+
+        return [
+            Scenario('GET', 'hello', 200, lambda i: (None, {})),
+            Scenario('GET', 'user', 200, lambda i: (None, auth(main_token))),
+            Scenario('PUT', 'user', 201, put_user),
+            Scenario('PATCH', 'user', 200, patch_user),
+            Scenario('DELETE', 'user', 204, delete_user),
+            Scenario('POST', 'user/auth', 201, lambda i: (
+                {'username': 'bench_main', 'password': BENCH_PASSWORD}, {}
+            )),
+            Scenario('DELETE', 'user/auth', 204, lambda i: (None, auth(self.token('bench_logout')))),
+            Scenario('POST', 'user/password', 201, change_password),
+            Scenario('GET', 'users', 200, lambda i: (None, auth(main_token))),
+            Scenario('POST', 'users/import', 200, import_users),
+            Scenario('POST', 'batch', 200, lambda i: ({'requests': [
+                {'method': 'GET', 'path': 'user'},
+                {'method': 'GET', 'path': 'users'}
+            ]}, auth(main_token)))
+        ]
+
+    def check_coverage(self, scenarios: list) -> list:
+        """
+        Return the API endpoints (method, path) without a scenario.
+        """
+        covered = {(scenario.method, self.prefix + scenario.path) for scenario in scenarios}
+        missing = []
+        for rule in self.app.url_map.iter_rules():
+            if not rule.rule.startswith(self.prefix):
+                continue
+            for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+                if (method, rule.rule) not in covered:
+                    missing.append((method, rule.rule))
+        return missing
+
+    def run_scenario(self, driver, scenario: Scenario) -> dict:
+        samples = []
+        errors = 0
+        for i in range(self.warmup + self.requests):
+            body, headers = scenario.prepare(i)
+            if body is not None and not isinstance(body, str):
+                body = json.dumps(body)
+                headers = {**headers, 'Content-Type': 'application/json'}
+            elif body is not None:
+                headers = {**headers, 'Content-Type': 'application/x-ndjson'}
+
+            start = time.perf_counter()
+            status = driver.request(
+                scenario.method, self.prefix + scenario.path,
+                body.encode() if body is not None else None, headers
+            )
+            elapsed = time.perf_counter() - start
+
+            if i >= self.warmup:
+                samples.append(elapsed)
+                if status != scenario.status:
+                    errors += 1
+        return summarize(samples, errors)
+
+    def run(self, drivers: tuple, only: Optional[list] = None) -> dict:
+        self.seed()
+        scenarios = self.scenarios()
+        missing = self.check_coverage(scenarios)
+        if missing:
+            raise RuntimeError(f'Endpoints without a benchmark scenario: {missing}')
+
+        results = {}
+        for driver_class in drivers:
+            driver = driver_class(self.app)
+            try:
+                results[driver.name] = {}
+                for scenario in scenarios:
+                    if only and scenario.name not in only:
+                        continue
+                    results[driver.name][scenario.name] = self.run_scenario(driver, scenario)
+                    print_result(driver.name, scenario.name, results[driver.name][scenario.name])
+            finally:
+                driver.close()
+
+        return {
+            'meta': {
+                'users': self.users,
+                'requests': self.requests,
+                'warmup': self.warmup,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'datetime': datetime.datetime.utcnow().isoformat(timespec='seconds')
+            },
+            'results': results
+        }
+
+    def close(self) -> None:
+        with self.app.app_context():
+            db.engine.dispose()
+        hasher.shutdown()
+        self.directory.cleanup()
+
+
+def print_result(driver: str, name: str, result: dict) -> None:
+    print(
+        f'{driver:<7} {name:<22} p50 {result["p50_ms"]:>9.2f} ms  '
+        f'p99 {result["p99_ms"]:>9.2f} ms  {result["rps"]:>9.1f} req/s  '
+        f'errors {result["errors"]}'
+    )
+
+
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the API endpoints.')
+    parser.add_argument('--users', type=int, default=1000, help='Users seeded in the database.')
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint.')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint.')
+    parser.add_argument('--driver', choices=('client', 'wsgi', 'both'), default='both')
+    parser.add_argument('--endpoint', action='append', help="Only run this endpoint, e.g. 'GET /user'.")
+    parser.add_argument('--save', metavar='FILE', help='Write the results as a JSON baseline.')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results with a JSON baseline.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p50 slowdown (0.2 = 20%%).')
+    parser.add_argument('--hot', action='append', help='Endpoints checked by --compare.')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None) -> int:
+    args = parse_args(argv)
+    drivers = {
+        'client': (ClientDriver,),
+        'wsgi': (ServerDriver,),
+        'both': (ClientDriver, ServerDriver)
+    }[args.driver]
+
+    benchmark = Benchmark(args.users, args.requests, args.warmup)
+    try:
+        results = benchmark.run(drivers, args.endpoint)
+    finally:
+        benchmark.close()
+
+    failed = failures(results)
+    for driver, name, errors in failed:
+        print(f'FAILED {driver} {name}: {errors} of {args.requests} requests got an unexpected status')
+    if failed:
+        return 1
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold, tuple(args.hot or HOT_PATHS))
+        for driver, name, base, current in regressions:
+            print(f'REGRESSION {driver} {name}: p50 {base:.2f} ms -> {current:.2f} ms')
+        if regressions:
+            return 1
+        print(f'No regression beyond {args.threshold:.0%} on the hot paths.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
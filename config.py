@@ -17,8 +17,199 @@ class Config:
     HOST = '0.0.0.0'
     PORT = 8000
     API_URL_PREFIX = '/api/v1/'
+    # Comma-separated user ids allowed to use the admin endpoints.
+    ADMIN_USER_IDS = {
+        int(userid) for userid in os.environ.get('ADMIN_USER_IDS', '').split(',')
+        if userid.strip()
+    }
 
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool. Pre-ping and recycle apply to server databases only.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_RECYCLE = 1800  # Seconds
+    DB_POOL_PRE_PING = True
+    # Applied to every new SQLite connection.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',      # Readers do not block the writer
+        'synchronous': 'NORMAL',    # Safe with WAL, fsync only on checkpoint
+        'busy_timeout': 5000,       # Milliseconds to wait for a write lock
+        'cache_size': -20000,       # Page cache in KiB (20 MB)
+        'mmap_size': 268435456,     # 256 MB of memory-mapped I/O
+        'temp_store': 'MEMORY'
+    }
+    # Async URL for the ASGI mode, derived from the URI above when empty.
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URI')
+    ASYNC_POOL_SIZE = None
+    # Comma-separated read replica URIs. Plain SELECTs of API requests are
+    # sent to a replica until the request writes; after a write, the same
+    # user (or client address) reads from the primary for
+    # DB_REPLICA_STICKY_SECONDS.
+    DB_REPLICA_URIS = [
+        uri.strip() for uri in os.environ.get('DB_REPLICA_URIS', '').split(',')
+        if uri.strip()
+    ]
+    DB_REPLICA_STICKY_SECONDS = 5
+    DB_REPLICA_STICKY_MAX_KEYS = 100000
+    # Comma-separated shard URIs for the 'users', 'passwords' and 'tokens'
+    # tables. The primary keeps the 'user_directory' that maps each user
+    # to its shard; lookups by user id are cached for
+    # DB_SHARD_DIRECTORY_CACHE_TTL seconds. 'flask shards rebalance' moves
+    # users after shards were added. WSGI mode only.
+    DB_SHARD_URIS = [
+        uri.strip() for uri in os.environ.get('DB_SHARD_URIS', '').split(',')
+        if uri.strip()
+    ]
+    DB_SHARD_DIRECTORY_CACHE_SIZE = 100000
+    DB_SHARD_DIRECTORY_CACHE_TTL = 5
+    # Apply the Alembic migrations on startup. Off unless set, so a deploy
+    # runs 'flask db upgrade' once instead of every worker racing to it.
+    DB_AUTO_UPGRADE = os.environ.get('DB_AUTO_UPGRADE', 'False') == 'True'
+    # Commit once per API request instead of once per model helper call.
+    DB_TRANSACTION_PER_REQUEST = True
+    # Relationships loaded together with the user on login and account
+    # deletion: 'joined', 'selectin', 'select' (lazy) or 'noload'. Login
+    # writes the token through the token store without reading it; the
+    # deletion cascade needs both rows.
+    LOGIN_RELATIONSHIP_LOADING = {'password': 'joined'}
+    DELETE_RELATIONSHIP_LOADING = {'password': 'joined', 'token': 'joined'}
+    # Bits in the in-memory username and email pre-filter, 0 disables it.
+    # 2 ** 23 bits (1 MB) keep false positives near 1% up to ~400k users.
+    UNIQUE_PREFILTER_SIZE = 2 ** 23
+
+    # JSON
+    # Encoder for request parsing and responses: 'orjson' (falls back to
+    # 'json' when it is not installed) or 'json'.
+    JSON_ENGINE = 'orjson'
+
+    # Startup
+    # Warm-up of the mappers, schemas, bcrypt, JWT and DB pool: 'sync'
+    # (inside create_app), 'background' (in a thread) or 'off'.
+    # READINESS_PATH answers 503 until it has finished.
+    STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', 'sync')
+    STARTUP_PRIME_CONNECTIONS = DB_POOL_SIZE
+    READINESS_PATH = '/ready'
+
+    # Metrics
+    # Prometheus text format on METRICS_PATH (outside the API prefix).
+    METRICS_ENABLED = True
+    METRICS_PATH = '/metrics'
+
+    # Logging
+    # JSON lines written to LOG_FILE by a background thread, set up by
+    # 'run.py' and the ASGI factory; an empty LOG_FILE turns it off.
+    # Request threads only queue records, up to LOG_QUEUE_SIZE, and drop
+    # (and count) them beyond. Records of LOG_LEVEL and above from every
+    # logger are written, plus one access record per request.
+    # ACCESS_LOG_SAMPLE_RATE is the share of successful requests logged.
+    LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'ERROR')
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 10000
+    ACCESS_LOG_ENABLED = True
+    ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 1.0))
+
+    # Profiling
+    # A request sent with the header 'X-Profile: <PROFILING_TOKEN>' runs
+    # under cProfile ('X-Profile: <PROFILING_TOKEN>:memory' adds
+    # tracemalloc). The report is returned as an attachment, or written
+    # to PROFILING_DIR keeping the last PROFILING_KEEP files.
+    # Nothing is registered while disabled.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == 'True'
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+    PROFILING_HEADER = 'X-Profile'
+    PROFILING_OUTPUT = 'attachment'     # 'attachment' or 'directory'
+    PROFILING_DIR = 'profiles'
+    PROFILING_KEEP = 50
+
+    # Password hashing
+    # Offload bcrypt to a process pool. When all workers are busy and the
+    # queue is full, requests get a 503 with a Retry-After header.
+    PASSWORD_HASH_EXECUTOR = False
+    PASSWORD_HASH_WORKERS = os.cpu_count() or 1
+    PASSWORD_HASH_QUEUE_SIZE = 32
+    PASSWORD_HASH_RETRY_AFTER = 1   # Seconds
+    # The bcrypt cost is calibrated at startup: the highest one whose hash
+    # fits PASSWORD_HASH_BUDGET seconds, within the MIN (security floor)
+    # and MAX rounds. PASSWORD_HASH_ROUNDS sets it without calibrating.
+    PASSWORD_HASH_BUDGET = 0.25     # Seconds
+    PASSWORD_HASH_MIN_ROUNDS = 12
+    PASSWORD_HASH_MAX_ROUNDS = 16
+    PASSWORD_HASH_ROUNDS = None
+    # Hashes below the current cost are rewritten by a background thread
+    # after a successful login.
+    PASSWORD_REHASH = True
+    PASSWORD_REHASH_QUEUE_SIZE = 1000
+
+    # Admin user listing, 'GET /api/v1/users'
+    USER_LIST_PAGE_SIZE = 50
+    USER_LIST_MAX_PAGE_SIZE = 500
+
+    # Bulk user import
+    USER_IMPORT_BATCH_SIZE = 1000
+
+    # 'POST /api/v1/batch', the most sub-requests in one batch
+    BATCH_MAX_REQUESTS = 20
+
+    # Token store
+    # How a login stores its auth token row: 'upsert' (one statement in the
+    # login transaction), 'write-behind' (flushed in batches by a background
+    # thread every TOKEN_WRITE_BEHIND_INTERVAL seconds or once BATCH_SIZE
+    # are pending; beyond MAX_PENDING they are written inline) or
+    # 'stateless' (not stored, the JWT is enough).
+    TOKEN_STORE = os.environ.get('TOKEN_STORE', 'upsert')
+    TOKEN_WRITE_BEHIND_INTERVAL = 1.0   # Seconds
+    TOKEN_WRITE_BEHIND_BATCH_SIZE = 500
+    TOKEN_WRITE_BEHIND_MAX_PENDING = 10000
+
+    # Token sweeper
+    # Deletes expired and orphaned rows of the 'tokens' table in batches of
+    # TOKEN_SWEEP_BATCH_SIZE with TOKEN_SWEEP_PAUSE seconds between them.
+    # Runs every TOKEN_SWEEP_INTERVAL seconds in a background thread, or on
+    # demand with 'flask tokens sweep'. 0 disables the thread.
+    TOKEN_SWEEP_INTERVAL = int(os.environ.get('TOKEN_SWEEP_INTERVAL', 0))
+    TOKEN_SWEEP_BATCH_SIZE = 500
+    TOKEN_SWEEP_PAUSE = 0.05    # Seconds
+
+    # Login throttle
+    # Sliding-window limits on login attempts per username and per client
+    # IP, answered with a 429 before any query or hash. The counters are
+    # per process unless LOGIN_THROTTLE_BACKEND names a shared backend
+    # class ('package.module.Class') with hit() and reset() methods.
+    LOGIN_THROTTLE_ENABLED = True
+    LOGIN_THROTTLE_WINDOW = 60      # Seconds
+    LOGIN_THROTTLE_PER_USERNAME = 10
+    LOGIN_THROTTLE_PER_IP = 100
+    LOGIN_THROTTLE_BACKEND = None
+    LOGIN_THROTTLE_MAX_KEYS = 100000
+    # Usernames not found on login, answered without a query until
+    # UNKNOWN_USERNAME_CACHE_TTL passes or the user is created. Users
+    # created by another process are seen after the TTL. 0 disables it.
+    UNKNOWN_USERNAME_CACHE_SIZE = 10000
+    UNKNOWN_USERNAME_CACHE_TTL = 60     # Seconds
+
+    # User versions
+    # Versions behind the 'GET /user' ETag, cached so a matching
+    # If-None-Match gets a 304 without a query. Updates by another process
+    # are seen after USER_VERSION_CACHE_TTL. Set the size to 0 to disable.
+    USER_VERSION_CACHE_SIZE = 10000
+    USER_VERSION_CACHE_TTL = 5      # Seconds
+
+    # Token revocation
+    # Token generations checked on every authenticated request, cached so
+    # the check skips the query. Logouts, password changes and deletions
+    # made by another process are seen after REVOCATION_CACHE_TTL. Set the
+    # size to 0 to read the generation on every request.
+    REVOCATION_CACHE_SIZE = 100000
+    REVOCATION_CACHE_TTL = 5      # Seconds
+
+    # Auth token cache
+    # Verified JWT claims are cached to skip signature checks on repeat
+    # requests. Entries expire after AUTH_CACHE_TTL seconds or at the
+    # token's 'exp', whichever comes first. Set the size to 0 to disable.
+    AUTH_CACHE_SIZE = 10000
+    AUTH_CACHE_TTL = 300    # Seconds
@@ -14,10 +14,10 @@ Doc: https://flask.palletsprojects.com/en/3.0.x/
 -------------============= * Only for development! * =============-------------
 """
 
-import logging
 from dotenv import load_dotenv
 
 from src import create_app
+from src.logs import log_pipeline
 from src.messages import ApiMessages as msg
 from src.messages import error_msg
 
@@ -25,8 +25,8 @@ load_dotenv()
 
 app = create_app()
 
-# Writes an error report to a file 'error.log'
-logging.basicConfig(filename='error.log', level=logging.ERROR)
+# Writes the access log and error reports to LOG_FILE as JSON lines
+log_pipeline.init_app(app)
 
 
 @app.errorhandler(500)
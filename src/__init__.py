@@ -23,36 +23,161 @@ from flask_restful import Api
 from flask_marshmallow import Marshmallow
 from flask_alembic import Alembic
 
-db = SQLAlchemy()
+from .database import engine_options, init_engine, upgrade_schema
+from .metrics import metrics
+from .hashing import hasher
+from .cache import claims_cache
+from .representations import serializer
+from .routing import RoutingSession, replicas, shards
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 ma = Marshmallow()
 alembic = Alembic()
 
 
-def create_app():
-    app = Flask(__name__, instance_relative_config=False)
+def create_app(test_config: dict = None):
+    # Per-phase startup timings and the readiness flag
+    from .startup import startup
+
+    startup.begin()
+
+    with startup.phase('config'):
+        app = Flask(__name__, instance_relative_config=False)
+
+        # Application Configuration
+        app.config.from_object('config.Config')
+        if test_config is not None:
+            app.config.update(test_config)
+
+    with startup.phase('extensions'):
+        # Initialize the app with the extension
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+        db.init_app(app)
+
+        # Initialize alembic
+        alembic.init_app(app)
+
+        # Initialize marshmallow
+        ma.init_app(app)
+
+        # Initialize the password hashing pool
+        hasher.init_app(app)
+
+        # Initialize the verified auth token cache
+        claims_cache.init_app(app)
 
-    # Application Configuration
-    app.config.from_object('config.Config')
+        # Initialize the request-scoped unit of work
+        from .transaction import uow
 
-    # Initialize the app with the extension
-    db.init_app(app)
+        uow.init_app(app)
 
-    # Initialize alembic
-    alembic.init_app(app)
+        # Initialize api
+        decorators = [uow.wrap]
+        if app.config['METRICS_ENABLED']:
+            decorators.append(metrics.instrument)
+        if app.config['PROFILING_ENABLED']:
+            from .profiling import profiler
 
-    # Initialize marshmallow
-    ma.init_app(app)
+            decorators.append(profiler.wrap)
 
-    # Initialize api
-    api = Api(app, prefix=app.config['API_URL_PREFIX'])
+        api = Api(
+            app,
+            prefix=app.config['API_URL_PREFIX'],
+            decorators=decorators
+        )
+
+        # JSON encoder for requests and responses
+        serializer.init_app(app, api)
 
     with app.app_context():
-        # Creates database models
-        db.create_all()
+        with startup.phase('engine'):
+            # SQLite pragmas on every new connection
+            init_engine(db.engine, app.config)
+
+            # Read replicas for the API requests
+            replicas.init_app(app, db.session)
+
+            # Shards of the user tables
+            shards.init_app(app)
+
+            # Request and DB metrics
+            metrics.init_app(app, db.engine)
+
+            # SQL capture for profiled requests
+            if app.config['PROFILING_ENABLED']:
+                profiler.init_app(app, db.engine)
+
+        # Apply the migrations in 'src/migrations' when DB_AUTO_UPGRADE
+        # is set, deploys run 'flask db upgrade' instead
+        if app.config['DB_AUTO_UPGRADE']:
+            with startup.phase('schema'):
+                upgrade_schema(alembic, db.engine)
+
+        with startup.phase('caches'):
+            # Shards by user id, before anything reads the user tables
+            from .sharding import directory
+
+            directory.init_app(app)
+
+            # Cached auth token generations
+            from .revocation import revocations
+
+            revocations.init_app(app)
+
+            # Load the username and email pre-filter
+            from .uniqueness import unique_users
+
+            unique_users.init_app(app)
+
+            # Login rate limits and the unknown username cache
+            from .throttle import login_throttle
+
+            login_throttle.init_app(app)
+
+            # User versions for the 'GET /user' ETag
+            from .etags import user_versions
+
+            user_versions.init_app(app)
+
+            # Expired auth token cleanup
+            from .sweeper import sweeper
+
+            sweeper.init_app(app)
+
+            # Auth token rows written by logins
+            from .tokens import token_store
+
+            token_store.init_app(app)
+
+            # Rewrites outdated password hashes after a login
+            from .rehash import rehasher
+
+            rehasher.init_app(app)
+
+            # Structured log queue, started by 'run.py' and the ASGI factory
+            from .logs import log_pipeline
+
+            for component in (
+                hasher, claims_cache, revocations, unique_users, login_throttle,
+                user_versions, sweeper, rehasher, token_store, replicas, directory,
+                log_pipeline, startup
+            ):
+                metrics.add_collector(component.collect)
+
+        with startup.phase('routes'):
+            # App routes, importing the views and the shared schema instances
+            from .routes import api_routes, metrics_routes, readiness_routes
+
+            api_routes(api)
+            metrics_routes(app)
+            readiness_routes(app)
+
+            # CLI commands
+            from .commands import register_commands
 
-        # App routes
-        from .routes import api_routes
+            register_commands(app)
 
-        api_routes(api)
+    # Warm-up, then the app reports ready
+    startup.finish(app)
 
-        return app
+    return app
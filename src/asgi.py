@@ -0,0 +1,459 @@
+"""
+This module defines the ASGI serving mode (asgi.py) of the REST API.
+
+(create_asgi_app) serves the same user, auth and password endpoints as
+the Flask-RESTful resources in (views.py), with the same request and
+response contract. Database access goes through SQLAlchemy async sessions
+(for example 'sqlite+aiosqlite') and bcrypt runs off the event loop, so
+one process can keep many requests waiting on the DB or a hash.
+
+The Flask app is still created first. It provides the configuration,
+creates the tables and loads the in-memory indexes shared by both modes.
+
+Usage:
+* uvicorn 'src.asgi:create_asgi_app' --factory --port 8000
+
+Dependencies:
+* SQLAlchemy asyncio: Async sessions over an async DB driver.
+* aiosqlite: The asyncio driver for SQLite.
+
+Doc: https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html
+"""
+
+import time
+import asyncio
+from functools import partial, wraps
+from typing import Callable, Any, Optional
+
+from dotenv import load_dotenv
+from marshmallow import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.exceptions import HTTPException, BadRequest
+from werkzeug.http import parse_etags
+
+from . import db, create_app
+from .database import init_engine
+from .hashing import hasher
+from .messages import success_msg, error_msg
+from .messages import ApiMessages as msg
+from .metrics import metrics
+from .logs import log_pipeline
+from .startup import startup
+from .representations import serializer
+from .models import UserModel, PasswordModel, AuthTokenModel
+from .revocation import revocations
+from .rehash import rehasher
+from .routing import shards
+from .tokens import token_store
+from .throttle import login_throttle
+from .etags import user_versions, user_etag, etag_header
+from .schemas import user_schema, password_schema, async_user_schema
+from .uniqueness import unique_users, translate_integrity_error
+from .utils import verify_token
+
+# Async drivers for the sync URLs used by Flask-SQLAlchemy
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+
+
+def async_database_uri(app) -> URL:
+    """
+    The ASYNC_DATABASE_URI option, or the app database URL
+    with its driver replaced by an async one.
+    """
+    if app.config.get('ASYNC_DATABASE_URI'):
+        return make_url(app.config['ASYNC_DATABASE_URI'])
+
+    with app.app_context():
+        url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+async def run_sync(func: Callable[..., Any], *args) -> Any:
+    """
+    Run a blocking call such as bcrypt in the default thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args))
+
+
+class Request:
+
+    def __init__(self, scope: dict, body: bytes) -> None:
+        self.method = scope['method']
+        self.path = scope['path']
+        self.remote_addr = (scope.get('client') or (None,))[0]
+        self.auth_userid = None
+        self.headers = {
+            key.decode('latin-1').lower(): value.decode('latin-1')
+            for key, value in scope['headers']
+        }
+        self.body = body
+
+    @property
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            data = serializer.loads(self.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise BadRequest('Failed to decode JSON object.')
+        return data
+
+
+def authenticate(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    The async counterpart of (utils.authenticate).
+    """
+    @wraps(func)
+    async def wrapper(self, request, session, **kwargs) -> Any:
+        is_auth = verify_token(request.headers.get('authorization'))
+        if is_auth is None or await revocations.is_revoked_async(session, is_auth):
+            return serializer.error_body(msg.AUTHORIZATION_ERROR), 401
+        kwargs['auth'] = is_auth
+        request.auth_userid = is_auth['sub']
+        return await func(self, request, session, **kwargs)
+    return wrapper
+
+
+async def get_user(session, load: tuple = ('password', 'token'), **filters) -> Optional[UserModel]:
+    """
+    Load a user by (filters) with the (load) relationships joined.
+    """
+    result = await session.execute(
+        select(UserModel)
+        .options(*[joinedload(getattr(UserModel, name)) for name in load])
+        .filter_by(**filters)
+    )
+    return result.unique().scalar_one_or_none()
+
+
+async def load_user(session, data: dict) -> dict:
+    """
+    Load (data) with (UserSchema) and run its uniqueness check on the
+    async session. Raises the same ValidationError as the Flask views.
+    """
+    schema = async_user_schema
+    try:
+        user_load = schema.load(data)
+        errors = {}
+    except ValidationError as e:
+        user_load = e.valid_data or {}
+        errors = e.messages
+
+    errors.update(await unique_users.conflicts_async(
+        session, user_load.get('username'), user_load.get('email')
+    ))
+    if errors:
+        raise ValidationError(errors)
+    return user_load
+
+
+class UserResource:
+
+    name = 'UserApi'
+
+    @authenticate
+    async def get(self, request, session, auth):
+        if_none_match = parse_etags(request.headers.get('if-none-match'))
+        if if_none_match:
+            version = await user_versions.version_async(session, auth['sub'])
+            if version is not None:
+                tag = user_etag(auth['sub'], version)
+                if if_none_match.contains_weak(tag):
+                    return None, 304, etag_header(tag)
+
+        user = await get_user(session, id=auth['sub'])
+        if user is None:
+            return serializer.error_body(msg.AUTHORIZATION_ERROR), 401
+
+        dump_user = user_schema.dump(user)
+        user_versions.set(user.id, user.version)
+        return success_msg(dump_user), 200, etag_header(user_etag(user.id, user.version))
+
+    async def put(self, request, session):
+        user_data = request.json
+        password = user_data.pop('password', None)
+
+        try:
+            user_load = await load_user(session, user_data)
+        except ValidationError as e:
+            return error_msg(e.messages), 400
+
+        try:
+            password_load = password_schema.load({'password': password})
+        except ValidationError as e:
+            return error_msg(e.messages), 400
+
+        new_password = PasswordModel()
+        new_password.password_hash = await run_sync(hasher.hash, password_load['password'])
+
+        session.add(UserModel(**user_load, password=new_password))
+        await session.commit()
+
+        return success_msg(user_load), 201
+
+    @authenticate
+    async def patch(self, request, session, auth):
+        try:
+            user_load = await load_user(session, request.json)
+        except ValidationError as e:
+            return error_msg(e.messages), 404
+
+        user = await get_user(session, id=auth['sub'])
+        for key, value in user_load.items():
+            setattr(user, key, value)
+        user.version = UserModel.version + 1
+        await session.commit()
+
+        return success_msg(user_load), 200
+
+    @authenticate
+    async def delete(self, request, session, auth):
+        username = request.json.get('username')
+        password = request.json.get('password')
+
+        if username is None or password is None:
+            return serializer.error_body(msg.MISSING_ARGUMENT), 400
+
+        user = await get_user(session, username=username)
+        if user is None:
+            return serializer.error_body(msg.INVALID_USERNAME), 404
+
+        if user.id != auth['sub']:
+            return serializer.error_body(msg.VALIDATION_ERROR), 403
+
+        password_is_valid = await run_sync(
+            hasher.verify, password, user.password.password_hash
+        )
+        if password_is_valid:
+            revocations.revoke_deleted(user.id)
+            await session.delete(user)
+            await session.commit()
+            return {}, 204
+        else:
+            return serializer.error_body(msg.AUTHORIZATION_ERROR), 401
+
+
+class PasswordResource:
+
+    name = 'PasswordApi'
+
+    @authenticate
+    async def post(self, request, session, auth):
+        old_password = request.json.get('old_password')
+        new_password = request.json.get('new_password')
+
+        if old_password is None or new_password is None:
+            return serializer.error_body(msg.MISSING_ARGUMENT), 400
+
+        user = await get_user(session, id=auth['sub'])
+        user_password = user.password
+        old_pssword_is_valid = await run_sync(
+            hasher.verify, old_password, user_password.password_hash
+        )
+
+        if old_pssword_is_valid:
+            try:
+                password_schema.load({'password': new_password})
+            except ValidationError as e:
+                return error_msg(e.messages), 400
+
+            user_password.password_hash = await run_sync(hasher.hash, new_password)
+            user_password.new_datetime()
+            user.token_generation = revocations.revoke(user)
+            await session.commit()
+
+            return success_msg({}), 201
+        else:
+            return serializer.error_body(msg.INVALID_PASSWORD), 401
+
+
+class AuthResource:
+
+    name = 'AuthApi'
+
+    async def post(self, request, session):
+        username = request.json.get('username')
+        password = request.json.get('password')
+
+        if username is None or password is None:
+            return serializer.error_body(msg.MISSING_ARGUMENT), 400
+
+        login_throttle.check(username, request.remote_addr)
+        if login_throttle.is_unknown(username):
+            return serializer.error_body(msg.INVALID_USERNAME), 404
+
+        user = await get_user(session, load=('password',), username=username)
+        if user is None:
+            login_throttle.add_unknown(username)
+            return serializer.error_body(msg.INVALID_USERNAME), 404
+
+        password_is_valid = await run_sync(
+            hasher.verify, password, user.password.password_hash
+        )
+
+        if password_is_valid:
+            login_throttle.succeeded(username)
+            new_auth = AuthTokenModel(userid=user.id)
+            new_token = new_auth.get_auth_token(user.id, revocations.current(user))
+            await token_store.save_async(session, new_auth)
+            await session.commit()
+            rehasher.submit(user.password, password)
+
+            return success_msg({'auth_token': new_token}), 201
+        else:
+            return serializer.error_body(msg.INVALID_PASSWORD), 401
+
+    @authenticate
+    async def delete(self, request, session, auth):
+        user = await get_user(session, load=(), id=auth['sub'])
+        if user is None:
+            return serializer.error_body(msg.AUTHORIZATION_ERROR), 401
+
+        user.token_generation = revocations.revoke(user)
+        await token_store.delete_async(session, user.id)
+        await session.commit()
+        return {}, 204
+
+
+class HelloResource:
+
+    name = 'HelloWorld'
+
+    async def get(self, request, session):
+        return serializer.success_body('Hello World'), 200
+
+
+class AsgiApp:
+    """
+    ** ASGI application serving the API resources. **
+    """
+
+    def __init__(self, flask_app) -> None:
+        if shards.enabled:
+            raise RuntimeError('The ASGI app does not support DB_SHARD_URIS, run the WSGI app.')
+        self.flask_app = flask_app
+        self.config = flask_app.config
+
+        options = {}
+        if self.config.get('ASYNC_POOL_SIZE'):
+            options['pool_size'] = self.config['ASYNC_POOL_SIZE']
+        self.engine = create_async_engine(async_database_uri(flask_app), **options)
+        init_engine(self.engine, self.config)
+        metrics.init_app(flask_app, self.engine.sync_engine)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        prefix = self.config['API_URL_PREFIX']
+        self.routes = {
+            prefix + 'user': UserResource(),
+            prefix + 'user/auth': AuthResource(),
+            prefix + 'user/password': PasswordResource(),
+            prefix + 'hello': HelloResource()
+        }
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            body = b''
+            while True:
+                message = await receive()
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            data, status, headers = await self.dispatch(Request(scope, body))
+            await self.respond(send, data, status, headers)
+
+    async def lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, request: Request) -> tuple:
+        if request.path == self.config['METRICS_PATH'] and self.config['METRICS_ENABLED']:
+            return metrics.render(), 200, {}
+        if request.path == self.config['READINESS_PATH']:
+            report = startup.report()
+            if report['status'] == 'ready':
+                return report, 200, {}
+            return report, 503, {'Retry-After': '1'}
+
+        resource = self.routes.get(request.path)
+        if resource is None:
+            return serializer.error_body(msg.NOT_FOUND_ERROR), 404, {}
+
+        method = getattr(resource, request.method.lower(), None)
+        if method is None:
+            return {'message': 'The method is not allowed for the requested URL.'}, 405, {}
+
+        start = time.perf_counter()
+        data, status, headers = await self.call(method, request)
+        latency = time.perf_counter() - start
+        if self.config['METRICS_ENABLED']:
+            metrics.observe_request(resource.name, request.method, status, latency)
+        if log_pipeline.enabled:
+            log_pipeline.access(
+                request.method, request.path, request.path, status, latency,
+                userid=request.auth_userid, remote_addr=request.remote_addr
+            )
+        return data, status, headers
+
+    async def call(self, method: Callable, request: Request) -> tuple:
+        async with self.session() as session:
+            try:
+                data, status, *headers = await method(request, session)
+            except IntegrityError as e:
+                await session.rollback()
+                violation = translate_integrity_error(e)
+                if violation is None:
+                    raise
+                return violation.data, violation.code, {}
+            except HTTPException as e:
+                await session.rollback()
+                headers = dict(e.get_headers())
+                headers.pop('Content-Type', None)
+                return getattr(e, 'data', {'message': e.description}), e.code, headers
+        return data, status, headers[0] if headers else {}
+
+    async def respond(self, send: Callable, data: Any, status: int, headers: dict) -> None:
+        if data is None:
+            body, content_type = b'', None
+        elif isinstance(data, str):
+            body, content_type = data.encode(), b'text/plain; version=0.0.4'
+        elif isinstance(data, bytes):
+            # Serialized at startup by (serializer)
+            body, content_type = data, b'application/json'
+        else:
+            body, content_type = serializer.dumps(data) + b'\n', b'application/json'
+        raw_headers = [(b'content-length', str(len(body)).encode())]
+        if content_type is not None:
+            raw_headers.append((b'content-type', content_type))
+        raw_headers += [(key.lower().encode(), str(value).encode()) for key, value in headers.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(flask_app=None) -> AsgiApp:
+    """
+    Build the ASGI app, creating the Flask app for its configuration.
+    """
+    if flask_app is None:
+        load_dotenv()
+        flask_app = create_app()
+        log_pipeline.init_app(flask_app)
+    return AsgiApp(flask_app)
@@ -0,0 +1,131 @@
+"""
+This module defines the batch request dispatcher (batch.py) behind
+'POST /api/v1/batch'.
+
+A batch is an ordered list of sub-requests against the API resources,
+for example a login, then 'GET /user', then 'PATCH /user'. They run
+in-process, one after the other, in the app context of the batch request,
+so they share its DB session and skip the HTTP round trips:
+
+* A sub-request without an Authorization header gets the batch's one.
+  (authenticate) keeps the verified claims of a token in (g), so every
+  sub-request with the same token reuses them. An auth token returned by
+  a login sub-request is used by the sub-requests after it.
+* By default each sub-request commits on its own, exactly as if it were
+  sent alone. An 'atomic' batch stages the changes of all of them and
+  commits once after the last one. The first sub-request answering with
+  an error status rolls the whole batch back and ends it.
+
+Resources with 'batchable = False' (the batch itself, the streaming
+import) are refused.
+"""
+
+from typing import Optional
+
+from flask import g, request, current_app
+from flask_restful import Resource
+from werkzeug.test import EnvironBuilder
+
+from . import db
+from .messages import ApiMessages as msg
+from .representations import serializer
+from .transaction import uow
+
+# Response headers of a sub-request passed on to the client
+BATCH_RESPONSE_HEADERS = ('ETag', 'Retry-After')
+
+
+class BatchDispatcher:
+    """
+    ** Runs the sub-requests of one batch in order. **
+    """
+
+    def __init__(self, atomic: bool = False, auth_token: Optional[str] = None) -> None:
+        self.atomic = atomic
+        self.auth_token = auth_token
+        self.committed = None
+
+    def run(self, requests: list) -> list:
+        """
+        Dispatch (requests), loaded by (BatchSchema). Returns their
+        responses as {status, headers, body}.
+        """
+        responses = []
+        for sub_request in requests:
+            response = self.dispatch(sub_request)
+            responses.append(response)
+            if self.atomic and response['status'] >= 400:
+                db.session.rollback()
+                self.committed = False
+                return responses
+
+        if self.atomic:
+            uow.commit_now()
+            self.committed = True
+        return responses
+
+    def dispatch(self, sub_request: dict) -> dict:
+        headers = dict(sub_request['headers'])
+        if self.auth_token is not None:
+            headers.setdefault('Authorization', self.auth_token)
+
+        prefix = current_app.config['API_URL_PREFIX']
+        path = sub_request['path']
+        if not path.startswith(prefix):
+            path = prefix + path.lstrip('/')
+
+        builder = EnvironBuilder(
+            path=path,
+            method=sub_request['method'],
+            headers=headers,
+            json=sub_request['body'],
+            environ_base={'REMOTE_ADDR': request.remote_addr}
+        )
+        # Sub-requests add up to the DB use of the batch request
+        db_statements, db_time = g.get('db_statements', 0), g.get('db_time', 0.0)
+        uow_active = g.get('uow_active', False)
+        g.uow_active = self.atomic
+        try:
+            with current_app.request_context(builder.get_environ()):
+                if not self.batchable():
+                    return self.result(serializer.error(msg.BATCH_NOT_ALLOWED, 400))
+                response = current_app.full_dispatch_request()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Batch sub-request %s %s failed.', sub_request['method'], path)
+            response = serializer.error(msg.INTERNAL_ERROR, 500)
+        finally:
+            g.uow_active = uow_active
+            g.db_statements = g.get('db_statements', 0) + db_statements
+            g.db_time = g.get('db_time', 0.0) + db_time
+
+        return self.result(response)
+
+    @staticmethod
+    def batchable() -> bool:
+        rule = request.url_rule
+        if rule is None:
+            # Let the dispatch answer 404 or 405
+            return True
+        view_class = getattr(current_app.view_functions[rule.endpoint], 'view_class', None)
+        return (
+            isinstance(view_class, type) and issubclass(view_class, Resource)
+            and getattr(view_class, 'batchable', True)
+        )
+
+    def result(self, response) -> dict:
+        body = None
+        if response.is_json and response.get_data():
+            body = serializer.loads(response.get_data())
+        elif response.get_data():
+            body = response.get_data(as_text=True)
+        if isinstance(body, dict) and isinstance(body.get('data'), dict):
+            self.auth_token = body['data'].get('auth_token', self.auth_token)
+        return {
+            'status': response.status_code,
+            'headers': {
+                name: response.headers[name]
+                for name in BATCH_RESPONSE_HEADERS if name in response.headers
+            },
+            'body': body
+        }
@@ -0,0 +1,119 @@
+"""
+This module defines small in-process caches (cache.py) shared
+across the application.
+
+* TTLCache: A bounded LRU cache whose entries expire at a given time.
+* ClaimsCache: Verified JWT claims keyed by a digest of the token.
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TTLCache:
+    """
+    ** Bounded LRU cache with a per-entry expiry time. **
+
+    A (maxsize) of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 0, ttl: float = 0) -> None:
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.configure(maxsize, ttl)
+
+    def configure(self, maxsize: int, ttl: float) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Any, value: Any, expires: Optional[float] = None) -> None:
+        """
+        Store (value) until (expires), but never longer than the cache ttl.
+        """
+        if self.maxsize <= 0:
+            return
+        deadline = time.time() + self.ttl
+        if expires is not None:
+            deadline = min(deadline, expires)
+        with self._lock:
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class ClaimsCache(TTLCache):
+    """
+    ** Verified JWT claims keyed by a digest of the token. **
+
+    Entries never outlive the token's own 'exp' claim.
+    """
+
+    def init_app(self, app) -> None:
+        self.configure(
+            maxsize=app.config['AUTH_CACHE_SIZE'],
+            ttl=app.config['AUTH_CACHE_TTL']
+        )
+
+    def collect(self) -> list:
+        stats = self.stats()
+        return [
+            ('auth_cache_size', 'gauge', 'Verified tokens in the cache.', stats['size']),
+            ('auth_cache_hits_total', 'counter', 'Auth cache hits.', stats['hits']),
+            ('auth_cache_misses_total', 'counter', 'Auth cache misses.', stats['misses'])
+        ]
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get_claims(self, token: str) -> Optional[dict]:
+        if self.maxsize <= 0:
+            return None
+        return self.get(self.digest(token))
+
+    def set_claims(self, token: str, claims: dict) -> None:
+        self.set(self.digest(token), claims, expires=claims['exp'])
+
+
+claims_cache = ClaimsCache()
@@ -0,0 +1,128 @@
+"""
+This module defines the Flask CLI commands (commands.py) of the application.
+
+Usage:
+* flask users import users.ndjson
+* flask users import users.csv --batch-size 500
+* flask tokens sweep
+* flask shards init
+* flask shards status
+* flask shards rebalance --batch-size 100
+
+Doc: https://flask.palletsprojects.com/en/3.0.x/cli/
+"""
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .importer import UserImporter, read_rows
+from .routing import shards
+from .sharding import directory
+from .sweeper import sweeper
+
+users_cli = AppGroup('users', help='Manage user accounts.')
+tokens_cli = AppGroup('tokens', help='Manage auth tokens.')
+shards_cli = AppGroup('shards', help='Manage the user shards (DB_SHARD_URIS).')
+
+
+@users_cli.command('import')
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows validated, hashed and inserted per batch.')
+@click.option('--workers', default=None, type=int,
+              help='Processes used for hashing (PASSWORD_HASH_WORKERS).')
+def import_users(file, fmt, batch_size, workers):
+    """
+    Import users from an NDJSON or CSV FILE.
+    """
+    if fmt is None:
+        fmt = 'csv' if os.path.splitext(file.name)[1].lower() == '.csv' else 'ndjson'
+
+    def progress(report):
+        click.echo(
+            f"{report['rows']} rows: {report['created']} created, "
+            f"{report['failed']} failed"
+        )
+
+    importer = UserImporter(
+        batch_size=batch_size,
+        workers=workers or current_app.config['PASSWORD_HASH_WORKERS'],
+        progress=progress
+    )
+    report = importer.run(read_rows(file, fmt))
+
+    for error in report['errors']:
+        click.echo(f"line {error['line']}: {error['errors']}", err=True)
+
+
+@tokens_cli.command('sweep')
+@click.option('--batch-size', default=None, type=int,
+              help='Rows deleted per transaction (TOKEN_SWEEP_BATCH_SIZE).')
+@click.option('--pause', default=None, type=float,
+              help='Seconds between batches (TOKEN_SWEEP_PAUSE).')
+def sweep_tokens(batch_size, pause):
+    """
+    Delete expired and orphaned auth tokens.
+    """
+    report = sweeper.sweep(batch_size, pause)
+    click.echo(
+        f"{report['expired']} expired, {report['orphaned']} orphaned, "
+        f"{report['invalid']} invalid tokens removed in {report['batches']} batches "
+        f"({report['seconds']:.3f} s)"
+    )
+
+
+def _require_shards() -> None:
+    if not shards.enabled:
+        raise click.ClickException('DB_SHARD_URIS is not set.')
+
+
+@shards_cli.command('init')
+def init_shards():
+    """
+    Create the user tables in every shard that lacks them.
+    """
+    _require_shards()
+    directory.create_schema()
+    click.echo(f'{len(shards)} shards ready')
+
+
+@shards_cli.command('status')
+def shards_status():
+    """
+    Show the users per shard and how many of them need a move.
+    """
+    _require_shards()
+    for count in directory.status():
+        click.echo(f"shard {count['shard']}: {count['users']} users, {count['misplaced']} misplaced")
+
+
+@shards_cli.command('rebalance')
+@click.option('--batch-size', default=100, show_default=True,
+              help='Users moved per batch.')
+@click.option('--pause', default=0.0, show_default=True,
+              help='Seconds between batches.')
+@click.option('--grace', default=None, type=float,
+              help='Seconds before the rows changed during a move are copied again '
+                   '(DB_SHARD_DIRECTORY_CACHE_TTL).')
+def rebalance_shards(batch_size, pause, grace):
+    """
+    Move users to their home shard after shards were added.
+    """
+    _require_shards()
+    report = directory.rebalance(batch_size, pause, grace)
+    click.echo(
+        f"{report['moved']} users moved, {report['resynced']} resynced "
+        f"in {report['batches']} batches"
+    )
+
+
+def register_commands(app) -> None:
+    app.cli.add_command(users_cli)
+    app.cli.add_command(tokens_cli)
+    app.cli.add_command(shards_cli)
@@ -0,0 +1,77 @@
+"""
+This module defines the database engine setup (database.py).
+
+* engine_options: Builds SQLALCHEMY_ENGINE_OPTIONS for the configured
+  backend: pool sizing and pre-ping for server databases, pool sizing
+  only for SQLite files.
+* sqlite_pragmas: Applies SQLITE_PRAGMAS (WAL, synchronous, busy_timeout,
+  mmap_size, cache_size) on every new SQLite connection.
+* upgrade_schema: Applies the Alembic migrations in 'src/migrations'.
+
+Doc: https://docs.sqlalchemy.org/en/20/dialects/sqlite.html
+"""
+
+from typing import Callable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+
+# The first revision in 'src/migrations', the schema create_all() built
+INITIAL_REVISION = '3b2d1c0e9f41'
+
+
+def engine_options(config, url: Optional[str] = None) -> dict:
+    """
+    Engine options for the app database, or for the database at (url)
+    (a replica). Values already set in SQLALCHEMY_ENGINE_OPTIONS take
+    precedence.
+    """
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+
+    if url.get_backend_name() == 'sqlite':
+        # In-memory databases use a single connection per thread
+        if url.database not in (None, '', ':memory:'):
+            options['pool_size'] = config['DB_POOL_SIZE']
+            options['max_overflow'] = config['DB_MAX_OVERFLOW']
+    else:
+        options['pool_size'] = config['DB_POOL_SIZE']
+        options['max_overflow'] = config['DB_MAX_OVERFLOW']
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+        options['pool_pre_ping'] = config['DB_POOL_PRE_PING']
+
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def sqlite_pragmas(pragmas: dict) -> Callable:
+    """
+    Return a 'connect' event listener that applies (pragmas).
+    """
+    def set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def init_engine(engine, config) -> None:
+    """
+    Register the SQLite pragmas on (engine), a sync or async engine.
+    """
+    engine = getattr(engine, 'sync_engine', engine)
+    if engine.dialect.name == 'sqlite' and config.get('SQLITE_PRAGMAS'):
+        event.listen(engine, 'connect', sqlite_pragmas(config['SQLITE_PRAGMAS']))
+
+
+def upgrade_schema(alembic, engine) -> None:
+    """
+    Upgrade the database to the latest revision. A database created by
+    db.create_all() before the migrations existed has no version table;
+    it is stamped with the initial revision first.
+    """
+    tables = inspect(engine).get_table_names()
+    if 'alembic_version' not in tables and 'users' in tables:
+        alembic.stamp(INITIAL_REVISION)
+    alembic.upgrade()
@@ -0,0 +1,86 @@
+"""
+This module defines the ETags of the user resource (etags.py).
+
+The ETag of 'GET /user' is built from the user id and the 'version'
+column, which (UserModel.update) bumps. A request with a matching
+If-None-Match header gets a 304 after a version lookup instead of
+loading and serializing the user.
+
+Versions are cached in process for USER_VERSION_CACHE_TTL seconds and
+dropped on every update made through the ORM. An update made by another
+process is seen once the entry expires.
+"""
+
+from typing import Optional
+
+from sqlalchemy import event, select
+from werkzeug.http import quote_etag
+
+from . import db
+from .cache import TTLCache
+from .models import UserModel
+
+
+def user_etag(userid: int, version: int) -> str:
+    """
+    The strong ETag of (userid) at (version), unquoted.
+    """
+    return f'user-{userid}-{version}'
+
+
+def etag_header(tag: str) -> dict:
+    return {'ETag': quote_etag(tag)}
+
+
+class UserVersionCache(TTLCache):
+    """
+    ** User versions by user id. **
+    """
+
+    def init_app(self, app) -> None:
+        self.configure(
+            maxsize=app.config['USER_VERSION_CACHE_SIZE'],
+            ttl=app.config['USER_VERSION_CACHE_TTL']
+        )
+        if not event.contains(UserModel, 'after_update', self._after_write):
+            event.listen(UserModel, 'after_update', self._after_write)
+            event.listen(UserModel, 'after_delete', self._after_write)
+
+    def collect(self) -> list:
+        stats = self.stats()
+        return [
+            ('user_version_cache_hits_total', 'counter', 'User versions read from the cache.', stats['hits']),
+            ('user_version_cache_misses_total', 'counter', 'User versions read from the DB.', stats['misses'])
+        ]
+
+    def _after_write(self, mapper, connection, user: UserModel) -> None:
+        self.delete(user.id)
+
+    @staticmethod
+    def statement(userid: int):
+        return select(UserModel.version).where(UserModel.id == userid)
+
+    def version(self, userid: int) -> Optional[int]:
+        """
+        The current version of (userid), None for a deleted user.
+        """
+        version = self.get(userid)
+        if version is None:
+            version = db.session.execute(self.statement(userid)).scalar_one_or_none()
+            if version is not None:
+                self.set(userid, version)
+        return version
+
+    async def version_async(self, session, userid: int) -> Optional[int]:
+        """
+        Same as (version) on an async session.
+        """
+        version = self.get(userid)
+        if version is None:
+            version = (await session.execute(self.statement(userid))).scalar_one_or_none()
+            if version is not None:
+                self.set(userid, version)
+        return version
+
+
+user_versions = UserVersionCache()
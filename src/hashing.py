@@ -0,0 +1,278 @@
+"""
+This module defines the password hashing service (hashing.py) used by
+the models to hash and verify user passwords.
+
+By default bcrypt runs inline on the request thread. When the
+PASSWORD_HASH_EXECUTOR option is enabled, hashing and verification are
+offloaded to a bounded process pool. If the pool and its queue are full,
+the request is rejected with a fast 503 instead of piling up.
+
+Bulk imports hash on a pool of their own, started on first use and shared
+by every import, so an import batch never queues ahead of the logins.
+
+The bcrypt cost is calibrated at startup: the highest cost whose hash
+takes at most PASSWORD_HASH_BUDGET seconds on this machine, but never
+below PASSWORD_HASH_MIN_ROUNDS. Hashes made with a lower cost are
+reported by (needs_update) and rewritten after the next login.
+
+Dependencies:
+* Passlib: A password hashing library for Python.
+
+Doc: https://passlib.readthedocs.io/en/stable/
+"""
+
+import math
+import time
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Any
+
+from passlib.context import CryptContext
+from werkzeug.exceptions import ServiceUnavailable
+
+from .messages import ApiMessages as msg
+from .messages import error_msg
+from .metrics import metrics
+
+# Configuration of CryptContext for using bcrypt
+# and automatic management of deprecated algorithms.
+PWD_CONTEXT = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+
+# bcrypt cost used to time one hash during calibration
+CALIBRATION_ROUNDS = 8
+
+
+def set_rounds(rounds: int) -> None:
+    """
+    Hash with (rounds) from now on, and mark hashes with a lower cost
+    as outdated. Also the initializer of the pool workers.
+    """
+    PWD_CONTEXT.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+@lru_cache()
+def calibrate(budget: float, min_rounds: int, max_rounds: int) -> int:
+    """
+    The highest bcrypt cost within [min_rounds, max_rounds] whose hash
+    takes at most (budget) seconds. Every extra round doubles the time,
+    so one hash at CALIBRATION_ROUNDS is enough to estimate it.
+    """
+    handler = PWD_CONTEXT.handler('bcrypt').using(rounds=CALIBRATION_ROUNDS)
+    start = time.perf_counter()
+    handler.hash('calibration')
+    seconds = time.perf_counter() - start
+
+    rounds = CALIBRATION_ROUNDS + math.floor(math.log2(budget / seconds))
+    return max(min_rounds, min(rounds, max_rounds))
+
+
+def _hash(password: str) -> str:
+    return PWD_CONTEXT.hash(password)
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    return PWD_CONTEXT.verify(password, password_hash)
+
+
+def _warm_up() -> None:
+    # Loads the bcrypt backend with a cheap hash (the minimum cost)
+    password_hash = PWD_CONTEXT.handler('bcrypt').using(rounds=4).hash('warm-up')
+    PWD_CONTEXT.verify('warm-up', password_hash)
+
+
+class HashQueueFull(ServiceUnavailable):
+    """
+    Raised when the hashing pool cannot accept more work.
+    Flask-RESTful turns it into a 503 response with a Retry-After header.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(retry_after=retry_after)
+        self.data = error_msg(msg.SERVICE_UNAVAILABLE)
+
+
+class PasswordHasher:
+    """
+    ** Hash and verify passwords, optionally in a bounded process pool. **
+    """
+
+    def __init__(self) -> None:
+        self._executor = None
+        self._slots = None
+        self._import_executor = None
+        self._import_lock = threading.Lock()
+        self.workers = 0
+        self.rounds = PWD_CONTEXT.handler('bcrypt').default_rounds
+        self._lock = threading.Lock()
+        self.retry_after = 1
+        self.reset_stats()
+
+    def init_app(self, app) -> None:
+        rounds = app.config['PASSWORD_HASH_ROUNDS']
+        if rounds is None:
+            rounds = calibrate(
+                app.config['PASSWORD_HASH_BUDGET'],
+                app.config['PASSWORD_HASH_MIN_ROUNDS'],
+                app.config['PASSWORD_HASH_MAX_ROUNDS']
+            )
+        self.rounds = rounds
+        set_rounds(rounds)
+
+        if app.config.get('PASSWORD_HASH_EXECUTOR'):
+            self.configure(
+                workers=app.config['PASSWORD_HASH_WORKERS'],
+                queue_size=app.config['PASSWORD_HASH_QUEUE_SIZE'],
+                retry_after=app.config['PASSWORD_HASH_RETRY_AFTER']
+            )
+        else:
+            self.shutdown()
+
+    def configure(self, workers: int, queue_size: int, retry_after: int = 1) -> None:
+        """
+        Start a process pool with (workers) processes. At most
+        (workers + queue_size) hashes may be running or waiting at once.
+        """
+        self.shutdown()
+        self._executor = self.new_executor(workers)
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self.retry_after = retry_after
+
+    def new_executor(self, workers: int) -> ProcessPoolExecutor:
+        """
+        A process pool whose workers hash with the calibrated cost.
+        """
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=set_rounds, initargs=(self.rounds,)
+        )
+
+    def import_executor(self, workers: int) -> ProcessPoolExecutor:
+        """
+        The process pool of bulk imports, started with (workers) processes
+        by the first import and shared by the ones after it.
+        """
+        with self._import_lock:
+            if self._import_executor is None:
+                self._import_executor = self.new_executor(workers)
+            return self._import_executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._import_lock:
+            if self._import_executor is not None:
+                self._import_executor.shutdown(wait=False, cancel_futures=True)
+            self._import_executor = None
+        self._executor = None
+        self._slots = None
+        self.workers = 0
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.queue_depth = 0
+            self.max_queue_depth = 0
+            self.calls = 0
+            self.rejected = 0
+            self.seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def collect(self) -> list:
+        stats = self.stats()
+        return [
+            ('password_hash_rounds', 'gauge', 'The bcrypt cost of new hashes.', self.rounds),
+            ('password_hash_queue_depth', 'gauge', 'Hashes running or waiting in the pool.', stats['queue_depth']),
+            ('password_hash_rejected_total', 'counter', 'Hashes rejected with a 503.', stats['rejected'])
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'calls': self.calls,
+                'rejected': self.rejected,
+                'seconds': self.seconds
+            }
+
+    def warm_up(self) -> None:
+        """
+        Load the bcrypt backend, in every worker when the pool is on, so
+        the first logins do not pay for it.
+        """
+        if self._executor is None:
+            _warm_up()
+        else:
+            for future in [self._executor.submit(_warm_up) for _ in range(self.workers)]:
+                future.result()
+
+    @staticmethod
+    def needs_update(password_hash: str) -> bool:
+        """
+        True for a hash made with a lower cost than the current one.
+        Reads the hash header only, nothing is hashed.
+        """
+        return PWD_CONTEXT.needs_update(password_hash)
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._run(_verify, password, password_hash)
+
+    def hash_many(self, passwords: list, executor: ProcessPoolExecutor = None) -> list:
+        """
+        Hash a batch of passwords in parallel on (executor), usually the
+        (import_executor), or inline when none is given. Never on the
+        request pool, whose queue is kept for logins.
+        """
+        start = time.perf_counter()
+        if executor is None:
+            hashes = [_hash(password) for password in passwords]
+        else:
+            hashes = list(executor.map(_hash, passwords))
+        with self._lock:
+            self.calls += len(passwords)
+            self.seconds += time.perf_counter() - start
+        return hashes
+
+    def _run(self, func: Callable[..., Any], *args) -> Any:
+        start = time.perf_counter()
+        executor, slots = self._executor, self._slots
+
+        if executor is None:
+            try:
+                return func(*args)
+            finally:
+                self._record(func, time.perf_counter() - start)
+
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashQueueFull(self.retry_after)
+
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            slots.release()
+            with self._lock:
+                self.queue_depth -= 1
+            self._record(func, time.perf_counter() - start)
+
+    def _record(self, func: Callable[..., Any], seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.seconds += seconds
+        metrics.bcrypt_time.observe(seconds, func.__name__.strip('_'))
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,201 @@
+"""
+This module defines the bulk user import (importer.py) used by the
+'flask users import' command and the 'users/import' endpoint.
+
+Rows are read as a stream of NDJSON or CSV records with the fields
+username, email and password. They are validated with (UserSchema) and
+(PasswordSchema), checked for taken usernames and emails with one query
+per batch, hashed in parallel and inserted in batches with one
+executemany per table. A failing row is reported and skipped, it never
+aborts the whole file.
+"""
+
+import io
+import csv
+import json
+from typing import Iterator, Iterable, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from marshmallow import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .hashing import hasher
+from .messages import ApiMessages as msg
+from .models import UserModel, PasswordModel
+from .schemas import UserSchema, PasswordSchema
+from .uniqueness import unique_users, translate_integrity_error
+from .throttle import login_throttle
+from .routing import shards
+from .sharding import directory
+
+FORMATS = ('ndjson', 'csv')
+
+
+def read_rows(stream: io.TextIOBase, fmt: str) -> Iterator[tuple]:
+    """
+    Yield (line number, record) pairs from a text stream.
+    A record that cannot be parsed is yielded as None.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+class UserImporter:
+    """
+    ** Validate, hash and insert users in batches. **
+    """
+
+    def __init__(self, batch_size: int = 1000, workers: int = 1,
+                 progress: Optional[Callable[[dict], None]] = None) -> None:
+        self.batch_size = batch_size
+        self.workers = workers
+        self.progress = progress
+        self.report = {'rows': 0, 'created': 0, 'failed': 0, 'errors': []}
+
+    def run(self, rows: Iterable[tuple]) -> dict:
+        executor = hasher.import_executor(self.workers) if self.workers > 1 else None
+        batch = []
+        for line_num, row in rows:
+            batch.append((line_num, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, executor)
+                batch = []
+        if batch:
+            self._import_batch(batch, executor)
+        return self.report
+
+    def _fail(self, line_num: int, errors: dict) -> None:
+        self.report['failed'] += 1
+        self.report['errors'].append({'line': line_num, 'errors': errors})
+
+    def _validate(self, batch: list) -> list:
+        loaded = []
+        seen = set()
+        # Taken usernames and emails are checked below for the whole batch
+        user_schema = UserSchema(context={'check_unique': False})
+        password_schema = PasswordSchema()
+
+        for line_num, row in batch:
+            if row is None:
+                loaded.append((line_num, msg.VALIDATION_ERROR, None, None))
+                continue
+
+            user_data = {key: row.get(key) for key in ('username', 'email')}
+            errors = {}
+            try:
+                user_load = user_schema.load(user_data)
+            except ValidationError as e:
+                errors.update(e.messages)
+            try:
+                password_load = password_schema.load({'password': row.get('password')})
+            except ValidationError as e:
+                errors.update(e.messages)
+
+            if not errors:
+                if user_load['username'] in seen:
+                    errors['username'] = msg.USER_EXIST
+                if user_load['email'] in seen:
+                    errors['email'] = msg.EMAIL_EXIST
+
+            if errors:
+                loaded.append((line_num, errors, None, None))
+                continue
+
+            seen.update((user_load['username'], user_load['email']))
+            loaded.append((line_num, None, user_load, password_load['password']))
+
+        users = [row[2] for row in loaded if row[2] is not None]
+        usernames, emails = unique_users.taken(
+            [user['username'] for user in users],
+            [user['email'] for user in users]
+        )
+
+        valid = []
+        for line_num, errors, user_load, password in loaded:
+            if errors is None:
+                errors = {}
+                if user_load['username'] in usernames:
+                    errors['username'] = msg.USER_EXIST
+                if user_load['email'] in emails:
+                    errors['email'] = msg.EMAIL_EXIST
+            if errors:
+                self._fail(line_num, errors)
+                continue
+            valid.append((line_num, user_load, password))
+        return valid
+
+    def _import_batch(self, batch: list, executor: Optional[ProcessPoolExecutor]) -> None:
+        self.report['rows'] += len(batch)
+        valid = self._validate(batch)
+
+        if valid:
+            hashes = hasher.hash_many([row[2] for row in valid], executor)
+            try:
+                self._insert(valid, hashes)
+            except IntegrityError:
+                # A row raced with another signup, insert one by one
+                db.session.rollback()
+                for row, password_hash in zip(valid, hashes):
+                    try:
+                        self._insert([row], [password_hash])
+                    except IntegrityError as e:
+                        db.session.rollback()
+                        violation = translate_integrity_error(e)
+                        self._fail(row[0], violation.data['message'] if violation else msg.VALIDATION_ERROR)
+
+        if self.progress is not None:
+            self.progress(self.report)
+
+    def _insert(self, rows: list, hashes: list) -> None:
+        if shards.enabled:
+            self._insert_sharded(rows, hashes)
+        else:
+            users = db.session.execute(
+                insert(UserModel).returning(UserModel.id, sort_by_parameter_order=True),
+                [row[1] for row in rows]
+            ).scalars().all()
+            db.session.execute(
+                insert(PasswordModel),
+                [
+                    {'userid': userid, 'password_hash': password_hash}
+                    for userid, password_hash in zip(users, hashes)
+                ]
+            )
+        db.session.commit()
+
+        self.report['created'] += len(rows)
+        for row in rows:
+            unique_users.add(row[1]['username'], row[1]['email'])
+            login_throttle.forget(row[1]['username'])
+
+    @staticmethod
+    def _insert_sharded(rows: list, hashes: list) -> None:
+        """
+        Take the user ids from the directory, then insert each user and
+        password on its shard.
+        """
+        placed = directory.allocate([row[1] for row in rows])
+        by_shard = {}
+        for (userid, shard), row, password_hash in zip(placed, rows, hashes):
+            users, passwords = by_shard.setdefault(shard, ([], []))
+            users.append({'id': userid, **row[1]})
+            passwords.append({'userid': userid, 'password_hash': password_hash})
+
+        for shard, (users, passwords) in by_shard.items():
+            with shards.use(shard):
+                db.session.execute(insert(UserModel), users)
+                db.session.execute(insert(PasswordModel), passwords)
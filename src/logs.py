@@ -0,0 +1,218 @@
+"""
+This module defines the structured logging pipeline (logs.py): JSON lines
+for the access log and for errors, written to a rotating file off the
+request path.
+
+* Request threads only format a record and put it on a bounded queue
+  (LOG_QUEUE_SIZE) through a (DroppingQueueHandler). When the queue is
+  full the record is dropped and counted instead of blocking the request.
+* A (QueueListener) thread writes the queue to LOG_FILE with a
+  RotatingFileHandler (LOG_MAX_BYTES, LOG_BACKUP_COUNT).
+* Records of LOG_LEVEL and above from every logger go to the file, with
+  the traceback of an exception in 'exc'. The root logger is lowered to
+  LOG_LEVEL when it is stricter, until (stop).
+* The 'src.access' logger gets one record per request with the method,
+  route, path, status, latency, DB time and statements, and user id.
+  ACCESS_LOG_SAMPLE_RATE is the share of successful (< 400) requests
+  logged; error responses are always logged.
+
+(log_pipeline.init_app) is called by 'run.py' and the ASGI factory, not
+by (create_app), so tests and CLI commands do not write log files.
+
+Doc: https://docs.python.org/3/howto/logging-cookbook.html#dealing-with-handlers-that-block
+"""
+
+import time
+import queue
+import atexit
+import random
+import logging
+import datetime
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Callable, Optional
+
+from flask import g, request
+
+from .representations import serializer
+
+access_logger = logging.getLogger('src.access')
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    ** One JSON object per record, with the 'fields' of the record merged in. **
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return serializer.dumps(entry).decode()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    ** A QueueHandler that drops records on a full queue instead of blocking. **
+    """
+
+    def __init__(self, log_queue: queue.Queue, on_drop: Callable[[], None]) -> None:
+        super().__init__(log_queue)
+        self.on_drop = on_drop
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Skip the formatting of a record that cannot be queued
+        if self.queue.full():
+            self.on_drop()
+            return
+        super().emit(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.on_drop()
+
+
+class LogPipeline:
+    """
+    ** The log queue, its file writer thread and the access log hooks. **
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._handlers = []
+        self._root_level = None
+
+    def init_app(self, app) -> None:
+        self.stop()
+        if not app.config['LOG_FILE']:
+            return
+
+        self.sample_rate = app.config['ACCESS_LOG_SAMPLE_RATE']
+        self.queue = queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE'])
+
+        file_handler = RotatingFileHandler(
+            app.config['LOG_FILE'],
+            maxBytes=app.config['LOG_MAX_BYTES'],
+            backupCount=app.config['LOG_BACKUP_COUNT'],
+            encoding='utf-8',
+            delay=True
+        )
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        self._listener = QueueListener(self.queue, file_handler)
+        self._listener.start()
+        atexit.register(self.stop)
+
+        # Errors of every logger, the app's included. The root logger
+        # (WARNING by default) would drop INFO and DEBUG records first
+        root = logging.getLogger()
+        handler = self._add_handler(root, app.config['LOG_LEVEL'])
+        if root.level > handler.level:
+            self._root_level = root.level
+            root.setLevel(handler.level)
+
+        if app.config['ACCESS_LOG_ENABLED']:
+            access_logger.setLevel(logging.INFO)
+            access_logger.propagate = False
+            self._add_handler(access_logger, logging.INFO)
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+        self.enabled = True
+
+    def _add_handler(self, logger: logging.Logger, level) -> DroppingQueueHandler:
+        handler = DroppingQueueHandler(self.queue, self._drop)
+        handler.setLevel(level)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        self._handlers.append((logger, handler))
+        return handler
+
+    def stop(self) -> None:
+        """
+        Detach the handlers, then write what is left on the queue.
+        """
+        for logger, handler in self._handlers:
+            logger.removeHandler(handler)
+        self._handlers = []
+        if self._root_level is not None:
+            logging.getLogger().setLevel(self._root_level)
+            self._root_level = None
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+            atexit.unregister(self.stop)
+        self.enabled = False
+
+    def collect(self) -> list:
+        return [
+            ('log_queue_size', 'gauge', 'Log records waiting for the file writer.', self.queue.qsize()),
+            ('log_records_dropped_total', 'counter', 'Log records dropped on a full queue.', self.dropped),
+            ('access_log_sampled_out_total', 'counter', 'Successful requests left out of the access log.', self.sampled_out)
+        ]
+
+    def _drop(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+    def access(self, method: str, route: Optional[str], path: str, status: int, latency: float,
+               db_time: Optional[float] = None, db_statements: Optional[int] = None,
+               userid: Optional[int] = None, remote_addr: Optional[str] = None) -> None:
+        """
+        Log one request, subject to the sampling of successful ones.
+        """
+        if status < 400 and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            return
+
+        access_logger.info('%s %s %s', method, path, status, extra={'fields': {
+            'method': method,
+            'route': route,
+            'path': path,
+            'status': status,
+            'latency_ms': round(latency * 1000, 3),
+            'db_time_ms': round(db_time * 1000, 3) if db_time is not None else None,
+            'db_statements': db_statements,
+            'user_id': userid,
+            'remote_addr': remote_addr,
+            'sample_rate': 1.0 if status >= 400 else self.sample_rate
+        }})
+
+    @staticmethod
+    def _before_request() -> None:
+        # Kept in the WSGI environ, batch sub-requests share (g)
+        request.environ['src.request_start'] = time.perf_counter()
+
+    def _after_request(self, response):
+        start = request.environ.get('src.request_start')
+        if start is not None:
+            self.access(
+                request.method,
+                request.url_rule.rule if request.url_rule is not None else None,
+                request.path,
+                response.status_code,
+                time.perf_counter() - start,
+                db_time=g.get('db_time'),
+                db_statements=g.get('db_statements'),
+                userid=g.get('auth_userid'),
+                remote_addr=request.remote_addr
+            )
+        return response
+
+
+log_pipeline = LogPipeline()
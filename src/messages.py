@@ -36,6 +36,8 @@ class ApiMessages:
     PERMISSION_ERROR = {'error': 'Permission error.'}
     NOT_FOUND_ERROR = {'error': 'Not found.'}
     INTERNAL_ERROR = {'error': 'Internal Server Error.'}
+    SERVICE_UNAVAILABLE = {'error': 'Service is busy, please retry later.'}
+    TOO_MANY_REQUESTS = {'error': 'Too many login attempts, please retry later.'}
 
     INVALID_USERNAME = {'error': 'Invalid username.'}
     INVALID_PASSWORD = {'error': 'Invalid password.'}
@@ -47,4 +49,10 @@ class ApiMessages:
     EMAIL_INVALID_FORMAT_ERROR = {'error': 'Invalid email format.'}
     PASSWORD_ISNOT_SECURE_ERROR = {'error': 'The password must contain uppercase and lowercase letters, numbers, and symbols.'}
 
+    INVALID_CURSOR = {'error': 'Invalid cursor.'}
+    INVALID_LIMIT = {'error': 'The limit is out of range.'}
+
+    INVALID_BATCH_SIZE = {'error': 'The number of batch requests is out of range.'}
+    BATCH_NOT_ALLOWED = {'error': 'This resource cannot be used in a batch.'}
+
     # Other messages
@@ -0,0 +1,224 @@
+"""
+This module defines the in-process metrics (metrics.py) exposed in the
+Prometheus text format on the '/metrics' endpoint.
+
+* Request counts by resource, method and status, and latency histograms.
+* DB statement counts and time, per statement and per request, taken
+  from SQLAlchemy engine events.
+* Time spent in bcrypt and in jwt.encode / jwt.decode.
+* Login attempts rejected by the throttle.
+* Gauges read at scrape time from the hashing pool and the caches.
+
+Every update takes one short per-metric lock, so the collectors can stay
+enabled in production.
+
+Doc: https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Any, Iterator
+
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from werkzeug.exceptions import HTTPException
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Statements per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labels, labels)} {value}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, labels: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._values.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, ([*s[0]], s[1], s[2])) for labels, s in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket
+                names = (*self.labels, 'le')
+                values = (*labels, bound)
+                lines.append(f'{self.name}_bucket{_labels(names, values)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {count}')
+        return lines
+
+
+class Metrics:
+    """
+    ** Registry of the application metrics. **
+    """
+
+    def __init__(self) -> None:
+        self.requests = Counter(
+            'http_requests_total', 'HTTP requests.', ('resource', 'method', 'status')
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'HTTP request latency.', ('resource', 'method')
+        )
+        self.db_statements = Counter(
+            'db_statements_total', 'SQL statements executed.'
+        )
+        self.db_statement_time = Histogram(
+            'db_statement_duration_seconds', 'SQL statement latency.'
+        )
+        self.db_request_statements = Histogram(
+            'db_request_statements', 'SQL statements per request.', ('resource',), COUNT_BUCKETS
+        )
+        self.db_request_time = Histogram(
+            'db_request_duration_seconds', 'SQL time per request.', ('resource',)
+        )
+        self.db_commits = Counter('db_commits_total', 'Database commits.')
+        self.bcrypt_time = Histogram(
+            'bcrypt_duration_seconds', 'Time spent in bcrypt, including queueing.', ('operation',)
+        )
+        self.jwt_time = Histogram(
+            'jwt_duration_seconds', 'Time spent in jwt.encode and jwt.decode.', ('operation',)
+        )
+        self.login_throttled = Counter(
+            'login_throttled_total', 'Login attempts rejected by the throttle.', ('reason',)
+        )
+        self.collectors = []
+        self.enabled = True
+
+    def init_app(self, app, engine) -> None:
+        self.enabled = app.config['METRICS_ENABLED']
+        if self.enabled:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_collector(self, collector: Callable[[], list]) -> None:
+        """
+        (collector) returns (name, type, help, value) tuples at scrape time.
+        """
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        # Kept on the statement's context, which a failing statement drops
+        context.metrics_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - context.metrics_start
+        self.db_statements.inc()
+        self.db_statement_time.observe(elapsed)
+        if has_app_context():
+            g.db_statements = g.get('db_statements', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
+
+    @contextmanager
+    def timer(self, histogram: Histogram, *labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, *labels)
+
+    def observe_request(self, resource: str, method: str, status: int, seconds: float) -> None:
+        self.requests.inc(resource, method, status)
+        self.latency.observe(seconds, resource, method)
+        if has_app_context():
+            self.db_request_statements.observe(g.get('db_statements', 0), resource)
+            self.db_request_time.observe(g.get('db_time', 0.0), resource)
+
+    def instrument(self, view: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        API view decorator that records requests, latency and DB use.
+        """
+        resource = getattr(view, 'view_class', view).__name__
+
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Any:
+            g.db_statements = 0
+            g.db_time = 0.0
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = view(*args, **kwargs)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.code
+                raise
+            finally:
+                self.observe_request(resource, request.method, status, time.perf_counter() - start)
+        return wrapper
+
+    def render(self) -> str:
+        lines = []
+        for metric in (
+            self.requests, self.latency, self.db_statements, self.db_statement_time,
+            self.db_request_statements, self.db_request_time, self.db_commits,
+            self.bcrypt_time, self.jwt_time, self.login_throttled
+        ):
+            lines += metric.render()
+
+        for collector in self.collectors:
+            for name, kind, help, value in collector():
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
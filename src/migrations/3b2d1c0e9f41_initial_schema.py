@@ -0,0 +1,53 @@
+"""Initial schema
+
+Revision ID: 3b2d1c0e9f41
+Revises: 
+Create Date: 2026-10-18 11:17:56.339582
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b2d1c0e9f41'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = ('default',)
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=60), nullable=False),
+    sa.Column('email', sa.String(length=60), nullable=False),
+    sa.Column('datetime', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('confirm_user', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('passwords',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=True),
+    sa.Column('last_update', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('userid', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['userid'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(), nullable=True),
+    sa.Column('userid', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['userid'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tokens')
+    op.drop_table('passwords')
+    op.drop_table('users')
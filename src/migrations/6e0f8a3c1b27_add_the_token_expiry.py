@@ -0,0 +1,33 @@
+"""Add the token expiry
+
+tokens.expires_at, copied from the JWT 'exp' claim, indexed for the
+expired token sweep.
+
+Revision ID: 6e0f8a3c1b27
+Revises: d41c7b9e2f05
+Create Date: 2026-10-18 11:18:00.351862
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e0f8a3c1b27'
+down_revision: Union[str, None] = 'd41c7b9e2f05'
+branch_labels: Union[str, Sequence[str], None] = ()
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('tokens') as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_tokens_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tokens') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tokens_expires_at'))
+        batch_op.drop_column('expires_at')
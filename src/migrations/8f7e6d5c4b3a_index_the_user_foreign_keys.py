@@ -0,0 +1,35 @@
+"""Index the user foreign keys
+
+Unique indexes on passwords.userid and tokens.userid, both one-to-one
+with users. A user may have several token rows from before the index;
+only the newest one is kept.
+
+Revision ID: 8f7e6d5c4b3a
+Revises: a93d5e1f7c48
+Create Date: 2026-10-18 11:18:03.627927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f7e6d5c4b3a'
+down_revision: Union[str, None] = 'a93d5e1f7c48'
+branch_labels: Union[str, Sequence[str], None] = ()
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        'DELETE FROM tokens WHERE userid IS NOT NULL AND id NOT IN '
+        '(SELECT MAX(id) FROM tokens WHERE userid IS NOT NULL GROUP BY userid)'
+    )
+    op.create_index(op.f('ix_passwords_userid'), 'passwords', ['userid'], unique=True)
+    op.create_index(op.f('ix_tokens_userid'), 'tokens', ['userid'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tokens_userid'), table_name='tokens')
+    op.drop_index(op.f('ix_passwords_userid'), table_name='passwords')
@@ -0,0 +1,31 @@
+"""Add the user version
+
+users.version, bumped by every update of the user, the ETag of
+'GET /user'.
+
+Revision ID: a93d5e1f7c48
+Revises: 6e0f8a3c1b27
+Create Date: 2026-10-18 11:18:01.972530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93d5e1f7c48'
+down_revision: Union[str, None] = '6e0f8a3c1b27'
+branch_labels: Union[str, Sequence[str], None] = ()
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
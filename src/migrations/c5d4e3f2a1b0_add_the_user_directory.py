@@ -0,0 +1,37 @@
+"""Add the user directory
+
+Maps usernames and emails to a user id and the shard that holds the
+user's rows. Only used when DB_SHARD_URIS is set.
+
+Revision ID: c5d4e3f2a1b0
+Revises: 8f7e6d5c4b3a
+Create Date: 2026-10-18 12:05:41.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d4e3f2a1b0'
+down_revision: Union[str, None] = '8f7e6d5c4b3a'
+branch_labels: Union[str, Sequence[str], None] = ()
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_directory',
+    sa.Column('userid', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=60), nullable=False),
+    sa.Column('email', sa.String(length=60), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('userid'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_directory')
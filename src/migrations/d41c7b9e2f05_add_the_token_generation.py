@@ -0,0 +1,31 @@
+"""Add the token generation
+
+users.token_generation, the generation embedded in new auth tokens.
+Bumping it revokes every token issued before.
+
+Revision ID: d41c7b9e2f05
+Revises: 3b2d1c0e9f41
+Create Date: 2026-10-18 11:17:58.104217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41c7b9e2f05'
+down_revision: Union[str, None] = '3b2d1c0e9f41'
+branch_labels: Union[str, Sequence[str], None] = ()
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('token_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_generation')
@@ -11,29 +11,35 @@ Doc: https://flask-sqlalchemy.palletsprojects.com/en/3.1.x/
 
 import os
 import datetime
-from typing import Type
+from typing import Type, Optional
 
 import jwt
 from dotenv import load_dotenv
 from sqlalchemy.sql import func
-from sqlalchemy.orm import backref
+from sqlalchemy.orm import backref, joinedload, selectinload, lazyload, noload
 from sqlalchemy.event import listens_for
-from passlib.context import CryptContext
 
 from src import db
+from src.hashing import PWD_CONTEXT, hasher
+from src.transaction import uow
+from src.metrics import metrics
 
 load_dotenv()
 
-# Configuration of CryptContext for using bcrypt
-# and automatic management of deprecated algorithms.
-PWD_CONTEXT = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
 # JWT settings
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_DAYS = 3  # Token lifetime in days
 
+# Relationship loading strategies by name
+LOADERS = {
+    'joined': joinedload,
+    'selectin': selectinload,
+    'select': lazyload,
+    'noload': noload
+}
+
 
 class UserModel(db.Model):
     __tablename__ = 'users'
@@ -43,6 +49,9 @@ class UserModel(db.Model):
     email = db.Column(db.String(60), unique=True, nullable=False)
     datetime = db.Column(db.DateTime(timezone=True), default=func.now())
     confirm_user = db.Column(db.Boolean, default=False)
+    token_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped by every update, the ETag of 'GET /user'
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     password = db.relationship(
         'PasswordModel',
         backref='users',
@@ -61,19 +70,39 @@ class UserModel(db.Model):
     def __repr__(self) -> str:
         return f'<User: {self.username}>'
 
+    @classmethod
+    def get_by_username(cls, username: str, loading: dict = None) -> Optional['UserModel']:
+        """
+        Load a user by username. (loading) maps relationship names to a
+        strategy in LOADERS, e.g. {'password': 'joined'} loads the password
+        in the same SELECT.
+        """
+        if not sharding.directory.select_username(username):
+            return None
+
+        options = [
+            LOADERS[strategy](getattr(cls, name))
+            for name, strategy in (loading or {}).items()
+        ]
+        return cls.query.options(*options).filter_by(username=username).first()
+
     def create(self, user: Type['UserModel']) -> None:
+        sharding.directory.place(user)
         db.session.add(user)
-        db.session.commit()
+        uow.commit()
 
     def update(self, data: dict) -> None:
         for key, value in data.items():
             if hasattr(self, key):
                 setattr(self, key, value)
-                db.session.commit()
+        self.version = UserModel.version + 1
+        sharding.directory.rename(self.id, data.get('username'), data.get('email'))
+        uow.commit()
 
     def delete(self, user: Type['UserModel']) -> None:
         db.session.delete(user)
-        db.session.commit()
+        sharding.directory.remove(user.id)
+        uow.commit()
 
 
 class PasswordModel(db.Model):
@@ -82,7 +111,7 @@ class PasswordModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     password_hash = db.Column(db.String(255))
     last_update = db.Column(db.DateTime(timezone=True), default=func.now())
-    userid = db.Column(db.Integer, db.ForeignKey('users.id'))
+    userid = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, index=True)
 
     def __repr__(self) -> str:
         return f'<User_id: {self.userid}>'
@@ -91,17 +120,33 @@ class PasswordModel(db.Model):
         self.last_update = func.now()
 
     def hash_password(self, password: str) -> None:
-        self.password_hash = PWD_CONTEXT.hash(password)
+        self.password_hash = hasher.hash(password)
 
     def verify_password(self, password: str, password_hash: str) -> bool:
-        return PWD_CONTEXT.verify(password, password_hash)
+        return hasher.verify(password, password_hash)
 
     def create(self, password: Type['PasswordModel']) -> None:
         db.session.add(password)
-        db.session.commit()
+        uow.commit()
 
     def update(self) -> None:
-        db.session.commit()
+        uow.commit()
+
+
+class UserDirectoryModel(db.Model):
+    """
+    Username and email to user id and shard, kept on the primary.
+    Only used when DB_SHARD_URIS is set.
+    """
+    __tablename__ = 'user_directory'
+
+    userid = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(60), unique=True, nullable=False)
+    email = db.Column(db.String(60), unique=True, nullable=False)
+    shard = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<User_id: {self.userid}, shard: {self.shard}>'
 
 
 class AuthTokenModel(db.Model):
@@ -109,31 +154,36 @@ class AuthTokenModel(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     token = db.Column(db.String, unique=True)
-    userid = db.Column(db.Integer, db.ForeignKey('users.id'))
+    userid = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, index=True)
+    expires_at = db.Column(db.DateTime, index=True)
 
     def __repr__(self) -> str:
         return f'<User_id: {self.userid}>'
 
-    def get_auth_token(self, userid: int) -> str:
+    def get_auth_token(self, userid: int, generation: int = 0) -> str:
         payload = {
             'exp': datetime.datetime.utcnow() + datetime.timedelta(days=JWT_EXPIRATION_DAYS),
-            'sub': userid
+            'sub': userid,
+            'gen': generation
         }
-        self.token = jwt.encode(
-            payload,
-            SECRET_KEY,
-            algorithm=JWT_ALGORITHM
-        )
+        with metrics.timer(metrics.jwt_time, 'encode'):
+            self.token = jwt.encode(
+                payload,
+                SECRET_KEY,
+                algorithm=JWT_ALGORITHM
+            )
+        self.expires_at = payload['exp']
         return self.token
 
     def verify_auth_token(self, token: str) -> dict or bool:
         try:
-            decoded_token = jwt.decode(
-                token,
-                SECRET_KEY,
-                algorithms=JWT_ALGORITHM,
-                options={'require': ['exp', 'sub']}
-            )
+            with metrics.timer(metrics.jwt_time, 'decode'):
+                decoded_token = jwt.decode(
+                    token,
+                    SECRET_KEY,
+                    algorithms=JWT_ALGORITHM,
+                    options={'require': ['exp', 'sub']}
+                )
             return decoded_token
         except jwt.DecodeError:
             return False
@@ -144,11 +194,15 @@ class AuthTokenModel(db.Model):
 
     def create(self, auth: Type['AuthTokenModel']) -> None:
         db.session.add(auth)
-        db.session.commit()
+        uow.commit()
 
     def update(self) -> None:
-        db.session.commit()
+        uow.commit()
 
     def delete(self, auth: Type['AuthTokenModel']) -> None:
         db.session.delete(auth)
-        db.session.commit()
+        uow.commit()
+
+
+# The directory of the sharded mode is built on the models above
+from src import sharding  # noqa: E402
@@ -0,0 +1,173 @@
+"""
+This module defines the on-demand request profiler (profiling.py).
+
+When PROFILING_ENABLED is set, a request that carries the PROFILING_HEADER
+with the secret PROFILING_TOKEN runs under cProfile, and under tracemalloc
+as well if the header value ends with ':memory'. Every SQL statement of
+the request is captured with its timing.
+
+tracemalloc is process-wide, so one request at a time is traced. A memory
+profile asked for while another runs gets the cProfile report only.
+
+The report is returned instead of the response, as a text attachment, or
+written to PROFILING_DIR, which keeps the last PROFILING_KEEP reports.
+
+When profiling is disabled, nothing is registered: no view wrapper
+and no engine events.
+
+Doc: https://docs.python.org/3/library/profile.html
+"""
+
+import io
+import os
+import hmac
+import time
+import threading
+import pstats
+import cProfile
+import datetime
+import tracemalloc
+from functools import wraps
+from typing import Callable, Any
+
+from flask import g, request, current_app, Response
+from sqlalchemy import event
+
+# Rows of the cProfile and tracemalloc tables in the report
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+
+class RequestProfiler:
+    """
+    ** Profile single requests selected by an admin header. **
+    """
+
+    def __init__(self) -> None:
+        self._memory_lock = threading.Lock()
+
+    def init_app(self, app, engine) -> None:
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        # Kept on the statement's context, which a failing statement drops
+        context.profile_start = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - context.profile_start
+        if 'profile_queries' in g:
+            g.profile_queries.append((statement, elapsed))
+
+    @staticmethod
+    def _requested() -> tuple:
+        """
+        Return (profile, memory) flags for the current request.
+        """
+        value = request.headers.get(current_app.config['PROFILING_HEADER'])
+        secret = current_app.config['PROFILING_TOKEN']
+        if not value or not secret:
+            return False, False
+
+        token, _, mode = value.partition(':')
+        if not hmac.compare_digest(token.encode(), secret.encode()):
+            return False, False
+        return True, mode == 'memory'
+
+    def wrap(self, view: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        API view decorator that profiles the request when asked to.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Any:
+            profile, memory = self._requested()
+            if not profile:
+                return view(*args, **kwargs)
+
+            g.profile_queries = []
+            busy = memory and not self._memory_lock.acquire(blocking=False)
+            memory = memory and not busy
+            if memory:
+                tracemalloc.start()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                response = profiler.runcall(view, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                snapshot = None
+                if memory:
+                    try:
+                        snapshot = tracemalloc.take_snapshot()
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    finally:
+                        self._memory_lock.release()
+
+            report = self.report(response, elapsed, profiler, g.profile_queries)
+            if snapshot is not None:
+                report += self.memory_report(snapshot, peak)
+            elif busy:
+                report += 'Memory: skipped, another memory profile is running.\n'
+            return self.output(response, report)
+        return wrapper
+
+    @staticmethod
+    def report(response, elapsed: float, profiler: cProfile.Profile, queries: list) -> str:
+        out = io.StringIO()
+        out.write(f'{request.method} {request.full_path.rstrip("?")}\n')
+        out.write(f'Status: {response.status_code}\n')
+        out.write(f'Time: {elapsed * 1000:.2f} ms\n\n')
+
+        total = sum(seconds for _, seconds in queries)
+        out.write(f'SQL statements: {len(queries)} in {total * 1000:.2f} ms\n')
+        for number, (statement, seconds) in enumerate(queries, start=1):
+            out.write(f'{number:>3}. {seconds * 1000:8.2f} ms  {" ".join(statement.split())}\n')
+        out.write('\n')
+
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+    @staticmethod
+    def memory_report(snapshot: tracemalloc.Snapshot, peak: int) -> str:
+        lines = [f'Memory peak: {peak / 1024:.1f} KiB', '']
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def output(response, report: str) -> Response:
+        name = '{}-{}-{}.txt'.format(
+            datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'),
+            request.method.lower(),
+            request.endpoint
+        )
+
+        if current_app.config['PROFILING_OUTPUT'] == 'attachment':
+            return Response(
+                report,
+                status=200,
+                mimetype='text/plain',
+                headers={
+                    'Content-Disposition': f'attachment; filename={name}',
+                    'X-Profile-Status': str(response.status_code)
+                }
+            )
+
+        directory = current_app.config['PROFILING_DIR']
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), 'w') as file:
+            file.write(report)
+
+        reports = sorted(os.listdir(directory))
+        for old in reports[:-current_app.config['PROFILING_KEEP']]:
+            os.remove(os.path.join(directory, old))
+
+        response.headers['X-Profile-File'] = name
+        return response
+
+
+profiler = RequestProfiler()
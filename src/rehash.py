@@ -0,0 +1,113 @@
+"""
+This module defines the password rehasher (rehash.py).
+
+After a successful login with a hash made at a lower bcrypt cost than the
+calibrated one (see hashing.py), the password is hashed again and stored
+by a background thread, off the response path. The update only applies
+while the row still holds the old hash, so a password changed in the
+meantime is never overwritten.
+
+The queue is bounded by PASSWORD_REHASH_QUEUE_SIZE. When it is full the
+rehash is dropped; it happens again on a later login.
+"""
+
+import queue
+import threading
+
+from sqlalchemy import update
+
+from . import db
+from .hashing import hasher
+from .models import PasswordModel
+from .routing import shards
+
+
+class PasswordRehasher:
+    """
+    ** Rewrites outdated password hashes in a background thread. **
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.rehashed = 0
+        self.dropped = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app) -> None:
+        self.stop()
+        self.app = app
+        self.enabled = app.config['PASSWORD_REHASH']
+        self._queue = queue.Queue(maxsize=app.config['PASSWORD_REHASH_QUEUE_SIZE'])
+
+    def collect(self) -> list:
+        return [
+            ('password_rehash_total', 'counter', 'Outdated password hashes rewritten.', self.rehashed),
+            ('password_rehash_dropped_total', 'counter', 'Rehashes dropped on a full queue.', self.dropped)
+        ]
+
+    def submit(self, password: PasswordModel, plain_password: str) -> bool:
+        """
+        Queue a rehash of (password) when its hash is outdated.
+        Returns True when one was queued.
+        """
+        if not self.enabled or not hasher.needs_update(password.password_hash):
+            return False
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='password-rehash', daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait((shards.current(), password.id, password.password_hash, plain_password))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def join(self) -> None:
+        """
+        Wait until every queued rehash is done.
+        """
+        self._queue.join()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                shard, *args = item
+                with self.app.app_context(), shards.use(shard):
+                    try:
+                        self.rehash(*args)
+                    except Exception:
+                        db.session.rollback()
+                        self.app.logger.exception('Password rehash failed.')
+            finally:
+                self._queue.task_done()
+
+    def rehash(self, password_id: int, old_hash: str, plain_password: str) -> bool:
+        new_hash = hasher.hash(plain_password)
+        result = db.session.execute(
+            update(PasswordModel)
+            .where(PasswordModel.id == password_id, PasswordModel.password_hash == old_hash)
+            .values(password_hash=new_hash)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        if result.rowcount:
+            with self._lock:
+                self.rehashed += 1
+        return bool(result.rowcount)
+
+
+rehasher = PasswordRehasher()
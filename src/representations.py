@@ -0,0 +1,134 @@
+"""
+This module defines the JSON representation layer (representations.py)
+used for request parsing and response output.
+
+* JSON_ENGINE selects the encoder: 'orjson' (the default, falls back to
+  'json' when it is not installed) or the stdlib 'json'. Output is compact
+  in every mode.
+* The error envelope of every (ApiMessages) constant and the constant
+  success responses are serialized once at startup. Views return them with
+  (serializer.error) and (serializer.success) without encoding anything.
+
+Dependencies:
+* orjson: A fast JSON library, optional.
+
+Doc: https://github.com/ijl/orjson
+"""
+
+import json
+import decimal
+from typing import Any, Optional
+
+from flask import Response, make_response
+from flask.json.provider import JSONProvider
+
+from .messages import success_msg, error_msg
+from .messages import ApiMessages as msg
+
+try:
+    import orjson
+except ImportError:     # pragma: no cover
+    orjson = None
+
+# Success payloads returned often enough to be serialized at startup
+SUCCESS_CONSTANTS = ('Hello World',)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JsonProvider(JSONProvider):
+    """
+    ** Flask JSON provider backed by (serializer), used by request.json. **
+    """
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return serializer.dumps(obj).decode()
+
+    def loads(self, s: str or bytes, **kwargs) -> Any:
+        return serializer.loads(s)
+
+
+class JsonSerializer:
+    """
+    ** Pluggable JSON encoder and the pre-serialized constant responses. **
+    """
+
+    def __init__(self) -> None:
+        self.engine = None
+        self._errors = {}
+        self._successes = {}
+        self.configure('orjson')
+
+    def init_app(self, app, api) -> None:
+        self.configure(app.config['JSON_ENGINE'])
+        app.json = JsonProvider(app)
+        api.representation('application/json')(self.output_json)
+
+    def configure(self, engine: str) -> None:
+        if engine == 'orjson' and orjson is None:
+            engine = 'json'
+        self.engine = engine
+
+        # ApiMessages constants are compared by identity
+        self._errors = {
+            id(value): self.dumps(error_msg(value)) + b'\n'
+            for name, value in vars(msg).items()
+            if not name.startswith('_') and isinstance(value, dict)
+        }
+        self._successes = {
+            data: self.dumps(success_msg(data)) + b'\n' for data in SUCCESS_CONSTANTS
+        }
+
+    def dumps(self, data: Any) -> bytes:
+        if self.engine == 'orjson':
+            return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(data, default=_default, separators=(',', ':'), ensure_ascii=False).encode()
+
+    def loads(self, data: str or bytes) -> Any:
+        if self.engine == 'orjson':
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def output_json(self, data: Any, code: int, headers: Optional[dict] = None) -> Response:
+        """
+        Flask-RESTful representation for 'application/json'.
+        """
+        response = make_response(self.dumps(data) + b'\n', code)
+        response.mimetype = 'application/json'
+        response.headers.extend(headers or {})
+        return response
+
+    def error_body(self, message: dict) -> bytes:
+        """
+        The serialized error envelope of (message).
+        """
+        body = self._errors.get(id(message))
+        if body is None:
+            body = self.dumps(error_msg(message)) + b'\n'
+        return body
+
+    def success_body(self, data: Any) -> bytes:
+        try:
+            body = self._successes.get(data)
+        except TypeError:
+            body = None
+        if body is None:
+            body = self.dumps(success_msg(data)) + b'\n'
+        return body
+
+    def error(self, message: dict, status: int) -> Response:
+        return Response(self.error_body(message), status=status, mimetype='application/json')
+
+    def success(self, data: Any, status: int = 200) -> Response:
+        return Response(self.success_body(data), status=status, mimetype='application/json')
+
+
+serializer = JsonSerializer()
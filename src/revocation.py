@@ -0,0 +1,123 @@
+"""
+This module defines the auth token revocation index (revocation.py).
+
+Every user has a token generation number stored in the 'users' table and
+signed into each JWT as the 'gen' claim. Logging out or changing the
+password bumps the generation, which revokes every token issued before.
+Deleting the user revokes all of them.
+
+(authenticate) checks the generation of the token's user on every request.
+Generations are cached in process for REVOCATION_CACHE_TTL seconds, so
+the check is a dict lookup and the 'users' row is read at most once per
+TTL. The cache is updated in place on logout, password change and
+deletion; the same changes made by another process are seen once the
+entry expires.
+"""
+
+import threading
+from typing import Optional
+
+from sqlalchemy import select
+
+from . import db
+from .cache import TTLCache
+from .models import UserModel
+
+# Cached for a user without a 'users' row, all of its tokens are revoked
+DELETED = object()
+
+
+class RevocationIndex(TTLCache):
+    """
+    ** Token generations by user id. **
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._revoke_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.configure(
+            maxsize=app.config['REVOCATION_CACHE_SIZE'],
+            ttl=app.config['REVOCATION_CACHE_TTL']
+        )
+
+    def collect(self) -> list:
+        stats = self.stats()
+        return [
+            ('revocation_cache_hits_total', 'counter', 'Token generations read from the cache.', stats['hits']),
+            ('revocation_cache_misses_total', 'counter', 'Token generations read from the DB.', stats['misses'])
+        ]
+
+    @staticmethod
+    def statement(userid: int):
+        return select(UserModel.token_generation).where(UserModel.id == userid)
+
+    def _store(self, userid: int, generation: Optional[int]):
+        generation = DELETED if generation is None else generation
+        self.set(userid, generation)
+        return generation
+
+    def generation(self, userid: int):
+        """
+        The current generation of (userid), (DELETED) for a deleted user.
+        In sharded mode the shard of the user must be selected.
+        """
+        generation = self.get(userid)
+        if generation is None:
+            row = db.session.execute(self.statement(userid)).scalar_one_or_none()
+            generation = self._store(userid, row)
+        return generation
+
+    async def generation_async(self, session, userid: int):
+        """
+        Same as (generation) on an async session.
+        """
+        generation = self.get(userid)
+        if generation is None:
+            row = (await session.execute(self.statement(userid))).scalar_one_or_none()
+            generation = self._store(userid, row)
+        return generation
+
+    @staticmethod
+    def _revoked(claims: dict, generation) -> bool:
+        return generation is DELETED or claims.get('gen', 0) < generation
+
+    def is_revoked(self, claims: dict) -> bool:
+        return self._revoked(claims, self.generation(claims['sub']))
+
+    async def is_revoked_async(self, session, claims: dict) -> bool:
+        return self._revoked(claims, await self.generation_async(session, claims['sub']))
+
+    def current(self, user: UserModel) -> int:
+        """
+        Generation to sign into a new token for (user).
+        """
+        cached = self.get(user.id)
+        if cached is DELETED:
+            # The id of a deleted user, given to (user) by the DB
+            self.delete(user.id)
+            cached = None
+        if cached is None:
+            return user.token_generation or 0
+        return max(user.token_generation or 0, cached)
+
+    def revoke(self, user: UserModel) -> int:
+        """
+        Revoke all tokens of (user) and return the new generation to store.
+        The cache is updated before the commit, so a failed commit can
+        only revoke too much, never too little.
+        """
+        with self._revoke_lock:
+            generation = self.current(user) + 1
+            self.set(user.id, generation)
+            return generation
+
+    def revoke_deleted(self, userid: int) -> None:
+        """
+        Revoke all tokens of the user (userid) being deleted.
+        """
+        self.set(userid, DELETED)
+
+
+revocations = RevocationIndex()
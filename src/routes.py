@@ -9,7 +9,12 @@ from .views import (
     UserApi,
     AuthApi,
     PasswordApi,
-    HelloWorld
+    UserListApi,
+    UserImportApi,
+    BatchApi,
+    HelloWorld,
+    metrics_view,
+    readiness_view
 )
 
 
@@ -17,4 +22,16 @@ def api_routes(api) -> None:
     api.add_resource(UserApi, 'user')
     api.add_resource(AuthApi, 'user/auth')
     api.add_resource(PasswordApi, 'user/password')
+    api.add_resource(UserListApi, 'users')
+    api.add_resource(UserImportApi, 'users/import')
+    api.add_resource(BatchApi, 'batch')
     api.add_resource(HelloWorld, 'hello')
+
+
+def metrics_routes(app) -> None:
+    if app.config['METRICS_ENABLED']:
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', metrics_view)
+
+
+def readiness_routes(app) -> None:
+    app.add_url_rule(app.config['READINESS_PATH'], 'readiness', readiness_view)
@@ -0,0 +1,240 @@
+"""
+This module defines read-replica and shard routing (routing.py) for the
+Flask app. (RoutingSession) is the class of db.session.
+
+Shards
+------
+With DB_SHARD_URIS set, the 'users', 'passwords' and 'tokens' tables live
+in the shard databases; every other table stays on the primary. Statements
+on the sharded tables go to the shard selected for the current app context
+with (shards.select) or (shards.use), which the directory in sharding.py
+does from the user id or username. Using a sharded table without a
+selected shard raises (NoShardSelected).
+
+Replicas
+--------
+During a GET or HEAD API request (RoutingSession) sends plain SELECTs to
+one of the replicas in DB_REPLICA_URIS, as long as the session has not
+written anything in its current transaction. Writes, SELECT ... FOR UPDATE
+and every statement after the first write go to the primary, so a write
+transaction never mixes in replica reads. Other requests read what they
+change, and run on the primary only.
+
+After a request commits a write, its client reads from the primary for
+DB_REPLICA_STICKY_SECONDS, so it sees its own changes despite the
+replication lag. A write marks both the remote address and, with an auth
+token, the user; a read is kept on the primary when either is marked, so
+the requests after a sign-up or login, sent with the new token, still
+read from the primary.
+
+Outside a request (CLI commands, background threads, startup) everything
+goes to the primary. Statements on sharded tables are never sent to a
+replica. The ASGI app keeps its own engine and is not routed.
+"""
+
+import random
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from flask import g, request, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, create_engine, event, inspect
+from sqlalchemy.sql.util import find_tables
+
+from .cache import TTLCache
+
+# Tables partitioned by user id in sharded mode
+SHARDED_TABLES = frozenset(('users', 'passwords', 'tokens'))
+
+# Request methods whose reads may go to a replica
+REPLICA_METHODS = frozenset(('GET', 'HEAD'))
+
+
+class NoShardSelected(RuntimeError):
+    """
+    Raised for a statement on a sharded table before a shard is selected.
+    """
+
+
+def _engines(app, key: str) -> list:
+    from .database import engine_options, init_engine
+
+    engines = []
+    for url in app.config[key]:
+        engine = create_engine(url, **engine_options(app.config, url))
+        init_engine(engine, app.config)
+        engines.append(engine)
+    return engines
+
+
+class ShardSet:
+    """
+    ** The shard engines and the shard selected for the app context. **
+    """
+
+    def __init__(self) -> None:
+        self.engines = []
+
+    def init_app(self, app) -> None:
+        self.dispose()
+        self.engines = _engines(app, 'DB_SHARD_URIS')
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+        self.engines = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    @staticmethod
+    def current() -> Optional[int]:
+        return g.get('shard') if has_app_context() else None
+
+    @staticmethod
+    def select(shard: Optional[int]) -> None:
+        g.shard = shard
+
+    @contextmanager
+    def use(self, shard: Optional[int]) -> Iterator[None]:
+        """
+        Select (shard) for the block, then restore the previous one.
+        """
+        previous = self.current()
+        self.select(shard)
+        try:
+            yield
+        finally:
+            self.select(previous)
+
+    def each(self) -> Iterator[Optional[int]]:
+        """
+        Select every shard in turn, or yield None once when not sharded.
+        """
+        if not self.enabled:
+            yield None
+            return
+        for shard in range(len(self.engines)):
+            with self.use(shard):
+                yield shard
+
+    def route(self, mapper, clause) -> Optional[object]:
+        """
+        The engine of the selected shard for a statement on a sharded
+        table, None for any other statement.
+        """
+        if not self.engines:
+            return None
+        if mapper is not None:
+            tables = [inspect(mapper).local_table]
+        elif clause is not None:
+            tables = find_tables(clause, include_crud=True)
+        else:
+            return None
+        if not any(table.name in SHARDED_TABLES for table in tables):
+            return None
+
+        shard = self.current()
+        if shard is None:
+            raise NoShardSelected('No shard is selected for a statement on a sharded table.')
+        return self.engines[shard]
+
+
+shards = ShardSet()
+
+
+class ReplicaSet:
+    """
+    ** The replica engines and the sticky-primary window. **
+    """
+
+    def __init__(self) -> None:
+        self.engines = []
+        self.sticky = TTLCache()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, session) -> None:
+        self.dispose()
+        self.engines = _engines(app, 'DB_REPLICA_URIS')
+
+        self.sticky.configure(
+            maxsize=app.config['DB_REPLICA_STICKY_MAX_KEYS'],
+            ttl=app.config['DB_REPLICA_STICKY_SECONDS']
+        )
+        if not event.contains(session, 'after_commit', self._after_commit):
+            event.listen(session, 'after_commit', self._after_commit)
+            event.listen(session, 'after_rollback', self._after_rollback)
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+        self.engines = []
+
+    def collect(self) -> list:
+        return [
+            ('db_replica_reads_total', 'counter', 'Request reads sent to a replica.', self.replica_reads),
+            ('db_primary_reads_total', 'counter', 'Request reads kept on the primary by the sticky window.', self.primary_reads)
+        ]
+
+    @staticmethod
+    def client_keys() -> tuple:
+        keys = (f'ip:{request.remote_addr}',)
+        userid = g.get('auth_userid')
+        if userid is not None:
+            keys += (f'user:{userid}',)
+        return keys
+
+    def route(self, session, clause) -> Optional[object]:
+        """
+        The replica engine for (clause), or None for the primary.
+        """
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            session.info['wrote'] = True
+            return None
+        if not self.engines or not has_request_context() or session.info.get('wrote'):
+            return None
+        if request.method not in REPLICA_METHODS:
+            return None
+
+        sticky = any(self.sticky.get(key) is not None for key in self.client_keys())
+        with self._lock:
+            if sticky:
+                self.primary_reads += 1
+            else:
+                self.replica_reads += 1
+        return None if sticky else random.choice(self.engines)
+
+    def _after_commit(self, session) -> None:
+        if session.info.pop('wrote', False) and self.engines and has_request_context():
+            for key in self.client_keys():
+                self.sticky.set(key, True)
+
+    @staticmethod
+    def _after_rollback(session) -> None:
+        session.info.pop('wrote', None)
+
+
+replicas = ReplicaSet()
+
+
+class RoutingSession(Session):
+    """
+    ** db.session: user tables to their shard, reads to a replica, writes
+    to the primary. **
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = shards.route(mapper, clause)
+            if engine is None:
+                engine = replicas.route(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
@@ -9,12 +9,15 @@ Doc: https://marshmallow.readthedocs.io/en/stable/
 """
 
 import re
-from typing import Optional
+import base64
+import binascii
+from typing import Optional, Any
 
-from marshmallow import Schema, fields, validate, validates, ValidationError
+from marshmallow import Schema, fields, validate, validates, validates_schema, ValidationError
 
 from .messages import ApiMessages as msg
 from .models import UserModel, PasswordModel, AuthTokenModel
+from .uniqueness import unique_users
 
 
 class UserSchema(Schema):
@@ -34,18 +37,23 @@ class UserSchema(Schema):
         if value.isdigit() is True:
             raise ValidationError(msg.USERNAME_IS_ALL_DIGITS_ERROR)
 
-        existing_user = UserModel.query.filter_by(username=value).first()
-        if existing_user != None:
-            raise ValidationError(msg.USER_EXIST)
-
     @validates('email')
     def validate_email(self, value: str) -> Optional[dict]:
         if len(value) == 0 or '@' not in value or '.' not in value:
             raise ValidationError(msg.EMAIL_INVALID_FORMAT_ERROR)
 
-        existing_user = UserModel.query.filter_by(email=value).first()
-        if existing_user != None:
-            raise ValidationError(msg.EMAIL_EXIST)
+    @validates_schema(skip_on_field_errors=False)
+    def validate_unique(self, data: dict, **kwargs) -> Optional[dict]:
+        """
+        Checking username and email that passed validation in one query.
+        The async app runs this check itself ('check_unique' is False).
+        """
+        if self.context.get('check_unique', True) is False:
+            return
+
+        errors = unique_users.conflicts(data.get('username'), data.get('email'))
+        if errors:
+            raise ValidationError(errors)
 
 
 class PasswordSchema(Schema):
@@ -66,8 +74,81 @@ class PasswordSchema(Schema):
             raise ValidationError(msg.PASSWORD_ISNOT_SECURE_ERROR)
 
 
+class Cursor(fields.Field):
+    """
+    An opaque page cursor wrapping the last user id of a page.
+    """
+
+    def _serialize(self, value: Optional[int], attr: str, obj: Any, **kwargs) -> Optional[str]:
+        if value is None:
+            return None
+        return base64.urlsafe_b64encode(f'id:{value}'.encode()).decode().rstrip('=')
+
+    def _deserialize(self, value: str, attr: str, data: dict, **kwargs) -> int:
+        try:
+            decoded = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+            prefix, userid = decoded.split(':')
+            if prefix != 'id':
+                raise ValueError
+            return int(userid)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError(msg.INVALID_CURSOR)
+
+
+class UserListSchema(Schema):
+    """
+    Query arguments of the admin user listing. The largest page size is
+    passed in the 'max_limit' context.
+    """
+
+    limit = fields.Int(load_default=None)
+    cursor = Cursor(load_default=None)
+    confirm_user = fields.Bool()
+    created_after = fields.DateTime()
+    created_before = fields.DateTime()
+
+    @validates('limit')
+    def validate_limit(self, value: Optional[int]) -> Optional[dict]:
+        if value is not None and not 1 <= value <= self.context['max_limit']:
+            raise ValidationError(msg.INVALID_LIMIT)
+
+
+class BatchRequestSchema(Schema):
+    """
+    One sub-request of a batch. The (path) is relative to API_URL_PREFIX.
+    """
+
+    method = fields.Str(required=True, validate=validate.OneOf(('GET', 'POST', 'PUT', 'PATCH', 'DELETE')))
+    path = fields.Str(required=True, validate=validate.Length(min=1, max=2048))
+    headers = fields.Dict(keys=fields.Str(), values=fields.Str(), load_default=dict)
+    body = fields.Raw(load_default=None, allow_none=True)
+
+
+class BatchSchema(Schema):
+    """
+    Body of 'POST /batch'. The largest batch is passed in the
+    'max_requests' context.
+    """
+
+    requests = fields.List(fields.Nested(BatchRequestSchema), required=True)
+    atomic = fields.Bool(load_default=False)
+
+    @validates('requests')
+    def validate_requests(self, value: list) -> Optional[dict]:
+        if not 1 <= len(value) <= self.context['max_requests']:
+            raise ValidationError(msg.INVALID_BATCH_SIZE)
+
+
 class AuthTokenSchema(Schema):
 
     class Meta:
         model = AuthTokenModel
         fields = ('id', 'userid', 'token')
+
+
+# Shared instances, built once at import instead of on every request
+user_schema = UserSchema()
+users_schema = UserSchema(many=True)
+password_schema = PasswordSchema()
+# The async app runs the uniqueness check on its own session
+async_user_schema = UserSchema(context={'check_unique': False})
@@ -0,0 +1,373 @@
+"""
+This module defines the user directory of the sharded mode (sharding.py).
+
+With DB_SHARD_URIS set, the rows of a user in 'users', 'passwords' and
+'tokens' live in one of the shard databases (see routing.py):
+
+* New users get their id from the global 'user_directory' table on the
+  primary, then go to the shard (shard_for) picks by rendezvous hashing
+  of the id, so adding a shard only moves the users it takes over. The
+  directory row records that shard, and maps the username and email to
+  the id, so logins and uniqueness checks find the user without asking
+  every shard.
+* (authenticate) and (UserModel.get_by_username) select the user's shard
+  through the directory. Shards by user id are cached in process for
+  DB_SHARD_DIRECTORY_CACHE_TTL seconds.
+* (rebalance) moves users whose shard differs from (shard_for) after
+  shards were added, while the app keeps serving them, and backs
+  'flask shards rebalance'. Writes that land on the source after the
+  copy are carried over without overwriting newer ones on the target.
+
+Without DB_SHARD_URIS every method here is a no-op.
+"""
+
+import time
+import hashlib
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .cache import TTLCache
+from .models import UserModel, PasswordModel, AuthTokenModel, UserDirectoryModel
+from .routing import shards
+
+# Sharded tables and the column holding the user id, copied in this order
+USER_TABLES = (
+    (UserModel.__table__, UserModel.__table__.c.id),
+    (PasswordModel.__table__, PasswordModel.__table__.c.userid),
+    (AuthTokenModel.__table__, AuthTokenModel.__table__.c.userid)
+)
+
+
+def _copied_columns(table, column) -> list:
+    # Row ids of the child tables are per shard, the target assigns new ones
+    return [c for c in table.c if c is column or not c.primary_key]
+
+
+def shard_for(userid: int, count: int) -> int:
+    """
+    The home shard of (userid) among (count) shards: the one with the
+    highest hash of (shard, userid). A new shard takes over about 1/count
+    of the users and the others stay where they are. BLAKE2 is stable
+    across processes and Python versions, unlike hash().
+    """
+    return max(
+        range(count),
+        key=lambda shard: hashlib.blake2b(f'{shard}:{userid}'.encode(), digest_size=8).digest()
+    )
+
+
+class ShardDirectory:
+    """
+    ** Username, email and user id to shard. **
+    """
+
+    def __init__(self) -> None:
+        self.cache = TTLCache()
+
+    def init_app(self, app) -> None:
+        self.cache.configure(
+            maxsize=app.config['DB_SHARD_DIRECTORY_CACHE_SIZE'],
+            ttl=app.config['DB_SHARD_DIRECTORY_CACHE_TTL']
+        )
+        if shards.enabled and app.config['DB_AUTO_UPGRADE']:
+            self.create_schema()
+
+    @staticmethod
+    def create_schema() -> None:
+        """
+        Create the sharded tables in every shard that lacks them.
+        """
+        for engine in shards.engines:
+            db.metadata.create_all(engine, tables=[table for table, _ in USER_TABLES])
+
+    def collect(self) -> list:
+        stats = self.cache.stats()
+        return [
+            ('shard_directory_cache_hits_total', 'counter', 'Shard lookups read from the cache.', stats['hits']),
+            ('shard_directory_cache_misses_total', 'counter', 'Shard lookups read from the directory.', stats['misses'])
+        ]
+
+    def lookup(self, userid: int) -> Optional[int]:
+        shard = self.cache.get(userid)
+        if shard is None:
+            shard = db.session.execute(
+                select(UserDirectoryModel.shard).where(UserDirectoryModel.userid == userid)
+            ).scalar_one_or_none()
+            if shard is not None:
+                self.cache.set(userid, shard)
+        return shard
+
+    def select_user(self, userid: int) -> bool:
+        """
+        Select the shard of (userid). False for an unknown user.
+        """
+        if not shards.enabled:
+            return True
+        shard = self.lookup(userid)
+        shards.select(shard)
+        return shard is not None
+
+    def select_username(self, username: str) -> bool:
+        """
+        Select the shard of the user named (username). False when there
+        is no such user.
+        """
+        if not shards.enabled:
+            return True
+        row = db.session.execute(
+            select(UserDirectoryModel.userid, UserDirectoryModel.shard)
+            .where(UserDirectoryModel.username == username)
+        ).first()
+        if row is None:
+            return False
+        self.cache.set(row.userid, row.shard)
+        shards.select(row.shard)
+        return True
+
+    def place(self, user: UserModel) -> None:
+        """
+        Give the new (user) an id from the directory and select its shard.
+        """
+        if not shards.enabled:
+            return
+        entry = UserDirectoryModel(username=user.username, email=user.email, shard=-1)
+        db.session.add(entry)
+        try:
+            db.session.flush([entry])
+        except IntegrityError as e:
+            db.session.rollback()
+
+            from .uniqueness import translate_integrity_error
+
+            violation = translate_integrity_error(e)
+            if violation is None:
+                raise
+            raise violation from e
+
+        entry.shard = shard_for(entry.userid, len(shards))
+        user.id = entry.userid
+        shards.select(entry.shard)
+
+    def allocate(self, users: list) -> list:
+        """
+        Directory rows for a batch of new (users), {'username', 'email'}
+        dicts. Returns their (userid, shard) in the same order.
+        """
+        userids = db.session.execute(
+            insert(UserDirectoryModel).returning(UserDirectoryModel.userid, sort_by_parameter_order=True),
+            [{'username': user['username'], 'email': user['email'], 'shard': -1} for user in users]
+        ).scalars().all()
+        placed = [(userid, shard_for(userid, len(shards))) for userid in userids]
+        db.session.execute(
+            update(UserDirectoryModel),
+            [{'userid': userid, 'shard': shard} for userid, shard in placed]
+        )
+        return placed
+
+    @staticmethod
+    def rename(userid: int, username: Optional[str], email: Optional[str]) -> None:
+        if not shards.enabled:
+            return
+        values = {'username': username, 'email': email}
+        values = {key: value for key, value in values.items() if value is not None}
+        if values:
+            db.session.execute(
+                update(UserDirectoryModel).where(UserDirectoryModel.userid == userid).values(**values)
+            )
+
+    def remove(self, userid: int) -> None:
+        if not shards.enabled:
+            return
+        db.session.execute(delete(UserDirectoryModel).where(UserDirectoryModel.userid == userid))
+        self.cache.delete(userid)
+
+    def status(self) -> list:
+        """
+        Users per shard and how many of them belong on another shard.
+        """
+        counts = {shard: {'shard': shard, 'users': 0, 'misplaced': 0} for shard in range(len(shards))}
+        rows = db.session.execute(
+            select(UserDirectoryModel.userid, UserDirectoryModel.shard)
+            .execution_options(yield_per=10000)
+        )
+        for userid, shard in rows:
+            count = counts.setdefault(shard, {'shard': shard, 'users': 0, 'misplaced': 0})
+            count['users'] += 1
+            if shard != shard_for(userid, len(shards)):
+                count['misplaced'] += 1
+        return [counts[shard] for shard in sorted(counts)]
+
+    def misplaced(self, after: int, limit: int) -> list:
+        """
+        Up to (limit) users with an id above (after) whose shard is not
+        their home shard, as (userid, source, target).
+        """
+        found = []
+        rows = db.session.execute(
+            select(UserDirectoryModel.userid, UserDirectoryModel.shard)
+            .where(UserDirectoryModel.userid > after)
+            .order_by(UserDirectoryModel.userid)
+            .execution_options(yield_per=10000)
+        )
+        for userid, shard in rows:
+            target = shard_for(userid, len(shards))
+            if shard != target:
+                found.append((userid, shard, target))
+                if len(found) >= limit:
+                    break
+        rows.close()
+        return found
+
+    def rebalance(self, batch_size: int = 100, pause: float = 0.0, grace: Optional[float] = None) -> dict:
+        """
+        Move every misplaced user to its home shard, (batch_size) users
+        at a time:
+
+        1. Copy their rows to the target shard.
+        2. Point the directory at the target. Requests that selected the
+           source just before may still write there, so
+        3. after (grace) seconds (the directory cache TTL by default),
+           copy again the rows that changed on the source since step 1,
+           keeping those that changed on the target too (see (_merge)).
+        4. Delete the rows from the source.
+        """
+        grace = self.cache.ttl if grace is None else grace
+        report = {'moved': 0, 'resynced': 0, 'batches': 0}
+        after = 0
+        while True:
+            batch = self.misplaced(after, batch_size)
+            if not batch:
+                return report
+            after = batch[-1][0]
+
+            moves = defaultdict(list)
+            for userid, source, target in batch:
+                moves[source, target].append(userid)
+
+            copied = {}
+            for (source, target), userids in moves.items():
+                copied[source, target] = self._copy(source, target, userids)
+
+            for userid, source, target in batch:
+                db.session.execute(
+                    update(UserDirectoryModel)
+                    .where(UserDirectoryModel.userid == userid, UserDirectoryModel.shard == source)
+                    .values(shard=target)
+                )
+            db.session.commit()
+            for userid, _, _ in batch:
+                self.cache.delete(userid)
+
+            time.sleep(grace)
+            for (source, target), userids in moves.items():
+                report['resynced'] += self._resync(source, target, userids, copied[source, target])
+                self._purge(source, userids)
+
+            report['moved'] += len(batch)
+            report['batches'] += 1
+            time.sleep(pause)
+
+    @staticmethod
+    def _select(userids: list, for_update: bool = False) -> dict:
+        """
+        The rows of (userids) on the selected shard by table name and user
+        id, locked until the end of the transaction with (for_update).
+        """
+        rows = {}
+        for table, column in USER_TABLES:
+            statement = select(*_copied_columns(table, column)).where(column.in_(userids))
+            if for_update:
+                statement = statement.with_for_update()
+            result = db.session.execute(statement)
+            rows[table.name] = {row[column.name]: dict(row) for row in result.mappings()}
+        return rows
+
+    def _read(self, shard: int, userids: list) -> dict:
+        with shards.use(shard):
+            rows = self._select(userids)
+            db.session.commit()
+        return rows
+
+    @staticmethod
+    def _replace(replaced: dict, rows: dict) -> None:
+        """
+        Replace the rows of the users in (replaced), user ids by table
+        name, with (rows) on the selected shard.
+        """
+        for table, column in reversed(USER_TABLES):
+            if replaced[table.name]:
+                db.session.execute(delete(table).where(column.in_(replaced[table.name])))
+        for table, _ in USER_TABLES:
+            if rows[table.name]:
+                db.session.execute(insert(table), rows[table.name])
+
+    def _copy(self, source: int, target: int, userids: list) -> dict:
+        rows = self._read(source, userids)
+        with shards.use(target):
+            self._replace(
+                {name: userids for name in rows},
+                {name: list(table_rows.values()) for name, table_rows in rows.items()}
+            )
+            db.session.commit()
+        return rows
+
+    def _resync(self, source: int, target: int, userids: list, copied: dict) -> int:
+        current = self._read(source, userids)
+        changed = [
+            userid for userid in userids
+            if any(current[name].get(userid) != copied[name].get(userid) for name in current)
+        ]
+        if changed:
+            # Read, merge and write in one transaction, so a request writing
+            # to the target meanwhile is not overwritten with older rows
+            with shards.use(target):
+                landed = self._select(changed, for_update=True)
+                replaced = {name: [] for name in current}
+                rows = {name: [] for name in current}
+                for userid in changed:
+                    for name in current:
+                        row = self._merge(
+                            name, copied[name].get(userid), current[name].get(userid), landed[name].get(userid)
+                        )
+                        # Only the rows taken from the source are written
+                        if row != landed[name].get(userid):
+                            replaced[name].append(userid)
+                            if row is not None:
+                                rows[name].append(row)
+                self._replace(replaced, rows)
+                db.session.commit()
+        return len(changed)
+
+    @staticmethod
+    def _merge(name: str, copied: Optional[dict], source: Optional[dict],
+               target: Optional[dict]) -> Optional[dict]:
+        """
+        The row to keep on the target, None for no row. (copied) is the
+        row as copied before the flip.
+        """
+        if source == copied:
+            return target
+        if target == copied:
+            return source
+        # Written on both shards since the copy: the target has the writes
+        # made after the flip, unless the source row is a later version
+        if (
+            name == UserModel.__tablename__ and source is not None and target is not None
+            and source['version'] > target['version']
+        ):
+            return source
+        return target
+
+    @staticmethod
+    def _purge(shard: int, userids: list) -> None:
+        with shards.use(shard):
+            for table, column in reversed(USER_TABLES):
+                db.session.execute(delete(table).where(column.in_(userids)))
+            db.session.commit()
+
+
+directory = ShardDirectory()
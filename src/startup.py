@@ -0,0 +1,158 @@
+"""
+This module defines the startup timer and warm-up (startup.py).
+
+* (create_app) runs its steps as named phases; the time of each one is
+  kept for the readiness endpoint, the metrics and the log.
+* The warm-up does what the first requests would otherwise pay for:
+  configuring the mappers, a first dump and validation with the shared
+  schema instances, loading the bcrypt backend (in every pool worker
+  when the hashing pool is on), the first JWT encode and decode, and
+  opening the connections of the DB pool.
+* The readiness endpoint (READINESS_PATH) answers 503 until the warm-up
+  has finished, then 200 with the phase timings. A failed warm-up leaves
+  it at 503.
+
+STARTUP_WARMUP picks when the warm-up runs: 'sync' inside create_app,
+'background' in a thread after it returns, or 'off'.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import jwt
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+
+from . import db
+
+
+class Startup:
+    """
+    ** Per-phase startup timings and the readiness flag. **
+    """
+
+    def __init__(self) -> None:
+        self.phases = {}
+        self.ready = threading.Event()
+        self._start = time.perf_counter()
+        self._thread = None
+
+    def begin(self) -> None:
+        """
+        Start timing a new app.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.phases = {}
+        self.ready.clear()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def collect(self) -> list:
+        return [
+            ('app_ready', 'gauge', '1 once the startup warm-up has finished.', int(self.ready.is_set())),
+            ('app_startup_seconds', 'gauge', 'Time from create_app to ready.', self.phases.get('total', 0.0))
+        ]
+
+    def report(self) -> dict:
+        return {
+            'status': 'ready' if self.ready.is_set() else 'starting',
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()}
+        }
+
+    def finish(self, app) -> None:
+        """
+        Run the warm-up as configured by STARTUP_WARMUP, then flip (ready)
+        if it succeeded.
+        """
+        mode = app.config['STARTUP_WARMUP']
+        if mode == 'background':
+            self._thread = threading.Thread(
+                target=self.warm_up, args=(app,), name='startup-warm-up', daemon=True
+            )
+            self._thread.start()
+        elif mode == 'sync':
+            self.warm_up(app)
+        else:
+            self._ready(app)
+
+    def warm_up(self, app) -> None:
+        try:
+            with app.app_context():
+                with self.phase('mappers'):
+                    configure_mappers()
+
+                with self.phase('schemas'):
+                    self.warm_up_schemas()
+
+                with self.phase('bcrypt'):
+                    from .hashing import hasher
+
+                    hasher.warm_up()
+
+                with self.phase('jwt'):
+                    self.warm_up_jwt()
+
+                with self.phase('pool'):
+                    self.prime_pool(db.engine, app.config['STARTUP_PRIME_CONNECTIONS'])
+        except Exception:
+            # Readiness keeps failing, the instance gets no traffic
+            app.logger.exception('Startup warm-up failed.')
+            return
+        self._ready(app)
+
+    @staticmethod
+    def warm_up_schemas() -> None:
+        from .models import UserModel
+        from .schemas import user_schema, password_schema
+
+        user_schema.dump(UserModel(id=0, username='warm-up', email='warm-up@example.com'))
+        password_schema.validate({'password': 'Warm-up-1'})
+
+    @staticmethod
+    def warm_up_jwt() -> None:
+        from .models import SECRET_KEY, JWT_ALGORITHM
+
+        token = jwt.encode({'exp': int(time.time()) + 60, 'sub': 0}, SECRET_KEY, algorithm=JWT_ALGORITHM)
+        jwt.decode(token, SECRET_KEY, algorithms=JWT_ALGORITHM)
+
+    @staticmethod
+    def prime_pool(engine, connections: int) -> None:
+        """
+        Open (connections) pooled connections at once and return them to
+        the pool, so the first requests find them ready.
+        """
+        if isinstance(engine.pool, QueuePool):
+            connections = min(connections, engine.pool.size())
+        else:
+            connections = min(connections, 1)
+
+        opened = []
+        try:
+            for _ in range(connections):
+                connection = engine.connect()
+                opened.append(connection)
+                connection.exec_driver_sql('SELECT 1')
+        finally:
+            for connection in opened:
+                connection.close()
+
+    def _ready(self, app) -> None:
+        self.phases['total'] = time.perf_counter() - self._start
+        self.ready.set()
+        app.logger.info('Startup: %s', ', '.join(
+            f'{name} {seconds * 1000:.1f} ms' for name, seconds in self.phases.items()
+        ))
+
+
+startup = Startup()
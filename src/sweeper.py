@@ -0,0 +1,178 @@
+"""
+This module defines the auth token sweeper (sweeper.py).
+
+Rows in the 'tokens' table outlive their JWT, which expires after
+JWT_EXPIRATION_DAYS. The sweeper deletes them in small batches:
+
+* Expired rows, by the indexed 'expires_at' column.
+* Orphaned rows, whose user no longer exists.
+* Rows written before 'expires_at' existed get it from the token's 'exp'
+  claim first. Rows whose token cannot be decoded are deleted.
+
+Each batch is a short transaction followed by a pause, so SQLite never
+holds the write lock for long. The sweeper runs as (flask tokens sweep)
+or every TOKEN_SWEEP_INTERVAL seconds in a background thread.
+"""
+
+import time
+import datetime
+import threading
+from typing import Optional
+
+import jwt
+from sqlalchemy import select, delete, update, exists
+
+from . import db
+from .models import UserModel, AuthTokenModel
+from .routing import shards
+
+
+class TokenSweeper:
+    """
+    ** Batched removal of expired and orphaned auth tokens. **
+    """
+
+    def __init__(self) -> None:
+        self.removed = 0
+        self.seconds = 0.0
+        self.runs = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app) -> None:
+        self.stop()
+        self.batch_size = app.config['TOKEN_SWEEP_BATCH_SIZE']
+        self.pause = app.config['TOKEN_SWEEP_PAUSE']
+
+        interval = app.config['TOKEN_SWEEP_INTERVAL']
+        if interval:
+            self.start(app, interval)
+
+    def collect(self) -> list:
+        return [
+            ('token_sweep_runs_total', 'counter', 'Token sweeper runs.', self.runs),
+            ('token_sweep_removed_total', 'counter', 'Token rows removed by the sweeper.', self.removed),
+            ('token_sweep_seconds_total', 'counter', 'Time spent sweeping tokens.', self.seconds)
+        ]
+
+    def start(self, app, interval: float) -> None:
+        """
+        Sweep every (interval) seconds in a daemon thread.
+        """
+        self._stop.clear()
+
+        def run() -> None:
+            while not self._stop.wait(interval):
+                with app.app_context():
+                    try:
+                        report = self.sweep()
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Token sweep failed.')
+                    else:
+                        app.logger.info(
+                            'Token sweep: %(expired)s expired, %(orphaned)s orphaned, '
+                            '%(invalid)s invalid removed in %(seconds).3f s', report
+                        )
+
+        self._thread = threading.Thread(target=run, name='token-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def sweep(self, batch_size: Optional[int] = None, pause: Optional[float] = None) -> dict:
+        """
+        Delete expired and orphaned tokens. Returns the report
+        {'expired', 'orphaned', 'invalid', 'batches', 'seconds'}.
+        """
+        batch_size = batch_size or self.batch_size
+        pause = self.pause if pause is None else pause
+        report = {'expired': 0, 'orphaned': 0, 'invalid': 0, 'batches': 0}
+        start = time.perf_counter()
+
+        # Every shard in turn in sharded mode
+        for _ in shards.each():
+            report['invalid'] += self._backfill(batch_size, pause, report)
+
+            now = datetime.datetime.utcnow()
+            report['expired'] += self._delete(AuthTokenModel.expires_at < now, batch_size, pause, report)
+
+            orphaned = ~exists().where(UserModel.id == AuthTokenModel.userid)
+            report['orphaned'] += self._delete(orphaned, batch_size, pause, report)
+
+        report['seconds'] = time.perf_counter() - start
+        with self._lock:
+            self.runs += 1
+            self.removed += report['expired'] + report['orphaned'] + report['invalid']
+            self.seconds += report['seconds']
+        return report
+
+    def _delete(self, condition, batch_size: int, pause: float, report: dict) -> int:
+        removed = 0
+        while True:
+            # The ids first: MySQL refuses a LIMIT inside an IN subquery
+            ids = db.session.execute(
+                select(AuthTokenModel.id).where(condition).limit(batch_size)
+            ).scalars().all()
+            if ids:
+                result = db.session.execute(
+                    delete(AuthTokenModel)
+                    .where(AuthTokenModel.id.in_(ids))
+                    .execution_options(synchronize_session=False)
+                )
+                removed += result.rowcount
+            db.session.commit()
+            report['batches'] += 1
+
+            if len(ids) < batch_size:
+                return removed
+            time.sleep(pause)
+
+    def _backfill(self, batch_size: int, pause: float, report: dict) -> int:
+        """
+        Set 'expires_at' from the 'exp' claim on rows that lack it.
+        Returns the number of undecodable rows deleted.
+        """
+        invalid = 0
+        while True:
+            rows = db.session.execute(
+                select(AuthTokenModel.id, AuthTokenModel.token)
+                .where(AuthTokenModel.expires_at.is_(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return invalid
+
+            values, broken = [], []
+            for token_id, token in rows:
+                try:
+                    claims = jwt.decode(token, options={'verify_signature': False})
+                    expires_at = datetime.datetime.utcfromtimestamp(claims['exp'])
+                except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+                    broken.append(token_id)
+                else:
+                    values.append({'id': token_id, 'expires_at': expires_at})
+
+            if values:
+                db.session.execute(update(AuthTokenModel), values)
+            if broken:
+                db.session.execute(
+                    delete(AuthTokenModel)
+                    .where(AuthTokenModel.id.in_(broken))
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+            report['batches'] += 1
+            invalid += len(broken)
+
+            if len(rows) < batch_size:
+                return invalid
+            time.sleep(pause)
+
+
+sweeper = TokenSweeper()
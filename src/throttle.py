@@ -0,0 +1,158 @@
+"""
+This module defines the login throttle (throttle.py).
+
+* Sliding-window limits on login attempts per username and per client IP.
+  Over-limit attempts get a 429 with a Retry-After header before the user
+  is queried or a password is hashed.
+* A bounded negative cache of usernames that were not found, answered
+  with a 404 without a query. Entries are dropped when such a user is
+  created or renamed.
+
+The window counters live in a backend. The default (MemoryBackend) is
+per process; LOGIN_THROTTLE_BACKEND can name a shared one (for example
+over Redis) implementing the same hit() and reset() methods.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Optional
+
+from sqlalchemy import event
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.utils import import_string
+
+from .cache import TTLCache
+from .messages import error_msg
+from .messages import ApiMessages as msg
+from .metrics import metrics
+from .models import UserModel
+
+
+class LoginThrottled(TooManyRequests):
+    """
+    Raised for an over-limit login attempt.
+    Flask-RESTful turns it into a 429 response with a Retry-After header.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(retry_after=retry_after)
+        self.data = error_msg(msg.TOO_MANY_REQUESTS)
+
+
+class MemoryBackend:
+    """
+    ** In-process sliding-window log, bounded to (max_keys) keys. **
+    """
+
+    def __init__(self, max_keys: int = 100000) -> None:
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float) -> float:
+        """
+        Record an attempt for (key). Returns 0 when it is allowed, or the
+        seconds until the oldest attempt leaves the window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                while len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return hits[0] + window - now
+            hits.append(now)
+            return 0
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hits.clear()
+
+
+class LoginThrottle:
+    """
+    ** Login rate limits and the unknown username cache. **
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.backend = MemoryBackend()
+        self.unknown = TTLCache()
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config['LOGIN_THROTTLE_ENABLED']
+        self.window = app.config['LOGIN_THROTTLE_WINDOW']
+        self.username_limit = app.config['LOGIN_THROTTLE_PER_USERNAME']
+        self.ip_limit = app.config['LOGIN_THROTTLE_PER_IP']
+
+        backend = app.config['LOGIN_THROTTLE_BACKEND']
+        if backend is None:
+            self.backend = MemoryBackend(app.config['LOGIN_THROTTLE_MAX_KEYS'])
+        else:
+            self.backend = import_string(backend)()
+
+        self.unknown.configure(
+            maxsize=app.config['UNKNOWN_USERNAME_CACHE_SIZE'],
+            ttl=app.config['UNKNOWN_USERNAME_CACHE_TTL']
+        )
+        if not event.contains(UserModel, 'after_insert', self._after_write):
+            event.listen(UserModel, 'after_insert', self._after_write)
+            event.listen(UserModel, 'after_update', self._after_write)
+
+    def collect(self) -> list:
+        stats = self.unknown.stats()
+        return [
+            ('unknown_username_cache_size', 'gauge', 'Usernames in the negative cache.', stats['size']),
+            ('unknown_username_cache_hits_total', 'counter', 'Logins answered by the negative cache.', stats['hits'])
+        ]
+
+    def check(self, username: str, ip: Optional[str]) -> None:
+        """
+        Count a login attempt, raise (LoginThrottled) when over a limit.
+        """
+        if not self.enabled:
+            return
+
+        for reason, key, limit in (
+            ('ip', f'ip:{ip}', self.ip_limit),
+            ('username', f'user:{username}', self.username_limit)
+        ):
+            retry_after = self.backend.hit(key, limit, self.window)
+            if retry_after:
+                metrics.login_throttled.inc(reason)
+                raise LoginThrottled(max(1, math.ceil(retry_after)))
+
+    def succeeded(self, username: str) -> None:
+        """
+        Clear the username window after a successful login.
+        """
+        if self.enabled:
+            self.backend.reset(f'user:{username}')
+
+    def is_unknown(self, username: str) -> bool:
+        return self.unknown.maxsize > 0 and self.unknown.get(username) is not None
+
+    def add_unknown(self, username: str) -> None:
+        self.unknown.set(username, True)
+
+    def forget(self, username: str) -> None:
+        self.unknown.delete(username)
+
+    def _after_write(self, mapper, connection, user: UserModel) -> None:
+        self.forget(user.username)
+
+
+login_throttle = LoginThrottle()
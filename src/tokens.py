@@ -0,0 +1,234 @@
+"""
+This module defines the auth token store (tokens.py), which keeps the
+'tokens' row of each user after a login.
+
+TOKEN_STORE selects the mode:
+
+* 'upsert': one INSERT ... ON CONFLICT (userid) DO UPDATE in the login
+  transaction. Concurrent logins of the same user cannot race into two
+  rows, and the user's current token is never loaded.
+* 'write-behind': the login only records the token in memory. A
+  background thread upserts the pending tokens in batches every
+  TOKEN_WRITE_BEHIND_INTERVAL seconds, or as soon as
+  TOKEN_WRITE_BEHIND_BATCH_SIZE are waiting. A later login of the same
+  user replaces its pending token, a logout drops it.
+* 'stateless': nothing is stored. Requests are authenticated from the
+  JWT and the revocation generations alone, so the table is not needed.
+
+Pending write-behind tokens remember the shard selected at login and are
+flushed to it in sharded mode.
+
+Pending write-behind tokens are lost if the process dies before a flush.
+The tokens themselves stay valid; only the row is missing.
+"""
+
+import atexit
+import threading
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from . import db
+from .models import AuthTokenModel
+from .routing import shards
+from .transaction import uow
+
+TOKEN_STORE_MODES = ('upsert', 'write-behind', 'stateless')
+
+INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+    'mysql': mysql.insert
+}
+
+
+def upsert_statement(dialect: str, records: list):
+    """
+    INSERT the (records) into 'tokens', replacing the token of a user
+    that already has a row.
+    """
+    insert = INSERTS[dialect]
+    statement = insert(AuthTokenModel).values(records)
+    if dialect == 'mysql':
+        return statement.on_duplicate_key_update(
+            token=statement.inserted.token,
+            expires_at=statement.inserted.expires_at
+        )
+    return statement.on_conflict_do_update(
+        index_elements=[AuthTokenModel.userid],
+        set_={
+            'token': statement.excluded.token,
+            'expires_at': statement.excluded.expires_at
+        }
+    )
+
+
+def token_record(auth: AuthTokenModel) -> dict:
+    return {'userid': auth.userid, 'token': auth.token, 'expires_at': auth.expires_at}
+
+
+class TokenStore:
+    """
+    ** Persists the auth token of each login as configured by TOKEN_STORE. **
+    """
+
+    def __init__(self) -> None:
+        self.mode = 'upsert'
+        self.flushed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app) -> None:
+        self.stop()
+        self.app = app
+        self.mode = app.config['TOKEN_STORE']
+        if self.mode not in TOKEN_STORE_MODES:
+            raise ValueError(f'TOKEN_STORE must be one of {TOKEN_STORE_MODES}, not {self.mode!r}.')
+
+        self.interval = app.config['TOKEN_WRITE_BEHIND_INTERVAL']
+        self.batch_size = app.config['TOKEN_WRITE_BEHIND_BATCH_SIZE']
+        self.max_pending = app.config['TOKEN_WRITE_BEHIND_MAX_PENDING']
+        if self.mode == 'write-behind':
+            self.start()
+
+    def collect(self) -> list:
+        return [
+            ('token_store_pending', 'gauge', 'Auth tokens waiting for a write-behind flush.', len(self._pending)),
+            ('token_store_flushed_total', 'counter', 'Auth tokens written by write-behind flushes.', self.flushed)
+        ]
+
+    def save(self, auth: AuthTokenModel) -> None:
+        """
+        Store the token of (auth), a transient AuthTokenModel, in the
+        current request's session. Committed by (uow.commit), so with a
+        unit of work it is part of the request commit.
+        """
+        if self.mode == 'stateless':
+            return
+        if self.mode == 'write-behind' and self._queue(auth):
+            return
+        db.session.execute(upsert_statement(db.engine.dialect.name, [token_record(auth)]))
+        uow.commit()
+
+    async def save_async(self, session, auth: AuthTokenModel) -> None:
+        """
+        Same as (save) on an async session.
+        """
+        if self.mode == 'stateless':
+            return
+        if self.mode == 'write-behind' and self._queue(auth):
+            return
+        await session.execute(upsert_statement(session.bind.dialect.name, [token_record(auth)]))
+
+    def delete_statement(self, userid: int):
+        """
+        Drop the pending token of (userid). Returns the DELETE of its row.
+        """
+        with self._lock:
+            self._pending.pop(userid, None)
+        return delete(AuthTokenModel).where(AuthTokenModel.userid == userid)
+
+    def delete(self, userid: int) -> None:
+        if self.mode != 'stateless':
+            db.session.execute(self.delete_statement(userid))
+            uow.commit()
+
+    async def delete_async(self, session, userid: int) -> None:
+        if self.mode != 'stateless':
+            await session.execute(self.delete_statement(userid))
+
+    def _queue(self, auth: AuthTokenModel) -> bool:
+        """
+        Add (auth) to the pending tokens. Returns False when there are
+        already TOKEN_WRITE_BEHIND_MAX_PENDING, so it is written inline.
+        """
+        with self._lock:
+            if auth.userid not in self._pending and len(self._pending) >= self.max_pending:
+                return False
+            self._pending[auth.userid] = (shards.current(), token_record(auth))
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return True
+
+    def start(self) -> None:
+        """
+        Flush the pending tokens in a daemon thread.
+        """
+        self._stop.clear()
+
+        def run() -> None:
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                self.flush()
+
+        self._thread = threading.Thread(target=run, name='token-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Stop the flush thread after a last flush.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+            atexit.unregister(self.stop)
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Upsert the pending tokens in batches. Returns how many were written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        by_shard = {}
+        for shard, record in pending.values():
+            by_shard.setdefault(shard, []).append(record)
+
+        written = 0
+        with self.app.app_context():
+            for shard, records in by_shard.items():
+                with shards.use(shard):
+                    written += self._flush(shard, records)
+
+        with self._lock:
+            self.flushed += written
+        return written
+
+    def _flush(self, shard: Optional[int], records: list) -> int:
+        written = 0
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            try:
+                db.session.execute(upsert_statement(db.engine.dialect.name, batch))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._requeue(shard, records[start:])
+                self.app.logger.exception('Auth token flush failed.')
+                break
+            written += len(batch)
+        return written
+
+    def _requeue(self, shard: Optional[int], records: list) -> None:
+        # Newer tokens queued since the flush started win
+        with self._lock:
+            for record in records:
+                self._pending.setdefault(record['userid'], (shard, record))
+
+    def pending(self, userid: int) -> Optional[dict]:
+        pending = self._pending.get(userid)
+        return pending[1] if pending is not None else None
+
+
+token_store = TokenStore()
@@ -0,0 +1,100 @@
+"""
+This module defines the request-scoped unit of work (transaction.py).
+
+The model helpers (create, update, delete) call (uow.commit) instead of
+committing the session directly. Outside a request, or when the
+DB_TRANSACTION_PER_REQUEST option is off, it commits at once. When the
+option is on, (uow.wrap) is applied to every API view, and the helpers
+only stage changes. The request then ends with exactly one commit on
+success or one rollback on an error response or exception.
+
+Every commit is counted in (g.db_commits) for the current request.
+A unique constraint failure on commit is rolled back and raised as a
+(UniqueViolation) with the usual API messages.
+"""
+
+from typing import Callable, Any
+from functools import wraps
+
+from flask import g, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .metrics import metrics
+
+
+class UnitOfWork:
+    """
+    ** One transaction per API request. **
+    """
+
+    def init_app(self, app) -> None:
+        if not event.contains(db.session, 'after_commit', self._count_commit):
+            event.listen(db.session, 'after_commit', self._count_commit)
+
+    @staticmethod
+    def _count_commit(session) -> None:
+        metrics.db_commits.inc()
+        if has_app_context():
+            g.db_commits = g.get('db_commits', 0) + 1
+
+    @property
+    def active(self) -> bool:
+        return has_app_context() and g.get('uow_active', False)
+
+    def commit(self) -> None:
+        """
+        Commit now, or leave the changes staged for the request commit.
+        """
+        if not self.active:
+            self.commit_now()
+
+    @staticmethod
+    def commit_now() -> None:
+        """
+        Commit the staged changes, even inside a unit of work.
+        """
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+
+            from .uniqueness import translate_integrity_error
+
+            violation = translate_integrity_error(e)
+            if violation is None:
+                raise
+            raise violation from e
+
+    def wrap(self, view: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Run (view) in a single transaction when the option is enabled.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Any:
+            if self.active:
+                return view(*args, **kwargs)
+
+            g.db_commits = 0
+            if not current_app.config['DB_TRANSACTION_PER_REQUEST']:
+                return view(*args, **kwargs)
+
+            g.uow_active = True
+            try:
+                response = view(*args, **kwargs)
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                g.uow_active = False
+
+            if response.status_code < 400:
+                self.commit_now()
+            else:
+                db.session.rollback()
+            return response
+        return wrapper
+
+
+uow = UnitOfWork()
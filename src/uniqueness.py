@@ -0,0 +1,220 @@
+"""
+This module defines the uniqueness checks (uniqueness.py) for
+usernames and emails.
+
+* BloomFilter: An in-memory probabilistic set. It can answer
+  "definitely not taken" without touching the database.
+* UniqueIndex: Checks a username and an email in one query, skipping
+  the query when the pre-filter says both values are new. A bulk import
+  checks a whole batch of them in one query.
+
+The unique constraints on the 'users' table remain the source of truth.
+In sharded mode the checks and the pre-filter read the global
+'user_directory' table instead, whose unique constraints apply.
+An IntegrityError raised on commit is translated back into the
+(USER_EXIST) and (EMAIL_EXIST) messages by (translate_integrity_error).
+"""
+
+import hashlib
+import threading
+from typing import Optional
+
+from sqlalchemy import event, inspect, or_
+from werkzeug.exceptions import BadRequest
+
+from . import db
+from .messages import ApiMessages as msg
+from .messages import error_msg
+from .models import UserModel, UserDirectoryModel
+from .routing import shards
+
+
+class BloomFilter:
+    """
+    ** Probabilistic set without false negatives. **
+    """
+
+    def __init__(self, size: int, hashes: int = 7) -> None:
+        self.size = size
+        self.hashes = hashes
+        self._bits = bytearray((size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, value: str) -> list:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str) -> None:
+        with self._lock:
+            for pos in self._positions(value):
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class UniqueViolation(BadRequest):
+    """
+    Raised when a commit hits the username or email unique constraint.
+    Flask-RESTful turns it into a 400 response.
+    """
+
+    def __init__(self, messages: dict) -> None:
+        super().__init__()
+        self.data = error_msg(messages)
+
+
+class UniqueIndex:
+    """
+    ** Username and email uniqueness checks. **
+    """
+
+    def __init__(self) -> None:
+        self.prefilter = None
+        self.skipped = 0
+        self.queried = 0
+
+    def init_app(self, app) -> None:
+        if not event.contains(UserModel, 'after_insert', self._after_write):
+            event.listen(UserModel, 'after_insert', self._after_write)
+            event.listen(UserModel, 'after_update', self._after_write)
+
+        self.prefilter = None
+        self.skipped = 0
+        self.queried = 0
+        size = app.config['UNIQUE_PREFILTER_SIZE']
+        if size > 0:
+            with app.app_context():
+                # Not migrated yet, e.g. for 'flask db upgrade'; every check queries
+                if inspect(db.engine).has_table(self.model().__tablename__):
+                    self.load(BloomFilter(size))
+
+    @staticmethod
+    def model() -> type:
+        return UserDirectoryModel if shards.enabled else UserModel
+
+    def load(self, prefilter: BloomFilter) -> None:
+        model = self.model()
+        rows = db.session.execute(
+            db.select(model.username, model.email)
+            .execution_options(yield_per=10000)
+        )
+        for username, email in rows:
+            prefilter.add(username)
+            prefilter.add(email)
+        self.prefilter = prefilter
+
+    def add(self, username: str, email: str) -> None:
+        if self.prefilter is not None:
+            self.prefilter.add(username)
+            self.prefilter.add(email)
+
+    def _after_write(self, mapper, connection, user: UserModel) -> None:
+        self.add(user.username, user.email)
+
+    def collect(self) -> list:
+        return [
+            ('unique_check_skipped_total', 'counter', 'Uniqueness checks answered by the pre-filter.', self.skipped),
+            ('unique_check_queried_total', 'counter', 'Uniqueness checks that ran a query.', self.queried)
+        ]
+
+    def _candidates(self, username: Optional[str], email: Optional[str]) -> dict:
+        """
+        Values that may be taken. Values the pre-filter has never seen
+        are definitely new and are dropped.
+        """
+        values = {'username': username, 'email': email}
+        values = {key: value for key, value in values.items() if value is not None}
+
+        if values and self.prefilter is not None:
+            values = {
+                key: value for key, value in values.items()
+                if value in self.prefilter
+            }
+            if not values:
+                self.skipped += 1
+        return values
+
+    def statement(self, values: dict):
+        self.queried += 1
+        model = self.model()
+        return (
+            db.select(model.username, model.email)
+            .where(or_(*[
+                getattr(model, key) == value for key, value in values.items()
+            ]))
+        )
+
+    @staticmethod
+    def errors(rows: list, values: dict) -> dict:
+        errors = {}
+        for row_username, row_email in rows:
+            if 'username' in values and row_username == values['username']:
+                errors['username'] = msg.USER_EXIST
+            if 'email' in values and row_email == values['email']:
+                errors['email'] = msg.EMAIL_EXIST
+        return errors
+
+    def conflicts(self, username: Optional[str], email: Optional[str]) -> dict:
+        """
+        Return error messages for the values that are already taken.
+        """
+        values = self._candidates(username, email)
+        if not values:
+            return {}
+        rows = db.session.execute(self.statement(values)).all()
+        return self.errors(rows, values)
+
+    async def conflicts_async(self, session, username: Optional[str], email: Optional[str]) -> dict:
+        """
+        Same as (conflicts) on an async session.
+        """
+        values = self._candidates(username, email)
+        if not values:
+            return {}
+        rows = (await session.execute(self.statement(values))).all()
+        return self.errors(rows, values)
+
+    def taken(self, usernames: list, emails: list) -> tuple:
+        """
+        Return the (usernames) and the (emails) already taken, as two sets,
+        with one query for all of them.
+        """
+        if self.prefilter is not None:
+            usernames = [value for value in usernames if value in self.prefilter]
+            emails = [value for value in emails if value in self.prefilter]
+        if not usernames and not emails:
+            self.skipped += 1
+            return set(), set()
+
+        self.queried += 1
+        model = self.model()
+        rows = db.session.execute(
+            db.select(model.username, model.email)
+            .where(or_(model.username.in_(usernames), model.email.in_(emails)))
+        ).all()
+        return (
+            {row.username for row in rows}.intersection(usernames),
+            {row.email for row in rows}.intersection(emails)
+        )
+
+
+def translate_integrity_error(error: Exception) -> Optional[UniqueViolation]:
+    """
+    Map a unique constraint failure on 'users' to the API messages.
+    """
+    text = str(getattr(error, 'orig', error)).lower()
+    errors = {}
+    if 'username' in text:
+        errors['username'] = msg.USER_EXIST
+    if 'email' in text:
+        errors['email'] = msg.EMAIL_EXIST
+    if not errors:
+        return None
+    return UniqueViolation(errors)
+
+
+unique_users = UniqueIndex()
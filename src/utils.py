@@ -3,13 +3,37 @@ This module defines utility functions (utils.py) that provide shared
 functionality across the application.
 """
 
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 from functools import wraps
-from flask import request
+from flask import g, request, current_app
 
 from .messages import ApiMessages as msg
-from .messages import error_msg
+from .representations import serializer
 from .models import AuthTokenModel
+from .cache import claims_cache
+from .revocation import revocations
+from .sharding import directory
+
+
+def verify_token(auth_token: Optional[str]) -> Optional[dict]:
+    """
+    Return the claims of a valid auth token, or None.
+
+    Verified claims are kept in (claims_cache), so a repeated token
+    skips the signature check until the cache entry or the token expires.
+    Revoked tokens are rejected by (authenticate), once the shard of the
+    user is selected.
+    """
+    if not auth_token:
+        return None
+
+    claims = claims_cache.get_claims(auth_token)
+    if claims is None:
+        claims = AuthTokenModel().verify_auth_token(auth_token)
+        if claims is False:
+            return None
+        claims_cache.set_claims(auth_token, claims)
+    return claims
 
 
 def authenticate(func: Callable[..., Any]) -> Callable[..., Any]:
@@ -19,9 +43,41 @@ def authenticate(func: Callable[..., Any]) -> Callable[..., Any]:
     @wraps(func)
     def wrapper(*args, **kwargs) -> Any:
         auth_token = request.headers.get('Authorization')
-        is_auth = AuthTokenModel().verify_auth_token(auth_token)
-        if is_auth is False:
-            return error_msg(msg.AUTHORIZATION_ERROR), 401
+        # Claims verified earlier in the app context, by another
+        # sub-request of a batch; the revocation check still applies
+        shared = g.get('shared_auth')
+        if shared is not None and shared[0] == auth_token:
+            is_auth = shared[1]
+        else:
+            is_auth = verify_token(auth_token)
+            if is_auth is not None:
+                g.shared_auth = (auth_token, is_auth)
+        if is_auth is None:
+            return serializer.error(msg.AUTHORIZATION_ERROR, 401)
+
+        # The user's shard in sharded mode; a deleted user has none
+        if not directory.select_user(is_auth['sub']):
+            return serializer.error(msg.AUTHORIZATION_ERROR, 401)
+
+        # Tokens issued before a logout, a password change or the deletion
+        if revocations.is_revoked(is_auth):
+            return serializer.error(msg.AUTHORIZATION_ERROR, 401)
+
         kwargs['auth'] = is_auth
+        # The client of the request, for the replica sticky window
+        g.auth_userid = is_auth['sub']
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def admin_required(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    A decorator function for the API that allows only admin users.
+    Apply it below (authenticate), admins are listed in ADMIN_USER_IDS.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> Any:
+        if kwargs['auth']['sub'] not in current_app.config['ADMIN_USER_IDS']:
+            return serializer.error(msg.PERMISSION_ERROR, 403)
         return func(*args, **kwargs)
     return wrapper
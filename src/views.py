@@ -9,52 +9,77 @@ Dependencies:
 Doc: https://flask-restful.readthedocs.io/en/latest/
 """
 
+import io
+from operator import attrgetter
+
 from flask_restful import Resource
-from flask import request
+from flask import request, current_app, Response
 from marshmallow import ValidationError
+from sqlalchemy.orm import load_only
 
 from .messages import success_msg, error_msg
 from .messages import ApiMessages as msg
-from .utils import authenticate
+from .utils import authenticate, admin_required
+from .revocation import revocations
+from .rehash import rehasher
+from .routing import shards
+from .tokens import token_store
+from .throttle import login_throttle
+from .etags import user_versions, user_etag, etag_header
 from .models import UserModel, AuthTokenModel, PasswordModel
-from .schemas import UserSchema, PasswordSchema , AuthTokenSchema
+from .schemas import UserListSchema, BatchSchema, Cursor, user_schema, users_schema, password_schema
+from .importer import UserImporter, read_rows
+from .batch import BatchDispatcher
+from .metrics import metrics
+from .representations import serializer
+from .startup import startup
 
 
 class UserApi(Resource):
 
     @authenticate
     def get(self, auth):
+        if request.if_none_match:
+            version = user_versions.version(auth['sub'])
+            if version is not None:
+                tag = user_etag(auth['sub'], version)
+                if request.if_none_match.contains_weak(tag):
+                    return Response(status=304, headers=etag_header(tag))
+
         user = UserModel.query.filter_by(id=auth['sub']).first()
-        dump_user = UserSchema().dump(user)
-        return success_msg(dump_user), 200
+        if user is None:
+            return serializer.error(msg.AUTHORIZATION_ERROR, 401)
+
+        dump_user = user_schema.dump(user)
+        user_versions.set(user.id, user.version)
+        return success_msg(dump_user), 200, etag_header(user_etag(user.id, user.version))
 
     def put(self):
         user_data = request.json
         password = user_data.pop('password', None)
 
         try:
-            user_load = UserSchema().load(user_data)
+            user_load = user_schema.load(user_data)
         except ValidationError as e:
             return error_msg(e.messages), 400
 
         try:
-            password_load = PasswordSchema().load({'password': password})
+            password_load = password_schema.load({'password': password})
         except ValidationError as e:
             return  error_msg(e.messages), 400
 
-        user = UserModel(**user_load)
-        user.create(user)
-
-        new_password = PasswordModel(userid=user.id)
+        new_password = PasswordModel()
         new_password.hash_password(password_load['password'])
-        new_password.create(new_password)
+
+        user = UserModel(**user_load, password=new_password)
+        user.create(user)
 
         return success_msg(user_load), 201
 
     @authenticate
     def patch(self, auth):
         try:
-            load_user = UserSchema().load(request.json)
+            load_user = user_schema.load(request.json)
         except ValidationError as e:
             return error_msg(e.messages), 404
 
@@ -69,25 +94,29 @@ class UserApi(Resource):
         password = request.json.get('password')
 
         if username is None or password is None:
-            return error_msg(msg.MISSING_ARGUMENT), 400
+            return serializer.error(msg.MISSING_ARGUMENT, 400)
 
-        user = UserModel.query.filter_by(username=username).first()
+        user = UserModel.get_by_username(
+            username,
+            current_app.config['DELETE_RELATIONSHIP_LOADING']
+        )
         if user is None:
-            return error_msg(msg.INVALID_USERNAME), 404
+            return serializer.error(msg.INVALID_USERNAME, 404)
 
         if user.id != auth['sub']:
-            return error_msg(msg.VALIDATION_ERROR), 403
+            return serializer.error(msg.VALIDATION_ERROR, 403)
 
-        user_password = PasswordModel.query.filter_by(userid=user.id).first()
+        user_password = user.password
         password_is_valid = user_password.verify_password(
             password,
             user_password.password_hash
         )
         if password_is_valid:
+            revocations.revoke_deleted(user.id)
             user.delete(user)
             return {}, 204
         else:
-            return error_msg(msg.AUTHORIZATION_ERROR), 401
+            return serializer.error(msg.AUTHORIZATION_ERROR, 401)
 
 
 class PasswordApi(Resource):
@@ -98,7 +127,7 @@ class PasswordApi(Resource):
         new_password = request.json.get('new_password')
 
         if old_password is None or new_password is None:
-            return error_msg(msg.MISSING_ARGUMENT), 400
+            return serializer.error(msg.MISSING_ARGUMENT, 400)
 
         user_password = PasswordModel.query.filter_by(userid=auth['sub']).first()
         old_pssword_is_valid = user_password.verify_password(
@@ -108,17 +137,19 @@ class PasswordApi(Resource):
 
         if old_pssword_is_valid:
             try:
-                password_schema = PasswordSchema().load({'password': new_password})
+                password_schema.load({'password': new_password})
             except ValidationError as e:
                 return error_msg(e.messages), 400
 
             user_password.hash_password(new_password)
             user_password.new_datetime()
+            user = user_password.users
+            user.token_generation = revocations.revoke(user)
             user_password.update()
 
             return success_msg({}), 201
         else:
-            return error_msg(msg.INVALID_PASSWORD), 401
+            return serializer.error(msg.INVALID_PASSWORD, 401)
 
 
 class AuthApi(Resource):
@@ -128,44 +159,169 @@ class AuthApi(Resource):
         password = request.json.get('password')
 
         if username is None or password is None:
-            return error_msg(msg.MISSING_ARGUMENT), 400
+            return serializer.error(msg.MISSING_ARGUMENT, 400)
 
-        user = UserModel.query.filter_by(username=username).first()
+        login_throttle.check(username, request.remote_addr)
+        if login_throttle.is_unknown(username):
+            return serializer.error(msg.INVALID_USERNAME, 404)
+
+        user = UserModel.get_by_username(
+            username,
+            current_app.config['LOGIN_RELATIONSHIP_LOADING']
+        )
         if user is None:
-            return error_msg(msg.INVALID_USERNAME), 404
+            login_throttle.add_unknown(username)
+            return serializer.error(msg.INVALID_USERNAME, 404)
 
-        user_password = PasswordModel.query.filter_by(userid=user.id).first()
+        user_password = user.password
         password_is_valid = user_password.verify_password(
             password,
             user_password.password_hash
         )
 
         if password_is_valid:
-            user_token = AuthTokenModel.query.filter_by(userid=user.id).first()
+            login_throttle.succeeded(username)
+            rehasher.submit(user_password, password)
+            new_auth = AuthTokenModel(userid=user.id)
+            new_token = new_auth.get_auth_token(user.id, revocations.current(user))
+            token_store.save(new_auth)
 
-            if user_token is None:
-                new_auth = AuthTokenModel(userid=user.id)
-                new_token = new_auth.get_auth_token(user.id)
-                new_auth.create(new_auth)
-
-                return success_msg({'auth_token': new_token}), 201
-            else:
-                new_token = user_token.get_auth_token(user.id)
-                user_token.token = new_token
-                user_token.update()
-
-                return success_msg({'auth_token': new_token}), 201
+            return success_msg({'auth_token': new_token}), 201
         else:
-            return error_msg(msg.INVALID_PASSWORD), 401
+            return serializer.error(msg.INVALID_PASSWORD, 401)
 
     @authenticate
     def delete(self, auth):
-        user_auth_token = AuthTokenModel.query.filter_by(userid=auth['sub']).first()
-        user_auth_token.delete(user_auth_token)
+        user = UserModel.query.filter_by(id=auth['sub']).first()
+        if user is None:
+            return serializer.error(msg.AUTHORIZATION_ERROR, 401)
+
+        token_store.delete(user.id)
+        user.update({'token_generation': revocations.revoke(user)})
         return {}, 204
 
 
+class UserListApi(Resource):
+
+    @authenticate
+    @admin_required
+    def get(self, auth):
+        """
+        List users by ascending id, one page after the 'cursor' of the
+        previous page. The keyset on the primary key keeps every page as
+        fast as the first one.
+        """
+        schema = UserListSchema(
+            context={'max_limit': current_app.config['USER_LIST_MAX_PAGE_SIZE']}
+        )
+        try:
+            args = schema.load(request.args)
+        except ValidationError as e:
+            return error_msg(e.messages), 400
+
+        limit = args['limit'] or current_app.config['USER_LIST_PAGE_SIZE']
+        query = UserModel.query.options(
+            load_only(UserModel.id, UserModel.username, UserModel.email, UserModel.confirm_user)
+        )
+        if args['cursor'] is not None:
+            query = query.filter(UserModel.id > args['cursor'])
+        if 'confirm_user' in args:
+            query = query.filter(UserModel.confirm_user == args['confirm_user'])
+        if 'created_after' in args:
+            query = query.filter(UserModel.datetime >= args['created_after'])
+        if 'created_before' in args:
+            query = query.filter(UserModel.datetime < args['created_before'])
+
+        # Each shard returns its first page, the merge keeps the lowest ids
+        users = []
+        for _ in shards.each():
+            users += query.order_by(UserModel.id).limit(limit + 1).all()
+        users = sorted(users, key=attrgetter('id'))[:limit + 1]
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = Cursor().serialize('id', users[-1])
+
+        return success_msg({
+            'users': users_schema.dump(users),
+            'next_cursor': next_cursor
+        }), 200
+
+
+class UserImportApi(Resource):
+    # The body is a file stream, not JSON
+    batchable = False
+
+    @authenticate
+    @admin_required
+    def post(self, auth):
+        """
+        Stream users as NDJSON, or as CSV with a 'text/csv' content type.
+        """
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+
+        importer = UserImporter(
+            batch_size=current_app.config['USER_IMPORT_BATCH_SIZE'],
+            workers=current_app.config['PASSWORD_HASH_WORKERS'],
+            progress=lambda report: current_app.logger.info(
+                'User import: %(rows)s rows, %(created)s created, %(failed)s failed',
+                report
+            )
+        )
+        report = importer.run(read_rows(stream, fmt))
+
+        return success_msg(report), 200
+
+
+class BatchApi(Resource):
+    batchable = False
+
+    def post(self):
+        """
+        Run a list of sub-requests in one HTTP request, see batch.py.
+        """
+        schema = BatchSchema(
+            context={'max_requests': current_app.config['BATCH_MAX_REQUESTS']}
+        )
+        try:
+            args = schema.load(request.json)
+        except ValidationError as e:
+            return error_msg(e.messages), 400
+
+        dispatcher = BatchDispatcher(
+            atomic=args['atomic'],
+            auth_token=request.headers.get('Authorization')
+        )
+        responses = dispatcher.run(args['requests'])
+
+        return success_msg({
+            'responses': responses,
+            'committed': dispatcher.committed
+        }), 200
+
+
 class HelloWorld(Resource):
 
     def get(self):
-        return success_msg('Hello World'), 200
+        return serializer.success('Hello World')
+
+
+def metrics_view():
+    """
+    Prometheus scrape endpoint.
+    """
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4')
+
+
+def readiness_view():
+    """
+    Readiness probe, 503 until the startup warm-up has finished.
+    """
+    status = 200 if startup.ready.is_set() else 503
+    headers = {} if status == 200 else {'Retry-After': '1'}
+    return Response(
+        serializer.dumps(startup.report()) + b'\n', status=status,
+        headers=headers, mimetype='application/json'
+    )
@@ -8,14 +8,22 @@ Dependencies:
 Doc: https://flask.palletsprojects.com/en/3.0.x/testing/
 """
 
+import asyncio
+from json import dumps, loads
+import importlib.util
+
 import pytest
 from dotenv import load_dotenv
+from werkzeug.datastructures import Headers
 
 from src import create_app, db
 from src.models import UserModel, PasswordModel, AuthTokenModel
 
 load_dotenv()
 
+# The ASGI mode needs an async DB driver
+ASGI_AVAILABLE = importlib.util.find_spec('aiosqlite') is not None
+
 TEST_USER = {
     'email': 'base_test_user@gmail.com',
     'username': 'base_test_user'
@@ -36,7 +44,7 @@ def app():
     * app (Flask app): Flask app instance configured for testing.
     """
 
-    app = create_app()
+    app = create_app({'DB_AUTO_UPGRADE': True})
     app.config.update({
         'TESTING': True
     })
@@ -71,9 +79,113 @@ def app():
             print('The user has already been deleted.')
 
 
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'wsgi_only: run the test against the Flask (WSGI) app only.'
+    )
+
+
+def pytest_generate_tests(metafunc):
+    """
+    Run every test that uses (client) against both serving modes.
+    """
+    if 'client' in metafunc.fixturenames:
+        modes = ['wsgi']
+        if ASGI_AVAILABLE and metafunc.definition.get_closest_marker('wsgi_only') is None:
+            modes.append('asgi')
+        metafunc.parametrize('client', modes, indirect=True)
+
+
+class AsgiResponse:
+
+    def __init__(self, messages: list) -> None:
+        start = messages[0]
+        self.status_code = start['status']
+        self.headers = Headers([
+            (key.decode(), value.decode()) for key, value in start['headers']
+        ])
+        self.data = b''.join(message.get('body', b'') for message in messages[1:])
+
+    def get_json(self):
+        return loads(self.data)
+
+
+class AsgiTestClient:
+    """
+    A small subset of Flask's test client that drives the ASGI app.
+    """
+
+    def __init__(self, asgi_app) -> None:
+        self.asgi_app = asgi_app
+        self.loop = asyncio.new_event_loop()
+
+    def close(self) -> None:
+        self.loop.run_until_complete(self.asgi_app.engine.dispose())
+        self.loop.close()
+
+    def open(self, path, method, json=None, data=None, headers=None, content_type=None):
+        headers = dict(headers or {})
+        body = b''
+        if json is not None:
+            body = dumps(json).encode()
+            headers.setdefault('Content-Type', 'application/json')
+        elif data is not None:
+            body = data.encode() if isinstance(data, str) else data
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'',
+            'headers': [
+                (key.lower().encode(), str(value).encode())
+                for key, value in headers.items()
+            ]
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.loop.run_until_complete(self.asgi_app(scope, receive, send))
+        return AsgiResponse(messages)
+
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open(path, 'PUT', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.open(path, 'PATCH', **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, 'DELETE', **kwargs)
+
+
 @pytest.fixture()
-def client(app):
-    return app.test_client()
+def client(app, request):
+    """
+    Test client for the Flask app ('wsgi') or the ASGI app ('asgi').
+    """
+    if getattr(request, 'param', 'wsgi') == 'wsgi':
+        yield app.test_client()
+        return
+
+    from src.asgi import create_asgi_app
+
+    asgi_client = AsgiTestClient(create_asgi_app(app))
+    yield asgi_client
+    asgi_client.close()
 
 
 @pytest.fixture()
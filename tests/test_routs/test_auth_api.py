@@ -1,7 +1,11 @@
 import pytest
+from sqlalchemy import update, delete
 
 from ..conftest import client, app
+from src import db
 from src.models import UserModel, AuthTokenModel, PasswordModel
+from src.revocation import revocations
+from src.hashing import hasher
 
 USER_API_URL = '/api/v1/user'
 AUTH_API_URL = '/api/v1/user/auth'
@@ -92,3 +96,85 @@ def test_delete_auth_user_token(client, app):
         assert user != None
         assert password != None
         assert token is None
+
+
+def test_deleted_auth_token_is_revoked(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+
+    respons = client.get(USER_API_URL, headers={'Authorization': token.token})
+
+    assert respons.status_code == 200
+
+    respons = client.delete(AUTH_API_URL, headers={'Authorization': token.token})
+
+    assert respons.status_code == 204
+
+    respons = client.get(USER_API_URL, headers={'Authorization': token.token})
+
+    assert respons.status_code == 401
+
+    # Logging in again issues a working token
+    respons = client.post(
+        AUTH_API_URL,
+        json={
+            'username': TEST_USER['username'],
+            'password': TEST_USER['password']
+        }
+    )
+    new_token = respons.get_json()['data']['auth_token']
+
+    respons = client.get(USER_API_URL, headers={'Authorization': new_token})
+
+    assert respons.status_code == 200
+
+
+def test_auth_with_invalid_json(client):
+    respons = client.post(AUTH_API_URL, data='{"username": ', content_type='application/json')
+
+    assert respons.status_code == 400
+
+
+def test_handler_errors_are_not_json_errors(client, monkeypatch):
+    def verify(password, password_hash):
+        raise ValueError('boom')
+
+    monkeypatch.setattr(hasher, 'verify', verify)
+
+    with pytest.raises(ValueError, match='boom'):
+        client.post(AUTH_API_URL, json={
+            'username': TEST_USER['username'],
+            'password': TEST_USER['password']
+        })
+
+
+@pytest.mark.parametrize('deleted', [False, True])
+def test_revoked_by_another_process(client, app, deleted):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first().token
+
+    respons = client.get(USER_API_URL, headers={'Authorization': token})
+
+    assert respons.status_code == 200
+
+    # A deletion or a logout through another process, which leaves the
+    # cache of this one alone
+    with app.app_context():
+        if deleted:
+            for model in (AuthTokenModel, PasswordModel):
+                db.session.execute(delete(model).where(model.userid == user.id))
+            db.session.execute(delete(UserModel).where(UserModel.id == user.id))
+        else:
+            db.session.execute(
+                update(UserModel).where(UserModel.id == user.id)
+                .values(token_generation=UserModel.token_generation + 1)
+            )
+        db.session.commit()
+
+    # Seen once the cached generation expires
+    revocations.clear()
+    respons = client.get(USER_API_URL, headers={'Authorization': token})
+
+    assert respons.status_code == 401
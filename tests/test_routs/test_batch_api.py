@@ -0,0 +1,146 @@
+import pytest
+
+from ..conftest import client, app
+from src import utils
+from src.models import UserModel
+
+# The ASGI app serves the user resources only
+pytestmark = pytest.mark.wsgi_only
+
+BATCH_API_URL = '/api/v1/batch'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+NEW_USER = {
+    'username': 'batch_test_user',
+    'email': 'batch_test_user@gmail.com'
+}
+
+
+def get_token(client) -> str:
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+    return respons.get_json()['data']['auth_token']
+
+
+def user_email(app) -> str:
+    with app.app_context():
+        return UserModel.query.filter(
+            UserModel.username.in_((TEST_USER['username'], NEW_USER['username']))
+        ).first().email
+
+
+def test_login_then_use_the_token(client, app):
+    respons = client.post(BATCH_API_URL, json={'requests': [
+        {'method': 'POST', 'path': 'user/auth', 'body': TEST_USER},
+        {'method': 'GET', 'path': 'user'},
+        {'method': 'PATCH', 'path': '/api/v1/user', 'body': NEW_USER}
+    ]})
+
+    assert respons.status_code == 200
+    data = respons.get_json()['data']
+    assert [item['status'] for item in data['responses']] == [201, 200, 200]
+    assert data['responses'][1]['body']['data']['username'] == TEST_USER['username']
+    assert 'ETag' in data['responses'][1]['headers']
+    assert data['committed'] is None
+    assert user_email(app) == NEW_USER['email']
+
+
+def test_shared_auth_is_verified_once(client, monkeypatch):
+    token = get_token(client)
+    calls = []
+
+    def verify_token(auth_token):
+        calls.append(auth_token)
+        return verify(auth_token)
+
+    verify = utils.verify_token
+    monkeypatch.setattr(utils, 'verify_token', verify_token)
+
+    respons = client.post(
+        BATCH_API_URL,
+        headers={'Authorization': token},
+        json={'requests': [{'method': 'GET', 'path': 'user'}] * 3}
+    )
+
+    assert [item['status'] for item in respons.get_json()['data']['responses']] == [200, 200, 200]
+    assert calls == [token]
+
+
+def test_atomic_batch_rolls_back(client, app):
+    token = get_token(client)
+    email = user_email(app)
+
+    respons = client.post(
+        BATCH_API_URL,
+        headers={'Authorization': token},
+        json={'atomic': True, 'requests': [
+            {'method': 'PATCH', 'path': 'user', 'body': NEW_USER},
+            {'method': 'PATCH', 'path': 'user', 'body': {**NEW_USER, 'email': 'not-an-email'}},
+            {'method': 'GET', 'path': 'user'}
+        ]}
+    )
+
+    data = respons.get_json()['data']
+    assert [item['status'] for item in data['responses']] == [200, 404]
+    assert data['committed'] is False
+    assert user_email(app) == email
+
+
+def test_atomic_batch_commits(client, app):
+    token = get_token(client)
+
+    respons = client.post(
+        BATCH_API_URL,
+        headers={'Authorization': token},
+        json={'atomic': True, 'requests': [
+            {'method': 'PATCH', 'path': 'user', 'body': NEW_USER},
+            {'method': 'GET', 'path': 'user'}
+        ]}
+    )
+
+    data = respons.get_json()['data']
+    assert [item['status'] for item in data['responses']] == [200, 200]
+    assert data['responses'][1]['body']['data']['email'] == NEW_USER['email']
+    assert data['committed'] is True
+    assert user_email(app) == NEW_USER['email']
+
+
+def test_failed_sub_request_keeps_the_others(client, app):
+    token = get_token(client)
+
+    respons = client.post(
+        BATCH_API_URL,
+        headers={'Authorization': token},
+        json={'requests': [
+            {'method': 'PATCH', 'path': 'user', 'body': {**NEW_USER, 'email': 'not-an-email'}},
+            {'method': 'PATCH', 'path': 'user', 'body': NEW_USER}
+        ]}
+    )
+
+    data = respons.get_json()['data']
+    assert [item['status'] for item in data['responses']] == [404, 200]
+    assert user_email(app) == NEW_USER['email']
+
+
+@pytest.mark.parametrize('sub_request, status', [
+    ({'method': 'POST', 'path': 'batch', 'body': {'requests': []}}, 400),
+    ({'method': 'POST', 'path': 'users/import'}, 400),
+    ({'method': 'GET', 'path': 'unknown'}, 404),
+    ({'method': 'DELETE', 'path': 'hello'}, 405),
+    ({'method': 'GET', 'path': 'user'}, 401)
+])
+def test_sub_request_errors(client, sub_request, status):
+    respons = client.post(BATCH_API_URL, json={'requests': [sub_request]})
+
+    assert respons.status_code == 200
+    assert respons.get_json()['data']['responses'][0]['status'] == status
+
+
+@pytest.mark.parametrize('requests', [[], [{'method': 'GET', 'path': 'hello'}] * 21])
+def test_batch_size(client, requests):
+    respons = client.post(BATCH_API_URL, json={'requests': requests})
+
+    assert respons.status_code == 400
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event
+
+from ..conftest import client, app
+from src import db
+
+# Uses Flask request hooks or endpoints that only exist in the WSGI app
+pytestmark = pytest.mark.wsgi_only
+
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+@pytest.fixture()
+def statements(app):
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def reads(statements):
+    return [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+
+
+def test_login_issues_one_read(client, statements):
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 201
+    assert len(reads(statements)) == 1
+
+
+def test_failed_login_issues_one_read(client, statements):
+    respons = client.post(
+        AUTH_API_URL,
+        json={'username': TEST_USER['username'], 'password': 'NonePassword12345'}
+    )
+
+    assert respons.status_code == 401
+    assert len(reads(statements)) == 1
+
+
+def test_lazy_loading_is_configurable(client, app, statements):
+    app.config['LOGIN_RELATIONSHIP_LOADING'] = {'password': 'select'}
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 201
+    assert len(reads(statements)) == 2
+
+
+def test_delete_issues_one_read(client, statements):
+    token = client.post(AUTH_API_URL, json=TEST_USER).get_json()['data']['auth_token']
+    # Caches the token generation checked by (authenticate)
+    assert client.get(USER_API_URL, headers={'Authorization': token}).status_code == 200
+    statements.clear()
+
+    respons = client.delete(USER_API_URL, headers={'Authorization': token}, json=TEST_USER)
+
+    assert respons.status_code == 204
+    assert len(reads(statements)) == 1
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from ..conftest import client, app
+from src.metrics import metrics
+from src.models import UserModel
+from src.throttle import login_throttle, MemoryBackend
+
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+WRONG_PASSWORD = {
+    'username': 'base_test_user',
+    'password': 'WrongPassword1234'
+}
+NEW_USER = {
+    'username': 'throttle_test_user',
+    'email': 'throttle_test_user@gmail.com',
+    'password': 'Throttle@12345'
+}
+
+
+@pytest.fixture()
+def cleanup(app):
+    yield
+    with app.app_context():
+        user = UserModel.query.filter_by(username=NEW_USER['username']).first()
+        if user is not None:
+            user.delete(user)
+
+
+def test_memory_backend_window():
+    backend = MemoryBackend()
+
+    assert backend.hit('key', 2, 0.05) == 0
+    assert backend.hit('key', 2, 0.05) == 0
+    assert 0 < backend.hit('key', 2, 0.05) <= 0.05
+
+    time.sleep(0.06)
+    assert backend.hit('key', 2, 0.05) == 0
+
+
+def test_memory_backend_max_keys():
+    backend = MemoryBackend(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        backend.hit(key, 1, 60)
+
+    assert backend.hit('a', 1, 60) == 0
+    assert backend.hit('c', 1, 60) > 0
+
+
+def test_username_limit(client, monkeypatch):
+    monkeypatch.setattr(login_throttle, 'username_limit', 2)
+    throttled = metrics.login_throttled.get('username')
+
+    for _ in range(2):
+        assert client.post(AUTH_API_URL, json=WRONG_PASSWORD).status_code == 401
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 429
+    assert int(respons.headers['Retry-After']) >= 1
+    assert b'Too many login attempts' in respons.data
+    assert metrics.login_throttled.get('username') == throttled + 1
+
+
+def test_ip_limit(client, monkeypatch):
+    monkeypatch.setattr(login_throttle, 'ip_limit', 2)
+
+    for username in ('unknown_user_1', 'unknown_user_2'):
+        respons = client.post(AUTH_API_URL, json={'username': username, 'password': 'x'})
+        assert respons.status_code == 404
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 429
+
+
+def test_success_resets_username_window(client, monkeypatch):
+    monkeypatch.setattr(login_throttle, 'username_limit', 2)
+
+    assert client.post(AUTH_API_URL, json=WRONG_PASSWORD).status_code == 401
+    assert client.post(AUTH_API_URL, json=TEST_USER).status_code == 201
+    assert client.post(AUTH_API_URL, json=WRONG_PASSWORD).status_code == 401
+    assert client.post(AUTH_API_URL, json=TEST_USER).status_code == 201
+
+
+def test_unknown_username_cache(client, cleanup):
+    login = {'username': NEW_USER['username'], 'password': NEW_USER['password']}
+
+    assert client.post(AUTH_API_URL, json=login).status_code == 404
+    hits = login_throttle.unknown.hits
+    assert client.post(AUTH_API_URL, json=login).status_code == 404
+    assert login_throttle.unknown.hits == hits + 1
+
+    # Creating the user drops it from the cache
+    assert client.put(USER_API_URL, json=NEW_USER).status_code == 201
+    assert client.post(AUTH_API_URL, json=login).status_code == 201
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from ..conftest import client, app
+from src import db
+from src.metrics import metrics, Histogram
+
+AUTH_API_URL = '/api/v1/user/auth'
+METRICS_URL = '/metrics'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+def test_histogram_render():
+    histogram = Histogram('test_seconds', 'Test.', ('route',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'a')
+    histogram.observe(0.5, 'a')
+    histogram.observe(5, 'a')
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{route="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="a"} 3' in lines
+
+
+def test_login_is_measured(client):
+    requests = metrics.requests.get('AuthApi', 'POST', 201)
+    verify = metrics.bcrypt_time.count('verify')
+    encode = metrics.jwt_time.count('encode')
+    statements = metrics.db_statements.get()
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 201
+    assert metrics.requests.get('AuthApi', 'POST', 201) == requests + 1
+    assert metrics.bcrypt_time.count('verify') == verify + 1
+    assert metrics.jwt_time.count('encode') == encode + 1
+    assert metrics.db_statements.get() > statements
+
+
+def test_failed_statements_are_not_kept(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for _ in range(3):
+                with pytest.raises(IntegrityError):
+                    connection.exec_driver_sql(
+                        "INSERT INTO users (id, username, email) SELECT id, username, email FROM users"
+                    )
+                connection.rollback()
+            statements = metrics.db_statements.get()
+            connection.exec_driver_sql('SELECT 1')
+
+            assert metrics.db_statements.get() == statements + 1
+            assert not connection.info.get('query_start')
+
+
+def test_metrics_endpoint(client):
+    client.post(AUTH_API_URL, json=TEST_USER)
+
+    respons = client.get(METRICS_URL)
+
+    assert respons.status_code == 200
+    assert respons.headers['Content-Type'].startswith('text/plain')
+    assert b'http_requests_total{resource="AuthApi",method="POST",status="201"}' in respons.data
+    assert b'http_request_duration_seconds_bucket{resource="AuthApi",method="POST",le="+Inf"}' in respons.data
+    assert b'bcrypt_duration_seconds_count{operation="verify"}' in respons.data
+    assert b'password_hash_queue_depth 0' in respons.data
+    assert b'auth_cache_hits_total' in respons.data
@@ -63,3 +63,31 @@ def test_user_with_invalid_data(client, app, old_password, new_password, code):
     )
 
     assert respons.status_code == code
+
+
+def test_password_change_revokes_token(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+
+    respons = client.post(
+        PASSWORD_API_URL,
+        headers={'Authorization': token.token},
+        json={
+            'old_password': TEST_USER['password'],
+            'new_password': 'Abcd@12345'
+        }
+    )
+
+    assert respons.status_code == 201
+
+    respons = client.post(
+        PASSWORD_API_URL,
+        headers={'Authorization': token.token},
+        json={
+            'old_password': 'Abcd@12345',
+            'new_password': TEST_USER['password']
+        }
+    )
+
+    assert respons.status_code == 401
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from ..conftest import app
+from src import create_app
+from src.profiling import profiler
+
+pytestmark = pytest.mark.wsgi_only
+
+AUTH_API_URL = '/api/v1/user/auth'
+PROFILING_TOKEN = 'profiling-secret'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+def profiled_client(**config):
+    profiled_app = create_app({
+        'TESTING': True,
+        'PROFILING_ENABLED': True,
+        'PROFILING_TOKEN': PROFILING_TOKEN,
+        **config
+    })
+    return profiled_app.test_client()
+
+
+def test_without_header(app):
+    client = profiled_client()
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 201
+    assert 'auth_token' in respons.get_json()['data']
+
+
+def test_wrong_token(app):
+    client = profiled_client()
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER, headers={'X-Profile': 'wrong'})
+
+    assert respons.status_code == 201
+    assert 'Content-Disposition' not in respons.headers
+
+
+def test_profile_attachment(app):
+    client = profiled_client()
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER, headers={'X-Profile': PROFILING_TOKEN})
+
+    assert respons.status_code == 200
+    assert respons.headers['Content-Disposition'].startswith('attachment; filename=')
+    assert respons.headers['X-Profile-Status'] == '201'
+    assert b'SQL statements: ' in respons.data
+    assert b'FROM users' in respons.data
+    assert b'cumulative' in respons.data
+
+
+def test_profile_memory(app):
+    client = profiled_client()
+
+    respons = client.post(
+        AUTH_API_URL, json=TEST_USER, headers={'X-Profile': PROFILING_TOKEN + ':memory'}
+    )
+
+    assert respons.status_code == 200
+    assert b'Memory peak: ' in respons.data
+
+
+def test_overlapping_memory_profiles(app):
+    client = profiled_client()
+
+    # Another request holds tracemalloc
+    with profiler._memory_lock:
+        respons = client.post(
+            AUTH_API_URL, json=TEST_USER, headers={'X-Profile': PROFILING_TOKEN + ':memory'}
+        )
+
+    assert respons.status_code == 200
+    assert b'cumulative' in respons.data
+    assert b'Memory peak: ' not in respons.data
+    assert b'another memory profile is running' in respons.data
+
+
+def test_profile_directory(app, tmp_path):
+    client = profiled_client(PROFILING_OUTPUT='directory', PROFILING_DIR=str(tmp_path), PROFILING_KEEP=2)
+
+    for _ in range(3):
+        respons = client.post(AUTH_API_URL, json=TEST_USER, headers={'X-Profile': PROFILING_TOKEN})
+        assert respons.status_code == 201
+        assert 'auth_token' in respons.get_json()['data']
+
+    reports = sorted(os.listdir(tmp_path))
+    assert len(reports) == 2
+    assert reports[-1] == respons.headers['X-Profile-File']
@@ -0,0 +1,97 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+from ..conftest import client, app
+from src import db
+from src.models import UserModel, AuthTokenModel
+from src.schemas import Cursor
+
+# Captures the statements from the Flask app's engine
+pytestmark = pytest.mark.wsgi_only
+
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+PASSWORD_API_URL = '/api/v1/user/password'
+LIST_API_URL = '/api/v1/users'
+
+TEST_USER = {
+    'email': 'base_test_user@gmail.com',
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+NEW_PASSWORD = 'BaseTestUser@5678'
+
+# A full table or index scan, or an index SQLite builds for one query
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)|AUTOMATIC')
+
+
+@pytest.fixture()
+def statements(app):
+    """
+    SELECT, UPDATE and DELETE statements run during the test.
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    yield captured
+    event.remove(engine, 'before_cursor_execute', capture)
+
+
+def admin_header(app) -> dict:
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        app.config['ADMIN_USER_IDS'] = {user.id}
+        return {'Authorization': AuthTokenModel.query.filter_by(userid=user.id).first().token}
+
+
+def test_hot_paths_use_indexes(client, app, statements):
+    response = client.post(AUTH_API_URL, json=TEST_USER)
+    assert response.status_code == 201
+    headers = {'Authorization': response.get_json()['data']['auth_token']}
+
+    response = client.get(USER_API_URL, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get(USER_API_URL, headers={**headers, 'If-None-Match': etag}).status_code == 304
+    assert client.put(USER_API_URL, json={
+        'username': TEST_USER['username'], 'email': TEST_USER['email'], 'password': 'x'
+    }).status_code == 400
+    assert client.post(PASSWORD_API_URL, headers=headers, json={
+        'old_password': TEST_USER['password'], 'new_password': NEW_PASSWORD
+    }).status_code == 201
+
+    headers = {'Authorization': client.post(
+        AUTH_API_URL, json={'username': TEST_USER['username'], 'password': NEW_PASSWORD}
+    ).get_json()['data']['auth_token']}
+    assert client.delete(AUTH_API_URL, headers=headers).status_code == 204
+
+    assert statements
+    with app.app_context():
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            scans = [row[-1] for row in plan if FULL_SCAN.search(row[-1])]
+            assert scans == [], f'{statement} -> {scans}'
+
+
+def test_user_listing_uses_primary_key(client, app, statements):
+    headers = admin_header(app)
+    cursor = Cursor().serialize('id', {'id': 0})
+
+    assert client.get(LIST_API_URL, headers=headers, query_string={'limit': 1, 'cursor': cursor}).status_code == 200
+
+    with app.app_context():
+        connection = db.session.connection()
+        listing = [statement for statement in statements if 'users.id >' in statement[0]]
+        assert listing
+        for statement, parameters in listing:
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            assert any('INTEGER PRIMARY KEY' in row[-1] for row in plan), plan
@@ -0,0 +1,57 @@
+import threading
+
+from ..conftest import client, app
+from src import create_app
+from src.startup import startup
+
+READINESS_URL = '/ready'
+
+
+def test_ready_after_warm_up(client):
+    respons = client.get(READINESS_URL)
+
+    assert respons.status_code == 200
+    assert respons.get_json()['status'] == 'ready'
+    assert {'config', 'routes', 'bcrypt', 'jwt', 'pool', 'total'} <= set(respons.get_json()['phases'])
+
+
+def test_not_ready_during_background_warm_up(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(startup, 'warm_up_jwt', lambda: release.wait(10))
+
+    app = create_app({'STARTUP_WARMUP': 'background'})
+    client = app.test_client()
+
+    respons = client.get(READINESS_URL)
+    assert respons.status_code == 503
+    assert respons.headers['Retry-After'] == '1'
+    assert respons.get_json()['status'] == 'starting'
+
+    release.set()
+    assert startup.ready.wait(10)
+
+    respons = client.get(READINESS_URL)
+    assert respons.status_code == 200
+    assert 'app_ready 1' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_failed_warm_up_stays_not_ready(monkeypatch):
+    def warm_up_jwt():
+        raise RuntimeError('warm-up failed')
+
+    monkeypatch.setattr(startup, 'warm_up_jwt', warm_up_jwt)
+
+    app = create_app({'DB_AUTO_UPGRADE': True})
+    client = app.test_client()
+
+    respons = client.get(READINESS_URL)
+    assert respons.status_code == 503
+    assert not startup.ready.is_set()
+    assert 'app_ready 0' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_schema_upgrade_is_skipped_when_disabled():
+    create_app({'DB_AUTO_UPGRADE': False})
+
+    assert 'schema' not in startup.phases
+    assert startup.ready.is_set()
@@ -0,0 +1,132 @@
+import jwt
+import pytest
+from sqlalchemy import insert, select, update
+
+from ..conftest import client, app
+from src import db
+from src.models import UserModel, PasswordModel, AuthTokenModel
+from src.routing import replicas
+from src.revocation import revocations
+
+# Replicas route the Flask session only, the ASGI app has its own engine
+pytestmark = pytest.mark.wsgi_only
+
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+REPLICA_EMAIL = 'replica_copy@gmail.com'
+
+
+@pytest.fixture()
+def replica(app, tmp_path):
+    """
+    A second SQLite file acting as the replica. It holds a copy of the
+    test user with a different email, so reads show where they went.
+    """
+    app.config['DB_REPLICA_URIS'] = [f'sqlite:///{tmp_path / "replica.db"}']
+    with app.app_context():
+        replicas.init_app(app, db.session)
+        engine = replicas.engines[0]
+        db.metadata.create_all(engine)
+
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        with engine.begin() as connection:
+            connection.execute(insert(UserModel), [{
+                'id': user.id, 'username': user.username, 'email': REPLICA_EMAIL,
+                'version': user.version
+            }])
+            connection.execute(insert(PasswordModel), [{
+                'userid': user.id, 'password_hash': user.password.password_hash
+            }])
+        token = user.token.token
+
+    yield token
+
+    app.config['DB_REPLICA_URIS'] = []
+    with app.app_context():
+        replicas.init_app(app, db.session)
+
+
+def test_reads_go_to_the_replica(client, replica):
+    respons = client.get(USER_API_URL, headers={'Authorization': replica})
+
+    assert respons.status_code == 200
+    assert respons.get_json()['data']['email'] == REPLICA_EMAIL
+
+
+def test_login_runs_on_the_primary(client, app, replica):
+    with app.app_context():
+        replica_engine = replicas.engines[0]
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 201
+    token = respons.get_json()['data']['auth_token']
+    with app.app_context():
+        assert AuthTokenModel.query.filter_by(token=token).first() is not None
+    with replica_engine.connect() as connection:
+        assert connection.execute(select(AuthTokenModel.id)).all() == []
+
+
+def test_login_signs_the_primary_token_generation(client, app, replica):
+    # The replica lags behind a logout that bumped the generation to 3
+    with app.app_context():
+        db.session.execute(
+            update(UserModel).where(UserModel.username == TEST_USER['username']).values(token_generation=3)
+        )
+        db.session.commit()
+    revocations.clear()
+
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+
+    assert respons.status_code == 201
+    token = respons.get_json()['data']['auth_token']
+    assert jwt.decode(token, options={'verify_signature': False})['gen'] == 3
+
+def test_own_write_reads_the_primary(client, app, replica):
+    respons = client.patch(
+        USER_API_URL,
+        headers={'Authorization': replica},
+        json={'username': 'replica_test_user', 'email': 'replica_test_user@gmail.com'}
+    )
+    assert respons.status_code == 200
+
+    # Within the sticky window
+    respons = client.get(USER_API_URL, headers={'Authorization': replica})
+    assert respons.get_json()['data']['email'] == 'replica_test_user@gmail.com'
+
+    replicas.sticky.clear()
+    respons = client.get(USER_API_URL, headers={'Authorization': replica})
+    assert respons.get_json()['data']['email'] == REPLICA_EMAIL
+
+
+def test_sign_up_then_login_reads_the_primary(client, replica):
+    new_user = {
+        'email': 'replica_new_user@gmail.com',
+        'username': 'replica_new_user',
+        'password': 'Abcd@1234'
+    }
+    login = {'username': new_user['username'], 'password': new_user['password']}
+    assert client.put(USER_API_URL, json=new_user).status_code == 201
+
+    # The replica has not received the new user yet
+    respons = client.post(AUTH_API_URL, json=login)
+    assert respons.status_code == 201
+    token = respons.get_json()['data']['auth_token']
+
+    respons = client.get(USER_API_URL, headers={'Authorization': token})
+    assert respons.status_code == 200
+    assert respons.get_json()['data']['username'] == new_user['username']
+
+    assert client.delete(USER_API_URL, headers={'Authorization': token}, json=login).status_code == 204
+
+
+def test_reads_outside_a_request_use_the_primary(app, replica):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+
+        assert user.email != REPLICA_EMAIL
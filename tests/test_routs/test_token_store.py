@@ -0,0 +1,107 @@
+import pytest
+
+from ..conftest import client, app
+from src import db
+from src.models import UserModel, AuthTokenModel
+from src.tokens import token_store
+
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+@pytest.fixture()
+def store(app):
+    def configure(mode: str, **config):
+        app.config.update(TOKEN_STORE=mode, **config)
+        token_store.init_app(app)
+        return token_store
+
+    yield configure
+    app.config['TOKEN_STORE'] = 'upsert'
+    token_store.init_app(app)
+
+
+def login(client) -> str:
+    respons = client.post(AUTH_API_URL, json=TEST_USER)
+    assert respons.status_code == 201
+    return respons.get_json()['data']['auth_token']
+
+
+def userid(app) -> int:
+    with app.app_context():
+        return UserModel.query.filter_by(username=TEST_USER['username']).first().id
+
+
+def stored_tokens(app) -> list:
+    with app.app_context():
+        return [row.token for row in AuthTokenModel.query.filter_by(userid=userid(app))]
+
+
+def test_upsert_keeps_one_row_per_user(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        AuthTokenModel.query.filter_by(userid=user.id).delete()
+        db.session.commit()
+
+    first = login(client)
+    assert stored_tokens(app) == [first]
+
+    with app.app_context():
+        # Logins within the same second issue the same token
+        AuthTokenModel.query.update({'token': 'old-token'})
+        db.session.commit()
+
+    second = login(client)
+    assert stored_tokens(app) == [second]
+
+
+def test_write_behind_flushes_in_batches(client, app, store):
+    write_behind = store('write-behind', TOKEN_WRITE_BEHIND_INTERVAL=60)
+    before = stored_tokens(app)
+
+    token = login(client)
+
+    assert stored_tokens(app) == before
+    assert write_behind.pending(userid(app))['token'] == token
+
+    assert write_behind.flush() == 1
+    assert stored_tokens(app) == [token]
+    assert write_behind.pending(userid(app)) is None
+
+
+def test_logout_drops_the_pending_token(client, app, store):
+    write_behind = store('write-behind', TOKEN_WRITE_BEHIND_INTERVAL=60)
+    token = login(client)
+
+    respons = client.delete(AUTH_API_URL, headers={'Authorization': token})
+
+    assert respons.status_code == 204
+    assert write_behind.pending(userid(app)) is None
+    assert stored_tokens(app) == []
+
+
+def test_stateless_skips_the_table(client, app, store):
+    store('stateless')
+    before = stored_tokens(app)
+
+    token = login(client)
+
+    assert stored_tokens(app) == before
+    respons = client.get(USER_API_URL, headers={'Authorization': token})
+    assert respons.status_code == 200
+
+
+def test_upsert_without_unit_of_work(client, app):
+    app.config['DB_TRANSACTION_PER_REQUEST'] = False
+    with app.app_context():
+        AuthTokenModel.query.filter_by(userid=userid(app)).delete()
+        db.session.commit()
+
+    token = login(client)
+
+    assert stored_tokens(app) == [token]
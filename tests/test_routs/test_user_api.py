@@ -2,6 +2,7 @@ import pytest
 
 from ..conftest import client, app
 from src.models import UserModel, AuthTokenModel, PasswordModel
+from src.etags import user_versions
 
 USER_API_URL = '/api/v1/user'
 
@@ -230,3 +231,79 @@ def test_delete_user_with_invalid_data(client, app, username, password, code):
     )
 
     assert response.status_code == code
+
+
+def test_get_user_etag(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+
+    response = client.get(USER_API_URL, headers={'Authorization': token.token})
+    etag = response.headers['ETag']
+
+    assert response.status_code == 200
+    assert etag == f'"user-{user.id}-{user.version}"'
+
+    # Not modified, answered from the version cache
+    hits = user_versions.hits
+    response = client.get(
+        USER_API_URL,
+        headers={'Authorization': token.token, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert user_versions.hits == hits + 1
+
+    response = client.get(
+        USER_API_URL,
+        headers={'Authorization': token.token, 'If-None-Match': '"user-0-1"'}
+    )
+
+    assert response.status_code == 200
+
+
+def test_patch_user_changes_etag(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+
+    etag = client.get(USER_API_URL, headers={'Authorization': token.token}).headers['ETag']
+
+    response = client.patch(
+        USER_API_URL,
+        headers={'Authorization': token.token},
+        json={'username': 'etag_test_user', 'email': 'etag_test_user@gmail.com'}
+    )
+    assert response.status_code == 200
+
+    response = client.get(
+        USER_API_URL,
+        headers={'Authorization': token.token, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'etag_test_user' in response.data
+
+    with app.app_context():
+        user_new = UserModel.query.filter_by(username='etag_test_user').first()
+        assert user_new.version == user.version + 1
+        user_new.delete(user_new)
+
+
+def test_get_deleted_user_with_old_token(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first().token
+
+    response = client.get(USER_API_URL, headers={'Authorization': token})
+    assert response.status_code == 200
+
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        user.delete(user)
+
+    response = client.get(USER_API_URL, headers={'Authorization': token})
+    assert response.status_code == 401
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from ..conftest import client, app, runner
+from src.models import UserModel, AuthTokenModel, PasswordModel
+from src.uniqueness import unique_users
+
+# Uses Flask request hooks or endpoints that only exist in the WSGI app
+pytestmark = pytest.mark.wsgi_only
+
+IMPORT_API_URL = '/api/v1/users/import'
+
+TEST_USER = {
+    'email': 'base_test_user@gmail.com',
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+IMPORT_USERS = [
+    {'username': 'import_user_1', 'email': 'import_user_1@gmail.com', 'password': 'Abcd@1234'},
+    {'username': 'import_user_2', 'email': 'import_user_2@gmail.com', 'password': 'Abcd@1234'},
+    {'username': 'import_user_2', 'email': 'import_user_3@gmail.com', 'password': 'Abcd@1234'},
+    {'username': 'import_user_4', 'email': 'import_user_4@gmail.com', 'password': 'weak'},
+    {'username': TEST_USER['username'], 'email': 'import_user_5@gmail.com', 'password': 'Abcd@1234'},
+]
+
+
+@pytest.fixture()
+def admin_token(app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+        app.config['ADMIN_USER_IDS'] = {user.id}
+        return token.token
+
+
+@pytest.fixture()
+def cleanup(app):
+    yield
+    with app.app_context():
+        for user in UserModel.query.filter(UserModel.username.like('import_user_%')):
+            user.delete(user)
+
+
+def check_imported(app):
+    with app.app_context():
+        users = UserModel.query.filter(UserModel.username.like('import_user_%')).all()
+
+        assert sorted(user.username for user in users) == ['import_user_1', 'import_user_2']
+        for user in users:
+            assert user.password.verify_password('Abcd@1234', user.password.password_hash)
+
+
+def test_import_requires_admin(client, app, admin_token):
+    app.config['ADMIN_USER_IDS'] = set()
+
+    response = client.post(IMPORT_API_URL, headers={'Authorization': admin_token}, data='')
+
+    assert response.status_code == 403
+
+
+def test_import_ndjson(client, app, admin_token, cleanup):
+    body = '\n'.join(json.dumps(user) for user in IMPORT_USERS) + '\nnot json\n'
+
+    response = client.post(
+        IMPORT_API_URL,
+        headers={'Authorization': admin_token},
+        data=body,
+        content_type='application/x-ndjson'
+    )
+
+    assert response.status_code == 200
+
+    report = response.get_json()['data']
+    assert report['rows'] == 6
+    assert report['created'] == 2
+    assert [error['line'] for error in report['errors']] == [3, 4, 5, 6]
+    assert 'username' in report['errors'][0]['errors']
+    assert 'password' in report['errors'][1]['errors']
+    check_imported(app)
+
+
+def test_import_csv_cli(runner, app, cleanup, tmp_path):
+    path = tmp_path / 'users.csv'
+    lines = ['username,email,password']
+    lines += [f"{user['username']},{user['email']},{user['password']}" for user in IMPORT_USERS]
+    path.write_text('\n'.join(lines) + '\n')
+
+    result = runner.invoke(args=['users', 'import', str(path), '--batch-size', '2', '--workers', '2'])
+
+    assert result.exit_code == 0
+    assert '5 rows: 2 created, 3 failed' in result.output
+    check_imported(app)
+
+
+def test_import_falls_back_on_race(client, app, admin_token, cleanup, monkeypatch):
+    monkeypatch.setattr(unique_users, 'taken', lambda *args: (set(), set()))
+    body = '\n'.join(json.dumps(user) for user in IMPORT_USERS)
+
+    response = client.post(
+        IMPORT_API_URL,
+        headers={'Authorization': admin_token},
+        data=body,
+        content_type='application/x-ndjson'
+    )
+    report = response.get_json()['data']
+
+    assert report['created'] == 2
+    assert [error['line'] for error in report['errors']] == [3, 4, 5]
+    assert report['errors'][2]['errors'] == {'username': {'error': 'This username is already exist.'}}
+    check_imported(app)
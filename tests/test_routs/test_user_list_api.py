@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import insert
+
+from ..conftest import client, app
+from src import db
+from src.models import UserModel, AuthTokenModel
+
+# The admin endpoints only exist in the WSGI app
+pytestmark = pytest.mark.wsgi_only
+
+LIST_API_URL = '/api/v1/users'
+LIST_USERS = 7
+
+TEST_USER = {
+    'username': 'base_test_user'
+}
+
+
+@pytest.fixture()
+def admin_token(app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+        app.config['ADMIN_USER_IDS'] = {user.id}
+        return token.token
+
+
+@pytest.fixture()
+def list_users(app):
+    with app.app_context():
+        db.session.execute(insert(UserModel), [
+            {
+                'username': f'list_user_{i}',
+                'email': f'list_user_{i}@gmail.com',
+                'confirm_user': i % 2 == 0
+            }
+            for i in range(LIST_USERS)
+        ])
+        db.session.commit()
+    yield
+    with app.app_context():
+        for user in UserModel.query.filter(UserModel.username.like('list_user_%')):
+            user.delete(user)
+
+
+def list_page(client, token, **params):
+    response = client.get(LIST_API_URL, headers={'Authorization': token}, query_string=params)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_list_requires_admin(client, app, admin_token):
+    app.config['ADMIN_USER_IDS'] = set()
+
+    response = client.get(LIST_API_URL, headers={'Authorization': admin_token})
+
+    assert response.status_code == 403
+
+
+def test_list_pages(client, admin_token, list_users):
+    users = []
+    cursor = None
+    while True:
+        params = {'limit': 3}
+        if cursor:
+            params['cursor'] = cursor
+        page = list_page(client, admin_token, **params)
+        assert len(page['users']) <= 3
+        users += page['users']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    ids = [user['id'] for user in users]
+    assert ids == sorted(set(ids))
+    assert [user['username'] for user in users if user['username'].startswith('list_user_')] == [
+        f'list_user_{i}' for i in range(LIST_USERS)
+    ]
+    assert set(users[0]) == {'id', 'username', 'email', 'confirm_user'}
+
+
+def test_list_filters(client, admin_token, list_users):
+    page = list_page(client, admin_token, confirm_user='true')
+
+    assert [user['username'] for user in page['users']] == [
+        f'list_user_{i}' for i in range(0, LIST_USERS, 2)
+    ]
+    assert page['next_cursor'] is None
+
+    page = list_page(client, admin_token, created_after='2000-01-01T00:00:00', created_before='2000-01-02T00:00:00')
+
+    assert page['users'] == []
+
+
+@pytest.mark.parametrize('params', [
+    {'cursor': 'not-a-cursor'},
+    {'limit': 0},
+    {'limit': 100000},
+    {'confirm_user': 'maybe'},
+    {'created_after': 'yesterday'}
+])
+def test_list_invalid_arguments(client, admin_token, params):
+    response = client.get(LIST_API_URL, headers={'Authorization': admin_token}, query_string=params)
+
+    assert response.status_code == 400
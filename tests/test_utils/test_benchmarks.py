@@ -0,0 +1,54 @@
+from benchmarks.bench_api import Benchmark, percentile, summarize, failures, compare
+
+
+def result(p50_ms: float) -> dict:
+    return {'results': {'client': {'POST /user/auth': {'p50_ms': p50_ms}}}}
+
+
+def test_percentile():
+    samples = [i / 1000 for i in range(1, 101)]
+
+    assert percentile(samples, 0.50) == 0.050
+    assert percentile(samples, 0.99) == 0.099
+    assert percentile([0.5], 0.99) == 0.5
+
+
+def test_summarize():
+    summary = summarize([0.01, 0.02, 0.03, 0.04], errors=1)
+
+    assert summary['requests'] == 4
+    assert summary['errors'] == 1
+    assert summary['p50_ms'] == 20.0
+    assert summary['rps'] == 40.0
+
+
+def test_compare_threshold():
+    baseline = result(100.0)
+
+    assert compare(baseline, result(115.0), threshold=0.2) == []
+    assert compare(baseline, result(130.0), threshold=0.2) == [
+        ('client', 'POST /user/auth', 100.0, 130.0)
+    ]
+
+
+def test_compare_skips_missing_endpoints():
+    assert compare(result(100.0), {'results': {'wsgi': {}}}, threshold=0.2) == []
+
+
+def test_failures():
+    results = {'results': {
+        'client': {'GET /user': {'errors': 0}, 'PUT /user': {'errors': 3}},
+        'wsgi': {'GET /user': {'errors': 1}}
+    }}
+
+    assert failures(results) == [('client', 'PUT /user', 3), ('wsgi', 'GET /user', 1)]
+    assert failures({'results': {'client': {'GET /user': {'errors': 0}}}}) == []
+
+
+def test_every_endpoint_has_a_scenario():
+    benchmark = Benchmark(users=0, requests=1, warmup=0)
+    try:
+        benchmark.seed()
+        assert benchmark.check_coverage(benchmark.scenarios()) == []
+    finally:
+        benchmark.close()
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from src.cache import TTLCache, claims_cache
+from src.models import UserModel, AuthTokenModel
+
+USER_API_URL = '/api/v1/user'
+
+TEST_USER = {
+    'email': 'base_test_user@gmail.com',
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['hits'] == 3
+    assert cache.stats()['misses'] == 1
+
+
+def test_ttl_cache_respects_expiry():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1, expires=time.time() - 1)
+
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_disabled():
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set('a', 1)
+
+    assert cache.get('a') is None
+
+
+def test_repeated_token_skips_verification(client, app, monkeypatch):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        token = AuthTokenModel.query.filter_by(userid=user.id).first()
+
+    response = client.get(USER_API_URL, headers={'Authorization': token.token})
+    assert response.status_code == 200
+    assert claims_cache.stats()['misses'] == 1
+
+    def fail(*args, **kwargs):
+        pytest.fail('The token should be served from the cache.')
+
+    monkeypatch.setattr(AuthTokenModel, 'verify_auth_token', fail)
+
+    response = client.get(USER_API_URL, headers={'Authorization': token.token})
+    assert response.status_code == 200
+    assert claims_cache.stats()['hits'] == 1
@@ -0,0 +1,64 @@
+import threading
+
+from src import db
+from src.database import engine_options
+from src.models import UserModel
+
+WRITERS = 8
+USERS_PER_WRITER = 10
+
+
+def test_sqlite_pragmas_are_applied(app):
+    with app.app_context():
+        connection = db.session.connection()
+
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+
+
+def test_engine_options_by_backend(app):
+    config = dict(app.config, SQLALCHEMY_ENGINE_OPTIONS={})
+
+    options = engine_options(dict(config, SQLALCHEMY_DATABASE_URI='postgresql://db/app'))
+    assert options['pool_pre_ping'] is True
+    assert options['pool_size'] == app.config['DB_POOL_SIZE']
+
+    options = engine_options(dict(config, SQLALCHEMY_DATABASE_URI='sqlite:///app.db'))
+    assert 'pool_pre_ping' not in options
+    assert options['pool_size'] == app.config['DB_POOL_SIZE']
+
+    options = engine_options(dict(config, SQLALCHEMY_DATABASE_URI='sqlite://'))
+    assert options == {}
+
+
+def test_parallel_writers(app):
+    errors = []
+
+    def writer(number):
+        with app.app_context():
+            try:
+                for i in range(USERS_PER_WRITER):
+                    user = UserModel(
+                        username=f'writer_{number}_{i}',
+                        email=f'writer_{number}_{i}@gmail.com'
+                    )
+                    user.create(user)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        users = UserModel.query.filter(UserModel.username.like('writer_%')).all()
+        count = len(users)
+        for user in users:
+            db.session.delete(user)
+        db.session.commit()
+
+    assert errors == []
+    assert count == WRITERS * USERS_PER_WRITER
@@ -0,0 +1,98 @@
+import pytest
+
+from src import db
+from src.hashing import hasher, calibrate, PWD_CONTEXT, HashQueueFull
+from src.models import UserModel
+from src.rehash import rehasher
+
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+@pytest.fixture()
+def pool(app):
+    hasher.configure(workers=1, queue_size=0, retry_after=3)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify_in_pool(pool):
+    password_hash = pool.hash('Abcd@1234')
+
+    assert pool.verify('Abcd@1234', password_hash) is True
+    assert pool.verify('Abcd@12345', password_hash) is False
+
+    stats = pool.stats()
+    assert stats['calls'] == 3
+    assert stats['queue_depth'] == 0
+    assert stats['max_queue_depth'] == 1
+    assert stats['seconds'] > 0
+
+
+def test_full_queue_raises(pool):
+    pool._slots.acquire()
+    try:
+        with pytest.raises(HashQueueFull):
+            pool.hash('Abcd@1234')
+    finally:
+        pool._slots.release()
+
+    assert pool.stats()['rejected'] == 1
+
+
+def test_full_queue_returns_503(client, pool):
+    pool._slots.acquire()
+    try:
+        response = client.post(AUTH_API_URL, json=TEST_USER)
+    finally:
+        pool._slots.release()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert b'retry later' in response.data
+
+
+def test_imports_keep_off_the_request_pool(pool, monkeypatch):
+    def request_pool_map(*args):
+        raise AssertionError('An import hashed on the request pool.')
+
+    monkeypatch.setattr(pool._executor, 'map', request_pool_map)
+
+    executor = pool.import_executor(2)
+    hashes = pool.hash_many(['Abcd@1234'] * 3, executor) + pool.hash_many(['Abcd@1234'])
+
+    assert pool.import_executor(2) is executor
+    assert all(PWD_CONTEXT.verify('Abcd@1234', password_hash) for password_hash in hashes)
+    assert pool.stats()['queue_depth'] == 0
+
+def test_calibrate_stays_within_bounds():
+    assert calibrate(1e-9, 10, 16) == 10
+    assert calibrate(1e6, 10, 16) == 16
+
+
+def test_pool_workers_use_the_calibrated_cost(pool):
+    password_hash = pool.hash('Abcd@1234')
+
+    assert password_hash.startswith(f'$2b${pool.rounds:02d}$')
+    assert pool.needs_update(password_hash) is False
+
+
+def test_outdated_hash_is_rewritten_after_login(client, app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        user.password.password_hash = PWD_CONTEXT.handler('bcrypt').using(rounds=4).hash(TEST_USER['password'])
+        db.session.commit()
+        assert hasher.needs_update(user.password.password_hash) is True
+
+    response = client.post(AUTH_API_URL, json=TEST_USER)
+    rehasher.join()
+
+    assert response.status_code == 201
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        assert user.password.password_hash.startswith(f'$2b${hasher.rounds:02d}$')
+        assert hasher.verify(TEST_USER['password'], user.password.password_hash) is True
@@ -0,0 +1,119 @@
+import json
+import queue
+import logging
+
+import pytest
+
+from src.logs import log_pipeline, DroppingQueueHandler
+
+HELLO_API_URL = '/api/v1/hello'
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+@pytest.fixture()
+def log_file(app, tmp_path):
+    path = tmp_path / 'app.log'
+    app.config['LOG_FILE'] = str(path)
+    log_pipeline.init_app(app)
+
+    yield path
+
+    log_pipeline.stop()
+
+
+def read_records(path) -> list:
+    # Writes everything still queued
+    log_pipeline.stop()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_access_records(app, log_file):
+    client = app.test_client()
+    token = client.post(AUTH_API_URL, json=TEST_USER).get_json()['data']['auth_token']
+    client.get(USER_API_URL, headers={'Authorization': token})
+    client.get('/api/v1/unknown')
+
+    login, user, unknown = read_records(log_file)
+
+    assert login['logger'] == 'src.access'
+    assert login['route'] == AUTH_API_URL
+    assert login['status'] == 201
+    assert login['user_id'] is None
+
+    assert user['method'] == 'GET'
+    assert user['status'] == 200
+    assert user['user_id'] is not None
+    assert user['latency_ms'] > 0
+    assert user['db_statements'] >= 1
+    assert user['db_time_ms'] >= 0
+
+    assert unknown['route'] is None
+    assert unknown['path'] == '/api/v1/unknown'
+    assert unknown['status'] == 404
+
+
+def test_errors_are_logged(app, log_file):
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        app.logger.exception('Request failed.')
+    logging.getLogger('src.other').warning('Below LOG_LEVEL.')
+
+    records = read_records(log_file)
+
+    assert len(records) == 1
+    assert records[0]['level'] == 'ERROR'
+    assert records[0]['message'] == 'Request failed.'
+    assert 'ValueError: boom' in records[0]['exc']
+
+
+def test_info_level_reaches_the_file(app, tmp_path):
+    path = tmp_path / 'app.log'
+    app.config.update({'LOG_FILE': str(path), 'LOG_LEVEL': 'INFO'})
+    log_pipeline.init_app(app)
+    try:
+        # Outside the app's logger, which DEBUG sets to its own level
+        logging.getLogger('tests.other').info('At LOG_LEVEL.')
+        logging.getLogger('tests.other').debug('Below LOG_LEVEL.')
+        records = read_records(path)
+    finally:
+        log_pipeline.stop()
+
+    assert [record['message'] for record in records] == ['At LOG_LEVEL.']
+    assert logging.getLogger().level == logging.WARNING
+
+
+def test_sampling_keeps_errors(app, log_file):
+    log_pipeline.sample_rate = 0.0
+    sampled_out = log_pipeline.sampled_out
+    client = app.test_client()
+
+    client.get(HELLO_API_URL)
+    client.get(USER_API_URL)
+
+    records = read_records(log_file)
+    assert [record['status'] for record in records] == [401]
+    assert records[0]['sample_rate'] == 1.0
+    assert log_pipeline.sampled_out == sampled_out + 1
+
+
+def test_full_queue_drops_records():
+    dropped = []
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2), lambda: dropped.append(1))
+    logger = logging.getLogger('tests.dropping')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for n in range(5):
+            logger.warning('record %s', n)
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.queue.qsize() == 2
+    assert len(dropped) == 3
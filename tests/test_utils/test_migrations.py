@@ -0,0 +1,90 @@
+import sqlalchemy as sa
+
+from src import create_app, db, alembic
+from src.database import INITIAL_REVISION
+from src.models import UserModel
+
+
+def test_migrations_match_models(app):
+    with app.app_context():
+        assert alembic.compare_metadata() == []
+
+
+def test_upgrade_and_downgrade(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/migrations.db', 'DB_AUTO_UPGRADE': True})
+
+    with app.app_context():
+        heads = [script.revision for script in alembic.heads()]
+        assert [script.revision for script in alembic.current()] == heads
+
+        alembic.downgrade(INITIAL_REVISION)
+        assert [script.revision for script in alembic.current()] == [INITIAL_REVISION]
+
+        alembic.upgrade()
+        assert [script.revision for script in alembic.current()] == heads
+        db.engine.dispose()
+
+
+def test_stamp_database_without_version_table(tmp_path):
+    uri = f'sqlite:///{tmp_path}/legacy.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'DB_AUTO_UPGRADE': True})
+    with app.app_context():
+        # A database built by create_all() before the migrations existed
+        alembic.downgrade(INITIAL_REVISION)
+        db.session.execute(db.text('DROP TABLE alembic_version'))
+        db.session.commit()
+        db.engine.dispose()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'DB_AUTO_UPGRADE': True})
+    with app.app_context():
+        assert alembic.compare_metadata() == []
+        db.engine.dispose()
+
+
+def test_upgrade_baseline_database(tmp_path):
+    """
+    A database created by db.create_all() with the models as they were
+    before the migrations, holding a user.
+    """
+    uri = f'sqlite:///{tmp_path}/baseline.db'
+    metadata = sa.MetaData()
+    sa.Table(
+        'users', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('username', sa.String(60), unique=True, nullable=False),
+        sa.Column('email', sa.String(60), unique=True, nullable=False),
+        sa.Column('datetime', sa.DateTime(timezone=True)),
+        sa.Column('confirm_user', sa.Boolean)
+    )
+    sa.Table(
+        'passwords', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('password_hash', sa.String(255)),
+        sa.Column('last_update', sa.DateTime(timezone=True)),
+        sa.Column('userid', sa.Integer, sa.ForeignKey('users.id'))
+    )
+    sa.Table(
+        'tokens', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('token', sa.String, unique=True),
+        sa.Column('userid', sa.Integer, sa.ForeignKey('users.id'))
+    )
+    engine = sa.create_engine(uri)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(metadata.tables['users'].insert().values(
+            id=1, username='baseline_user', email='baseline_user@gmail.com', confirm_user=False
+        ))
+        connection.execute(metadata.tables['tokens'].insert().values(token='legacy', userid=1))
+    engine.dispose()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'DB_AUTO_UPGRADE': True})
+    with app.app_context():
+        assert alembic.compare_metadata() == []
+
+        user = db.session.get(UserModel, 1)
+        assert user.username == 'baseline_user'
+        assert user.token_generation == 0
+        assert user.version == 1
+        assert user.token.expires_at is None
+        db.engine.dispose()
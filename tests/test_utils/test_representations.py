@@ -0,0 +1,63 @@
+import json
+import datetime
+
+import pytest
+
+from src.messages import error_msg, success_msg
+from src.messages import ApiMessages as msg
+from src.representations import serializer
+
+USER_API_URL = '/api/v1/user'
+HELLO_API_URL = '/api/v1/hello'
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def engine(request):
+    serializer.configure(request.param)
+    yield request.param
+    serializer.configure('orjson')
+
+
+def test_engines_round_trip(engine):
+    data = {'id': 1, 'name': 'Zoë', 'created': datetime.datetime(2024, 1, 2, 3, 4, 5), 'tags': {'a'}}
+
+    assert json.loads(serializer.dumps(data)) == {
+        'id': 1, 'name': 'Zoë', 'created': '2024-01-02T03:04:05', 'tags': ['a']
+    }
+    assert serializer.loads(b'{"a": [1, 2]}') == {'a': [1, 2]}
+
+
+def test_constants_are_serialized_once(engine):
+    body = serializer.error_body(msg.AUTHORIZATION_ERROR)
+
+    assert body is serializer.error_body(msg.AUTHORIZATION_ERROR)
+    assert json.loads(body) == error_msg(msg.AUTHORIZATION_ERROR)
+    assert json.loads(serializer.success_body('Hello World')) == success_msg('Hello World')
+
+
+def test_dynamic_messages(engine):
+    messages = {'username': ['Missing data for required field.']}
+
+    assert json.loads(serializer.error_body(messages)) == error_msg(messages)
+    assert json.loads(serializer.success_body({})) == success_msg({})
+
+
+def test_unauthorized_response_is_prebuilt(client):
+    respons = client.get(USER_API_URL)
+
+    assert respons.status_code == 401
+    assert respons.headers['Content-Type'] == 'application/json'
+    assert respons.data == serializer.error_body(msg.AUTHORIZATION_ERROR)
+
+
+def test_hello_response_is_prebuilt(client):
+    respons = client.get(HELLO_API_URL)
+
+    assert respons.status_code == 200
+    assert respons.data == serializer.success_body('Hello World')
+
+
+def test_invalid_json_body(client):
+    respons = client.put(USER_API_URL, data='{"username": ', content_type='application/json')
+
+    assert respons.status_code == 400
@@ -0,0 +1,249 @@
+import pytest
+from sqlalchemy import event, select, update
+
+from src import db, create_app
+from src.models import UserModel, PasswordModel, UserDirectoryModel
+from src.routing import shards
+from src.sharding import directory, shard_for
+
+USER_API_URL = '/api/v1/user'
+USERS_API_URL = '/api/v1/users'
+AUTH_API_URL = '/api/v1/user/auth'
+
+PASSWORD = 'ShardTest_User1234'
+
+
+def new_user(n: int) -> dict:
+    return {
+        'username': f'shard_test_user_{n}',
+        'email': f'shard_test_user_{n}@gmail.com',
+        'password': PASSWORD
+    }
+
+
+@pytest.fixture()
+def sharded_app(tmp_path):
+    """
+    Builds an app on a temporary primary with (count) SQLite shards.
+    The primary and the first shards are kept when it is called again
+    with more shards.
+    """
+    def make(count: int):
+        return create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "primary.db"}',
+            'DB_SHARD_URIS': [f'sqlite:///{tmp_path / f"shard_{n}.db"}' for n in range(count)],
+            'DB_AUTO_UPGRADE': True,
+            'PASSWORD_HASH_ROUNDS': 4,
+            'STARTUP_WARMUP': 'off',
+            'ADMIN_USER_IDS': {1}
+        })
+
+    yield make
+
+    shards.dispose()
+
+
+def signup(client, n: int) -> int:
+    response = client.put(USER_API_URL, json=new_user(n))
+    assert response.status_code == 201
+    return directory_entry(new_user(n)['username']).userid
+
+
+def login(client, n: int) -> str:
+    response = client.post(AUTH_API_URL, json={'username': new_user(n)['username'], 'password': PASSWORD})
+    assert response.status_code == 201
+    return response.get_json()['data']['auth_token']
+
+
+def directory_entry(username: str) -> UserDirectoryModel:
+    return db.session.execute(
+        select(UserDirectoryModel).where(UserDirectoryModel.username == username)
+    ).scalar_one_or_none()
+
+
+def shards_of(userid: int) -> list:
+    """
+    The shards holding a 'users' or 'passwords' row of (userid).
+    """
+    found = []
+    for shard in shards.each():
+        if (
+            db.session.get(UserModel, userid) is not None
+            or PasswordModel.query.filter_by(userid=userid).first() is not None
+        ):
+            found.append(shard)
+        db.session.expunge_all()
+    return found
+
+
+def test_new_shard_takes_over_few_users():
+    userids = range(1, 5001)
+    moved = [userid for userid in userids if shard_for(userid, 4) != shard_for(userid, 5)]
+
+    # About 1/5 of the users, all of them to the new shard
+    assert 0.15 < len(moved) / len(userids) < 0.25
+    assert {shard_for(userid, 5) for userid in moved} == {4}
+
+
+def test_signup_and_login(sharded_app):
+    app = sharded_app(3)
+    client = app.test_client()
+
+    with app.app_context():
+        userids = [signup(client, n) for n in range(6)]
+
+        for userid in userids:
+            assert shards_of(userid) == [shard_for(userid, 3)]
+            assert db.session.get(UserDirectoryModel, userid).shard == shard_for(userid, 3)
+
+    token = login(client, 4)
+    response = client.get(USER_API_URL, headers={'Authorization': token})
+    assert response.status_code == 200
+    assert response.get_json()['data']['username'] == new_user(4)['username']
+
+
+def test_duplicate_signup(sharded_app):
+    app = sharded_app(2)
+    client = app.test_client()
+    with app.app_context():
+        signup(client, 0)
+
+    response = client.put(USER_API_URL, json={**new_user(1), 'username': new_user(0)['username']})
+    assert response.status_code == 400
+
+    response = client.put(USER_API_URL, json={**new_user(1), 'email': new_user(0)['email']})
+    assert response.status_code == 400
+
+
+def test_unknown_login(sharded_app):
+    app = sharded_app(2)
+    client = app.test_client()
+
+    response = client.post(AUTH_API_URL, json={'username': 'nobody', 'password': PASSWORD})
+    assert response.status_code == 404
+
+
+def test_list_users_across_shards(sharded_app):
+    app = sharded_app(3)
+    client = app.test_client()
+    with app.app_context():
+        userids = [signup(client, n) for n in range(7)]
+    token = login(client, 0)
+
+    listed = []
+    cursor = None
+    while True:
+        query = {'limit': 3} if cursor is None else {'limit': 3, 'cursor': cursor}
+        response = client.get(USERS_API_URL, headers={'Authorization': token}, query_string=query)
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        listed += [user['id'] for user in data['users']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert listed == sorted(userids)
+
+
+def test_delete_user(sharded_app):
+    app = sharded_app(2)
+    client = app.test_client()
+    with app.app_context():
+        userid = signup(client, 0)
+    token = login(client, 0)
+
+    response = client.delete(
+        USER_API_URL,
+        headers={'Authorization': token},
+        json={'username': new_user(0)['username'], 'password': PASSWORD}
+    )
+    assert response.status_code == 204
+
+    with app.app_context():
+        assert db.session.get(UserDirectoryModel, userid) is None
+        assert shards_of(userid) == []
+
+    # The token of a deleted user no longer selects a shard
+    response = client.get(USER_API_URL, headers={'Authorization': token})
+    assert response.status_code == 401
+
+
+def test_rebalance_after_adding_a_shard(sharded_app):
+    app = sharded_app(2)
+    client = app.test_client()
+    with app.app_context():
+        userids = [signup(client, n) for n in range(12)]
+
+    app = sharded_app(3)
+    runner = app.test_cli_runner()
+
+    with app.app_context():
+        misplaced = [userid for userid in userids if shard_for(userid, 2) != shard_for(userid, 3)]
+        assert misplaced
+        assert sum(count['misplaced'] for count in directory.status()) == len(misplaced)
+
+    result = runner.invoke(args=['shards', 'rebalance', '--batch-size', '2', '--grace', '0'])
+    assert result.exit_code == 0
+    assert f'{len(misplaced)} users moved' in result.output
+
+    with app.app_context():
+        assert sum(count['misplaced'] for count in directory.status()) == 0
+        for userid in userids:
+            assert shards_of(userid) == [shard_for(userid, 3)]
+
+    # Moved users still log in and read their data
+    client = app.test_client()
+    n = userids.index(misplaced[0])
+    token = login(client, n)
+    response = client.get(USER_API_URL, headers={'Authorization': token})
+    assert response.status_code == 200
+    assert response.get_json()['data']['id'] == misplaced[0]
+
+
+def test_resync_keeps_newer_target_writes(sharded_app):
+    app = sharded_app(2)
+    client = app.test_client()
+    with app.app_context():
+        userid = signup(client, 0)
+        source = shard_for(userid, 2)
+        target = 1 - source
+        copied = directory._copy(source, target, [userid])
+
+        # After the flip: a late password change on the source, and a
+        # user update routed to the target
+        with shards.use(source):
+            db.session.execute(
+                update(PasswordModel).where(PasswordModel.userid == userid).values(password_hash='late')
+            )
+            db.session.execute(
+                update(UserModel).where(UserModel.id == userid).values(email='late@gmail.com')
+            )
+            db.session.commit()
+        with shards.use(target):
+            db.session.execute(
+                update(UserModel).where(UserModel.id == userid)
+                .values(email='newer@gmail.com', version=UserModel.version + 1)
+            )
+            db.session.commit()
+
+        written = []
+
+        def record(conn, cursor, statement, *args):
+            written.append(statement.split()[0].upper())
+
+        engine = shards.engines[target]
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            assert directory._resync(source, target, [userid], copied) == 1
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
+        # The password row taken from the source is replaced, the newer
+        # user row is kept as it is
+        assert written.count('DELETE') == 1
+        assert written.count('INSERT') == 1
+
+        with shards.use(target):
+            assert db.session.get(UserModel, userid).email == 'newer@gmail.com'
+            assert PasswordModel.query.filter_by(userid=userid).one().password_hash == 'late'
+            db.session.expunge_all()
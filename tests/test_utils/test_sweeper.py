@@ -0,0 +1,97 @@
+import time
+import datetime
+
+import jwt
+import pytest
+from sqlalchemy import event
+
+from src import db
+from src.models import UserModel, AuthTokenModel
+from src.sweeper import sweeper
+
+ORPHAN_USERID = 10 ** 9
+
+
+@pytest.fixture()
+def tokens(app):
+    """
+    Two expired, one orphaned and two legacy rows (without 'expires_at'),
+    one of which cannot be decoded. The test user keeps its valid token.
+    """
+    now = datetime.datetime.utcnow()
+    with app.app_context():
+        sweeper.sweep(pause=0)
+        user = UserModel.query.filter_by(username='base_test_user').first()
+
+        past = now - datetime.timedelta(days=1)
+        db.session.add_all([
+            AuthTokenModel(token='expired-1', expires_at=past),
+            AuthTokenModel(token='expired-2', expires_at=past),
+            AuthTokenModel(
+                token='orphaned', userid=ORPHAN_USERID, expires_at=now + datetime.timedelta(days=1)
+            ),
+            AuthTokenModel(
+                token=jwt.encode({'exp': past, 'sub': user.id}, 'legacy', algorithm='HS256')
+            ),
+            AuthTokenModel(token='not-a-jwt')
+        ])
+        db.session.commit()
+        yield user.id
+
+
+def test_sweep(app, tokens):
+    with app.app_context():
+        removed = sweeper.removed
+
+        report = sweeper.sweep(batch_size=1, pause=0)
+
+        assert report['expired'] == 3
+        assert report['orphaned'] == 1
+        assert report['invalid'] == 1
+        assert report['batches'] > 5
+        assert sweeper.removed == removed + 5
+
+        # The token of the test user is still valid
+        remaining = AuthTokenModel.query.all()
+        assert [token.userid for token in remaining] == [tokens]
+        assert remaining[0].expires_at > datetime.datetime.utcnow()
+
+
+def test_deletes_without_a_subquery(app, tokens):
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        if statement.startswith('DELETE'):
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            sweeper.sweep(batch_size=2, pause=0)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+    # MySQL refuses 'IN (SELECT ... LIMIT n)'
+    assert statements
+    assert not any('SELECT' in statement for statement in statements)
+
+
+def test_sweep_command(runner, tokens):
+    result = runner.invoke(args=['tokens', 'sweep', '--batch-size', '2', '--pause', '0'])
+
+    assert result.exit_code == 0
+    assert '3 expired, 1 orphaned, 1 invalid tokens removed' in result.output
+
+
+def test_scheduler(app, tokens):
+    runs = sweeper.runs
+    sweeper.start(app, 0.01)
+    try:
+        deadline = time.monotonic() + 5
+        while sweeper.runs == runs and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        sweeper.stop()
+
+    with app.app_context():
+        assert AuthTokenModel.query.count() == 1
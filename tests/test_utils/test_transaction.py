@@ -0,0 +1,93 @@
+import pytest
+from flask import g, Response
+
+from src.models import UserModel, AuthTokenModel
+from src.transaction import uow
+
+# Uses Flask request hooks or endpoints that only exist in the WSGI app
+pytestmark = pytest.mark.wsgi_only
+
+USER_API_URL = '/api/v1/user'
+AUTH_API_URL = '/api/v1/user/auth'
+
+TEST_USER = {
+    'email': 'base_test_user@gmail.com',
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+@pytest.fixture()
+def commits(app):
+    counted = []
+
+    @app.after_request
+    def count_commits(response):
+        counted.append(g.get('db_commits', 0))
+        return response
+
+    return counted
+
+
+@pytest.fixture()
+def token(app):
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        return AuthTokenModel.query.filter_by(userid=user.id).first().token
+
+
+def test_put_user_commits_once(client, app, commits):
+    new_user = {
+        'email': 'uow_test_user@gmail.com',
+        'username': 'uow_test_user',
+        'password': 'Abcd@1234'
+    }
+    response = client.put(USER_API_URL, json=new_user)
+
+    assert response.status_code == 201
+    assert commits == [1]
+
+    with app.app_context():
+        user = UserModel.query.filter_by(username=new_user['username']).first()
+        assert user.password is not None
+        user.delete(user)
+
+
+def test_invalid_request_does_not_commit(client, commits):
+    response = client.put(USER_API_URL, json=TEST_USER)
+
+    assert response.status_code == 400
+    assert commits == [0]
+
+
+def test_logout_commits_once(client, commits, token):
+    response = client.delete(AUTH_API_URL, headers={'Authorization': token})
+
+    assert response.status_code == 204
+    assert commits == [1]
+
+
+def test_logout_without_unit_of_work(client, app, commits, token):
+    app.config['DB_TRANSACTION_PER_REQUEST'] = False
+
+    response = client.delete(AUTH_API_URL, headers={'Authorization': token})
+
+    # The token row delete and the user update commit on their own
+    assert response.status_code == 204
+    assert commits == [2]
+
+
+def test_error_response_rolls_back(app):
+    @uow.wrap
+    def view():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        user.update({'confirm_user': True})
+        return Response(status=400)
+
+    with app.test_request_context():
+        assert view().status_code == 400
+        assert g.db_commits == 0
+
+    with app.app_context():
+        user = UserModel.query.filter_by(username=TEST_USER['username']).first()
+        assert user.confirm_user is False
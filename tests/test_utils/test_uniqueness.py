@@ -0,0 +1,86 @@
+import pytest
+
+from src.uniqueness import BloomFilter, unique_users
+from src.models import UserModel
+
+USER_API_URL = '/api/v1/user'
+
+TEST_USER = {
+    'email': 'base_test_user@gmail.com',
+    'username': 'base_test_user',
+    'password': 'BaseTestUser1234'
+}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    prefilter = BloomFilter(2 ** 16)
+    values = [f'user_{i}@gmail.com' for i in range(1000)]
+    for value in values:
+        prefilter.add(value)
+
+    assert all(value in prefilter for value in values)
+    assert sum(f'other_{i}' in prefilter for i in range(1000)) < 50
+
+
+def test_conflicts_checks_both_fields(app):
+    with app.app_context():
+        errors = unique_users.conflicts(TEST_USER['username'], TEST_USER['email'])
+
+    assert set(errors) == {'username', 'email'}
+
+
+def test_new_values_skip_the_query(app):
+    with app.app_context():
+        errors = unique_users.conflicts('brand_new_user', 'brand_new_user@gmail.com')
+
+    assert errors == {}
+    assert unique_users.skipped == 1
+    assert unique_users.queried == 0
+
+
+def test_taken_checks_a_batch_in_one_query(app):
+    with app.app_context():
+        usernames, emails = unique_users.taken(
+            [TEST_USER['username'], 'brand_new_user'],
+            ['brand_new_user@gmail.com', TEST_USER['email']]
+        )
+
+    assert usernames == {TEST_USER['username']}
+    assert emails == {TEST_USER['email']}
+    assert unique_users.queried == 1
+
+
+def test_created_user_is_added_to_prefilter(client, app):
+    new_user = {
+        'email': 'prefilter_user@gmail.com',
+        'username': 'prefilter_user',
+        'password': 'Abcd@1234'
+    }
+    response = client.put(USER_API_URL, json=new_user)
+
+    assert response.status_code == 201
+    assert new_user['username'] in unique_users.prefilter
+    assert new_user['email'] in unique_users.prefilter
+
+    response = client.put(USER_API_URL, json=new_user)
+
+    assert response.status_code == 400
+
+    with app.app_context():
+        user = UserModel.query.filter_by(username=new_user['username']).first()
+        user.delete(user)
+
+
+@pytest.mark.wsgi_only
+@pytest.mark.parametrize('per_request', [True, False])
+def test_integrity_error_is_translated(client, app, monkeypatch, per_request):
+    app.config['DB_TRANSACTION_PER_REQUEST'] = per_request
+    monkeypatch.setattr(unique_users, 'conflicts', lambda *args: {})
+
+    response = client.put(
+        USER_API_URL,
+        json={**TEST_USER, 'password': 'Abcd@1234'}
+    )
+
+    assert response.status_code == 400
+    assert b'is already exist.' in response.data